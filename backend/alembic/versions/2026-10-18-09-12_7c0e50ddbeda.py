@@ -0,0 +1,59 @@
+"""Add mail_jobs queue table
+
+Revision ID: 7c0e50ddbeda
+Revises: b25c9ac1b6b3
+Create Date: 2026-10-18 09:12:41.503117
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '7c0e50ddbeda'
+down_revision: Union[str, Sequence[str], None] = 'b25c9ac1b6b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('mail_jobs',
+    sa.Column('id', sa.Uuid(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('mail_id', sa.Uuid(), nullable=False),
+    sa.Column('file_key', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('status', sa.Enum('QUEUED', 'RUNNING', 'DONE', 'DEAD', name='jobstatus'), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('max_attempts', sa.Integer(), nullable=False),
+    sa.Column('run_after', sa.DateTime(), nullable=False),
+    sa.Column('locked_at', sa.DateTime(), nullable=True),
+    sa.Column('last_error', sqlmodel.sql.sqltypes.AutoString(), nullable=True),
+    sa.ForeignKeyConstraint(['mail_id'], ['mails.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_mail_jobs_id'), 'mail_jobs', ['id'], unique=False)
+    op.create_index(op.f('ix_mail_jobs_mail_id'), 'mail_jobs', ['mail_id'], unique=True)
+    op.create_index('ix_mail_jobs_status_run_after', 'mail_jobs', ['status', 'run_after'], unique=False)
+
+    # Queue mails that were still waiting on the old in-process background tasks
+    op.execute(
+        """
+        INSERT INTO mail_jobs (id, created_at, mail_id, file_key, status, attempts, max_attempts, run_after)
+        SELECT gen_random_uuid(), now(), id, image_s3_key, 'QUEUED', 0, 5, now()
+        FROM mails
+        WHERE status IN ('PENDING', 'PROCESSING')
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_mail_jobs_status_run_after', table_name='mail_jobs')
+    op.drop_index(op.f('ix_mail_jobs_mail_id'), table_name='mail_jobs')
+    op.drop_index(op.f('ix_mail_jobs_id'), table_name='mail_jobs')
+    op.drop_table('mail_jobs')
+    sa.Enum(name='jobstatus').drop(op.get_bind(), checkfirst=True)
@@ -0,0 +1,41 @@
+"""Add composite index for keyset pagination of mails
+
+Revision ID: 411315cfd66a
+Revises: 7c0e50ddbeda
+Create Date: 2026-10-18 09:31:02.118644
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '411315cfd66a'
+down_revision: Union[str, Sequence[str], None] = '7c0e50ddbeda'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Built concurrently so large mails tables stay writable during the migration
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_mails_user_id_created_at_id',
+            'mails',
+            ['user_id', sa.text('created_at DESC'), sa.text('id DESC')],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_mails_user_id_created_at_id',
+            table_name='mails',
+            postgresql_concurrently=True,
+        )
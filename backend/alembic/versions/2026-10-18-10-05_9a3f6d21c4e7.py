@@ -0,0 +1,33 @@
+"""Add priority lanes to mail_jobs
+
+Revision ID: 9a3f6d21c4e7
+Revises: 411315cfd66a
+Create Date: 2026-10-18 10:05:44.502137
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9a3f6d21c4e7'
+down_revision: Union[str, Sequence[str], None] = '411315cfd66a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing jobs become interactive (0), matching how they were enqueued
+    op.add_column('mail_jobs', sa.Column('priority', sa.Integer(), server_default='0', nullable=False))
+    op.create_index('ix_mail_jobs_status_priority_run_after', 'mail_jobs', ['status', 'priority', 'run_after'], unique=False)
+    op.drop_index('ix_mail_jobs_status_run_after', table_name='mail_jobs')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index('ix_mail_jobs_status_run_after', 'mail_jobs', ['status', 'run_after'], unique=False)
+    op.drop_index('ix_mail_jobs_status_priority_run_after', table_name='mail_jobs')
+    op.drop_column('mail_jobs', 'priority')
@@ -0,0 +1,40 @@
+"""Add extraction_cache table
+
+Revision ID: c5e18b07f2a9
+Revises: 9a3f6d21c4e7
+Create Date: 2026-10-18 10:40:13.871205
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e18b07f2a9'
+down_revision: Union[str, Sequence[str], None] = '9a3f6d21c4e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('extraction_cache',
+    sa.Column('perceptual_hash', sa.BigInteger(), nullable=True),
+    sa.Column('output', sa.JSON(), nullable=True),
+    sa.Column('content_hash', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('hits', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('last_used_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('content_hash')
+    )
+    op.create_index(op.f('ix_extraction_cache_last_used_at'), 'extraction_cache', ['last_used_at'], unique=False)
+    op.create_index(op.f('ix_extraction_cache_perceptual_hash'), 'extraction_cache', ['perceptual_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_extraction_cache_perceptual_hash'), table_name='extraction_cache')
+    op.drop_index(op.f('ix_extraction_cache_last_used_at'), table_name='extraction_cache')
+    op.drop_table('extraction_cache')
@@ -0,0 +1,28 @@
+"""Add sorted_at to mails
+
+Revision ID: e2b7a94d0c31
+Revises: c5e18b07f2a9
+Create Date: 2026-10-18 11:15:27.340918
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2b7a94d0c31'
+down_revision: Union[str, Sequence[str], None] = 'c5e18b07f2a9'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('mails', sa.Column('sorted_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('mails', 'sorted_at')
@@ -0,0 +1,60 @@
+"""Notify listeners of mail status changes
+
+Revision ID: 3f9c1d7e5a62
+Revises: e2b7a94d0c31
+Create Date: 2026-10-18 11:50:08.214573
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c1d7e5a62'
+down_revision: Union[str, Sequence[str], None] = 'e2b7a94d0c31'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Fired by every writer (API, workers, OCR fast path), so API processes only have to LISTEN.
+    # Addresses are left out to stay well under NOTIFY's 8000-byte payload limit.
+    op.execute(
+        """
+        CREATE FUNCTION notify_mail_status() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('mail_status', json_build_object(
+                'id', NEW.id,
+                'user_id', NEW.user_id,
+                'status', lower(NEW.status::text),
+                'receiver_name', left(NEW.receiver_name, 500),
+                'receiver_pincode', NEW.receiver_pincode,
+                'sender_name', left(NEW.sender_name, 500),
+                'sender_pincode', NEW.sender_pincode,
+                'assigned_sorting_center', NEW.assigned_sorting_center,
+                'sorted_at', NEW.sorted_at
+            )::text);
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER mails_notify_status
+        AFTER UPDATE OF status, assigned_sorting_center ON mails
+        FOR EACH ROW
+        WHEN (OLD.status IS DISTINCT FROM NEW.status
+              OR OLD.assigned_sorting_center IS DISTINCT FROM NEW.assigned_sorting_center)
+        EXECUTE FUNCTION notify_mail_status()
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS mails_notify_status ON mails")
+    op.execute("DROP FUNCTION IF EXISTS notify_mail_status()")
@@ -0,0 +1,121 @@
+"""Add mail_stats_daily summary table maintained by triggers
+
+Revision ID: 8d41c6a09be3
+Revises: 3f9c1d7e5a62
+Create Date: 2026-10-18 12:25:41.530218
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d41c6a09be3'
+down_revision: Union[str, Sequence[str], None] = '3f9c1d7e5a62'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('mail_stats_daily',
+    sa.Column('user_id', sa.Uuid(), nullable=False),
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('status', postgresql.ENUM('PENDING', 'PROCESSING', 'COMPLETED', 'FAILED', name='processingstatus', create_type=False), nullable=False),
+    sa.Column('sorting_center', sqlmodel.sql.sqltypes.AutoString(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id', 'day', 'status', 'sorting_center')
+    )
+
+    # One upsert per statement rather than per row: a 500-mail process_batch insert
+    # touches one bucket row. Old rows count -1 and new rows +1, so updates that don't
+    # move a mail between buckets net out to nothing. Rows are upserted in key order
+    # so concurrent statements can't deadlock on each other's buckets.
+    op.execute(
+        """
+        CREATE FUNCTION apply_mail_stats_changes() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO mail_stats_daily (user_id, day, status, sorting_center, count)
+                SELECT user_id, created_at::date, status, coalesce(assigned_sorting_center, ''), count(*)
+                FROM new_mails
+                GROUP BY 1, 2, 3, 4
+                ORDER BY 1, 2, 3, 4
+                ON CONFLICT (user_id, day, status, sorting_center)
+                DO UPDATE SET count = mail_stats_daily.count + excluded.count;
+            ELSIF TG_OP = 'UPDATE' THEN
+                INSERT INTO mail_stats_daily (user_id, day, status, sorting_center, count)
+                SELECT user_id, day, status, sorting_center, sum(delta)
+                FROM (
+                    SELECT user_id, created_at::date AS day, status,
+                           coalesce(assigned_sorting_center, '') AS sorting_center, -1 AS delta
+                    FROM old_mails
+                    UNION ALL
+                    SELECT user_id, created_at::date, status, coalesce(assigned_sorting_center, ''), 1
+                    FROM new_mails
+                ) AS changes
+                GROUP BY 1, 2, 3, 4
+                HAVING sum(delta) <> 0
+                ORDER BY 1, 2, 3, 4
+                ON CONFLICT (user_id, day, status, sorting_center)
+                DO UPDATE SET count = mail_stats_daily.count + excluded.count;
+            ELSE
+                INSERT INTO mail_stats_daily (user_id, day, status, sorting_center, count)
+                SELECT user_id, created_at::date, status, coalesce(assigned_sorting_center, ''), -count(*)
+                FROM old_mails
+                GROUP BY 1, 2, 3, 4
+                ORDER BY 1, 2, 3, 4
+                ON CONFLICT (user_id, day, status, sorting_center)
+                DO UPDATE SET count = mail_stats_daily.count + excluded.count;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    # Transition tables need one trigger per event
+    op.execute(
+        """
+        CREATE TRIGGER mails_stats_insert AFTER INSERT ON mails
+        REFERENCING NEW TABLE AS new_mails
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_mail_stats_changes()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER mails_stats_update AFTER UPDATE ON mails
+        REFERENCING OLD TABLE AS old_mails NEW TABLE AS new_mails
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_mail_stats_changes()
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER mails_stats_delete AFTER DELETE ON mails
+        REFERENCING OLD TABLE AS old_mails
+        FOR EACH STATEMENT EXECUTE FUNCTION apply_mail_stats_changes()
+        """
+    )
+
+    # CREATE TRIGGER holds a lock that blocks writes to mails until this migration commits,
+    # so no mail is missed or counted twice between the backfill and the triggers
+    op.execute(
+        """
+        INSERT INTO mail_stats_daily (user_id, day, status, sorting_center, count)
+        SELECT user_id, created_at::date, status, coalesce(assigned_sorting_center, ''), count(*)
+        FROM mails
+        GROUP BY 1, 2, 3, 4
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TRIGGER IF EXISTS mails_stats_delete ON mails")
+    op.execute("DROP TRIGGER IF EXISTS mails_stats_update ON mails")
+    op.execute("DROP TRIGGER IF EXISTS mails_stats_insert ON mails")
+    op.execute("DROP FUNCTION IF EXISTS apply_mail_stats_changes()")
+    op.drop_table('mail_stats_daily')
@@ -0,0 +1,126 @@
+"""Rework indexes: partial unfinished-mail index, unique keys, drop unused ones
+
+Revision ID: 5b7e2f19d8a4
+Revises: 8d41c6a09be3
+Create Date: 2026-10-18 13:05:27.904316
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e2f19d8a4'
+down_revision: Union[str, Sequence[str], None] = '8d41c6a09be3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Indexes no query uses, each one still updated on every write:
+# - *_id duplicate the primary keys
+# - ix_mails_user_id is a prefix of ix_mails_user_id_created_at_id, which also covers the FK
+# - ix_mails_receiver_pincode is never filtered on, but is rewritten as each mail completes
+# - ix_users_hashed_password is never looked up
+UNUSED_INDEXES = (
+    ('ix_users_hashed_password', 'users', ['hashed_password']),
+    ('ix_users_id', 'users', ['id']),
+    ('ix_mails_id', 'mails', ['id']),
+    ('ix_mails_user_id', 'mails', ['user_id']),
+    ('ix_mails_receiver_pincode', 'mails', ['receiver_pincode']),
+    ('ix_mail_jobs_id', 'mail_jobs', ['id']),
+    ('ix_pincode_cache_pincode', 'pincode_cache', ['pincode']),
+)
+
+
+def _check_unique(table: str, column: str) -> None:
+    # A failed CREATE UNIQUE INDEX CONCURRENTLY leaves an invalid index behind; fail early instead
+    duplicates = op.get_bind().execute(sa.text(
+        f"SELECT count(*) FROM (SELECT 1 FROM {table} GROUP BY {column} HAVING count(*) > 1) AS d"
+    )).scalar()
+    if duplicates:
+        raise RuntimeError(f"{table}.{column} has {duplicates} duplicated value(s); resolve them before upgrading")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    _check_unique('mails', 'image_s3_key')
+    _check_unique('users', 'email')
+
+    # Built and dropped concurrently so large tables stay writable during the migration
+    with op.get_context().autocommit_block():
+        # Only unfinished mails, so it stays tiny however many completed mails pile up;
+        # serves the worker's crash recovery scan
+        op.create_index(
+            'ix_mails_unfinished',
+            'mails',
+            ['id'],
+            unique=False,
+            postgresql_where=sa.text("status IN ('PENDING', 'PROCESSING')"),
+            postgresql_concurrently=True,
+        )
+        # Same for the job queue: DONE/DEAD jobs accumulate, QUEUED/RUNNING ones don't
+        op.create_index(
+            'ix_mail_jobs_queued',
+            'mail_jobs',
+            ['priority', 'run_after'],
+            unique=False,
+            postgresql_where=sa.text("status = 'QUEUED'"),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_mail_jobs_running',
+            'mail_jobs',
+            ['locked_at'],
+            unique=False,
+            postgresql_where=sa.text("status = 'RUNNING'"),
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_mail_jobs_status_priority_run_after', table_name='mail_jobs', postgresql_concurrently=True)
+        # Every uploaded object backs exactly one mail; replaces the plain index of the same name
+        op.create_index(
+            'ix_mails_image_s3_key_unique',
+            'mails',
+            ['image_s3_key'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_mails_image_s3_key', table_name='mails', postgresql_concurrently=True)
+        op.execute("ALTER INDEX ix_mails_image_s3_key_unique RENAME TO ix_mails_image_s3_key")
+        # Login looks users up by email on every attempt
+        op.create_index(
+            'ix_users_email',
+            'users',
+            ['email'],
+            unique=True,
+            postgresql_concurrently=True,
+        )
+        for name, table, _ in UNUSED_INDEXES:
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in UNUSED_INDEXES:
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True)
+        op.drop_index('ix_users_email', table_name='users', postgresql_concurrently=True)
+        op.create_index(
+            'ix_mails_image_s3_key_plain',
+            'mails',
+            ['image_s3_key'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_mails_image_s3_key', table_name='mails', postgresql_concurrently=True)
+        op.execute("ALTER INDEX ix_mails_image_s3_key_plain RENAME TO ix_mails_image_s3_key")
+        op.create_index(
+            'ix_mail_jobs_status_priority_run_after',
+            'mail_jobs',
+            ['status', 'priority', 'run_after'],
+            unique=False,
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_mail_jobs_running', table_name='mail_jobs', postgresql_concurrently=True)
+        op.drop_index('ix_mail_jobs_queued', table_name='mail_jobs', postgresql_concurrently=True)
+        op.drop_index('ix_mails_unfinished', table_name='mails', postgresql_concurrently=True)
@@ -0,0 +1,128 @@
+"""Move raw_ai_response to a mail_payloads JSONB side table, pincode raw_api_data to JSONB
+
+Expand step: creates and backfills mail_payloads while mails.raw_ai_response
+stays in place, so workers on the old code keep working. Run it before
+deploying the code that reads mail_payloads; the column is dropped by
+a1d4c7e90b52 once every worker runs the new code.
+
+Revision ID: b7b46f96e6f7
+Revises: 5b7e2f19d8a4
+Create Date: 2026-10-18 13:40:12.618407
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7b46f96e6f7'
+down_revision: Union[str, Sequence[str], None] = '5b7e2f19d8a4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+NIL_UUID = '00000000-0000-0000-0000-000000000000'
+
+
+def _in_batches(statement: str) -> None:
+    # Each batch commits on its own (autocommit block), so locks and WAL stay bounded
+    # on a large mails table; the statement returns the last id it handled as text
+    # (max() has no uuid version before Postgres 18; the text form sorts the same), or NULL
+    bind = op.get_bind()
+    last = NIL_UUID
+    while last is not None:
+        last = bind.execute(sa.text(statement), {"last": last, "batch_size": BATCH_SIZE}).scalar()
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('mail_payloads',
+    sa.Column('mail_id', sa.Uuid(), nullable=False),
+    sa.Column('raw_ai_response', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['mail_id'], ['mails.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('mail_id')
+    )
+
+    # Workers still running the old code keep writing mails.raw_ai_response until
+    # they are redeployed; mirror those writes so nothing is lost between the
+    # backfill and the column drop in the contract revision
+    op.execute(
+        """
+        CREATE FUNCTION copy_mail_payload() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.raw_ai_response IS NOT NULL THEN
+                INSERT INTO mail_payloads (mail_id, raw_ai_response, created_at)
+                VALUES (NEW.id, NEW.raw_ai_response::jsonb, timezone('utc', now()))
+                ON CONFLICT (mail_id) DO UPDATE
+                SET raw_ai_response = excluded.raw_ai_response, created_at = excluded.created_at;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER mails_copy_payload AFTER INSERT OR UPDATE OF raw_ai_response ON mails
+        FOR EACH ROW EXECUTE FUNCTION copy_mail_payload()
+        """
+    )
+
+    with op.get_context().autocommit_block():
+        _in_batches(
+            """
+            WITH batch AS (
+                SELECT id, raw_ai_response FROM mails
+                WHERE id > CAST(:last AS uuid) AND raw_ai_response IS NOT NULL
+                ORDER BY id
+                LIMIT :batch_size
+            ), copied AS (
+                INSERT INTO mail_payloads (mail_id, raw_ai_response, created_at)
+                SELECT id, raw_ai_response::jsonb, timezone('utc', now()) FROM batch
+                ON CONFLICT (mail_id) DO NOTHING
+            )
+            SELECT max(id::text) FROM batch
+            """
+        )
+
+
+    # pincode_cache is bounded by the number of pincodes, so the rewrite is short
+    op.alter_column('pincode_cache', 'raw_api_data',
+               existing_type=sa.JSON(),
+               type_=postgresql.JSONB(astext_type=sa.Text()),
+               existing_nullable=True,
+               postgresql_using='raw_api_data::jsonb')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.alter_column('pincode_cache', 'raw_api_data',
+               existing_type=postgresql.JSONB(astext_type=sa.Text()),
+               type_=sa.JSON(),
+               existing_nullable=True,
+               postgresql_using='raw_api_data::json')
+    op.execute("DROP TRIGGER IF EXISTS mails_copy_payload ON mails")
+    op.execute("DROP FUNCTION IF EXISTS copy_mail_payload()")
+
+    # Payloads the new code wrote only to mail_payloads
+    with op.get_context().autocommit_block():
+        _in_batches(
+            """
+            WITH batch AS (
+                SELECT mail_id, raw_ai_response FROM mail_payloads
+                WHERE mail_id > CAST(:last AS uuid)
+                ORDER BY mail_id
+                LIMIT :batch_size
+            ), copied AS (
+                UPDATE mails SET raw_ai_response = batch.raw_ai_response::json
+                FROM batch WHERE mails.id = batch.mail_id AND mails.raw_ai_response IS NULL
+            )
+            SELECT max(mail_id::text) FROM batch
+            """
+        )
+
+    op.drop_table('mail_payloads')
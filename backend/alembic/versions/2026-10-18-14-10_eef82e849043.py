@@ -0,0 +1,42 @@
+"""Scope perceptual extraction cache matches by user
+
+Revision ID: eef82e849043
+Revises: b7b46f96e6f7
+Create Date: 2026-10-18 14:10:52.307115
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'eef82e849043'
+down_revision: Union[str, Sequence[str], None] = 'b7b46f96e6f7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing rows keep a NULL owner, so they only ever match by sha256 again
+    op.add_column('extraction_cache', sa.Column('user_id', sa.Uuid(), nullable=True))
+    op.create_foreign_key(
+        'extraction_cache_user_id_fkey', 'extraction_cache', 'users', ['user_id'], ['id'], ondelete='CASCADE'
+    )
+    op.drop_index('ix_extraction_cache_perceptual_hash', table_name='extraction_cache')
+    op.create_index(
+        'ix_extraction_cache_user_id_perceptual_hash',
+        'extraction_cache',
+        ['user_id', 'perceptual_hash'],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_extraction_cache_user_id_perceptual_hash', table_name='extraction_cache')
+    op.create_index('ix_extraction_cache_perceptual_hash', 'extraction_cache', ['perceptual_hash'], unique=False)
+    op.drop_constraint('extraction_cache_user_id_fkey', 'extraction_cache', type_='foreignkey')
+    op.drop_column('extraction_cache', 'user_id')
@@ -0,0 +1,84 @@
+"""Drop mails.raw_ai_response now that payloads live in mail_payloads
+
+Contract step of b7b46f96e6f7. Only run it once every API process and mail
+worker runs code that writes mail_payloads: older workers still set
+mails.raw_ai_response and would fail on the missing column.
+
+Revision ID: a1d4c7e90b52
+Revises: eef82e849043
+Create Date: 2026-10-18 14:40:06.482913
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1d4c7e90b52'
+down_revision: Union[str, Sequence[str], None] = 'eef82e849043'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 5000
+NIL_UUID = '00000000-0000-0000-0000-000000000000'
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Dropping the column only touches the catalog; the old values stay in the heap
+    # and TOAST table until rows are rewritten (VACUUM FULL / pg_repack during a quiet
+    # window to get the space back). Don't queue behind long readers holding mails.
+    op.execute("SET LOCAL lock_timeout = '5s'")
+    op.execute("DROP TRIGGER IF EXISTS mails_copy_payload ON mails")
+    op.execute("DROP FUNCTION IF EXISTS copy_mail_payload()")
+    op.drop_column('mails', 'raw_ai_response')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Back to the state after b7b46f96e6f7: the column is filled again and mirrored
+    op.add_column('mails', sa.Column('raw_ai_response', sa.JSON(), nullable=True))
+    op.execute(
+        """
+        CREATE FUNCTION copy_mail_payload() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.raw_ai_response IS NOT NULL THEN
+                INSERT INTO mail_payloads (mail_id, raw_ai_response, created_at)
+                VALUES (NEW.id, NEW.raw_ai_response::jsonb, timezone('utc', now()))
+                ON CONFLICT (mail_id) DO UPDATE
+                SET raw_ai_response = excluded.raw_ai_response, created_at = excluded.created_at;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """
+    )
+
+    # Filled before the trigger exists, so the copy doesn't bounce back into mail_payloads
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        last = NIL_UUID
+        while last is not None:
+            last = bind.execute(sa.text(
+                """
+                WITH batch AS (
+                    SELECT mail_id, raw_ai_response FROM mail_payloads
+                    WHERE mail_id > CAST(:last AS uuid)
+                    ORDER BY mail_id
+                    LIMIT :batch_size
+                ), copied AS (
+                    UPDATE mails SET raw_ai_response = batch.raw_ai_response::json
+                    FROM batch WHERE mails.id = batch.mail_id
+                )
+                SELECT max(mail_id::text) FROM batch
+                """
+            ), {"last": last, "batch_size": BATCH_SIZE}).scalar()
+
+    op.execute(
+        """
+        CREATE TRIGGER mails_copy_payload AFTER INSERT OR UPDATE OF raw_ai_response ON mails
+        FOR EACH ROW EXECUTE FUNCTION copy_mail_payload()
+        """
+    )
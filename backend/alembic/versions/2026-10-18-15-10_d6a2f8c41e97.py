@@ -0,0 +1,29 @@
+"""Add mail_jobs.claim_token, so a worker only finishes jobs it still holds
+
+Revision ID: d6a2f8c41e97
+Revises: a1d4c7e90b52
+Create Date: 2026-10-18 15:10:36.204918
+
+"""
+from typing import Sequence, Union
+import sqlmodel
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd6a2f8c41e97'
+down_revision: Union[str, Sequence[str], None] = 'a1d4c7e90b52'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable and without a default, so adding it doesn't rewrite mail_jobs
+    op.add_column('mail_jobs', sa.Column('claim_token', sa.Uuid(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('mail_jobs', 'claim_token')
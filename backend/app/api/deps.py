@@ -1,11 +1,15 @@
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import APIKeyHeader
 from sqlalchemy.ext.asyncio import AsyncSession
 from collections.abc import AsyncGenerator
+from uuid import UUID
 
 from app.db.database import AsyncSessionLocal
-from app.core.jwt import decode_access_token
+from app.core.jwt import decode_access_token_cached
+from app.core.config import settings
+from app.crud.user_crud import user_crud
 from app.models.user_model import User
+from app.services.r2_service import R2Service
 
 auth_scheme = APIKeyHeader(name="Authorization")
 
@@ -13,14 +17,40 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
     async with AsyncSessionLocal() as session:
         yield session
 
-async def get_current_user(
-    token: str = Depends(auth_scheme),
-    db: AsyncSession = Depends(get_db),
-) -> User:
-    payload = decode_access_token(token)
+# Clients built once in the app lifespan (app/main.py).
+# Tests can swap them with app.dependency_overrides[get_r2_service] = lambda: fake
+def get_r2_service(request: Request) -> R2Service:
+    return request.app.state.r2_service
+
+def _token_subject(token: str) -> str:
+    payload = decode_access_token_cached(token)
     if not payload or "sub" not in payload:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication")
-    user = await db.get(User, payload["sub"])
+    return payload["sub"]
+
+async def _load_user(user_id: str, db: AsyncSession) -> User:
+    user = await user_crud.get_cached(db, user_id)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
-    return user
\ No newline at end of file
+    return user
+
+# The session only checks out a connection on a user-cache miss
+async def get_current_user(
+    token: str = Depends(auth_scheme),
+    db: AsyncSession = Depends(get_db),
+) -> User:
+    return await _load_user(_token_subject(token), db)
+
+# For read endpoints that only need the caller's id. With AUTH_TRUST_TOKEN_CLAIMS the
+# signed token is trusted and the DB isn't touched. Any session is closed before
+# returning, so this also suits long-lived responses like event streams.
+async def get_current_user_id(token: str = Depends(auth_scheme)) -> UUID:
+    user_id = _token_subject(token)
+    if settings.AUTH_TRUST_TOKEN_CLAIMS:
+        try:
+            return UUID(user_id)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid authentication")
+    async with AsyncSessionLocal() as db:
+        user = await _load_user(user_id, db)
+    return user.id
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlmodel.ext.asyncio.session import AsyncSession
 from app.schemas.user_schema import UserCreate, UserRead, UserLogin
 from app.crud.user_crud import user_crud
-from app.core.security import verify_password
+from app.core.security import verify_and_update_password_async
 from app.core.jwt import create_access_token
 from app.api.deps import get_db  # Your async session dependency
 
@@ -18,7 +18,13 @@ async def register(user_create: UserCreate, db: AsyncSession = Depends(get_db)):
 @router.post("/login")
 async def login(user_login: UserLogin, db: AsyncSession = Depends(get_db)):
     user = await user_crud.get_by_email(db, user_login.email)
-    if not user or not verify_password(user_login.password, user.hashed_password):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    is_valid, new_hash = await verify_and_update_password_async(user_login.password, user.hashed_password)
+    if not is_valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    # Stored with an older work factor: re-hash transparently now that we know the password
+    if new_hash:
+        await user_crud.update(db, db_obj=user, obj_in={"hashed_password": new_hash})
     token = create_access_token({"sub": str(user.id)})
     return {"access_token": token, "token_type": "bearer"}
\ No newline at end of file
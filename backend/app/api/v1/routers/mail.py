@@ -1,64 +1,143 @@
-from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import StreamingResponse
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 # Imports from your project structure
-from app.api.deps import get_db, get_current_user
+from app.api.deps import get_db, get_current_user, get_current_user_id, get_r2_service
 from app.services.r2_service import R2Service
-from app.controllers.r2 import genarate_upload_url
-from app.controllers.mail import initialize_mail, process_mail_task, get_all_mails, get_mail_by_id
+from app.controllers.r2 import genarate_upload_url, genarate_upload_urls
+from app.controllers.mail import initialize_mail, initialize_mails, get_all_mails, get_mail_by_id, get_mail_stats, mail_event_stream
 from app.models.user_model import User
+from app.schemas.mail_schema import (
+    MailBatchCreate,
+    MailDetail,
+    MailQueued,
+    MailStats,
+    MailView,
+    UploadUrl,
+    mail_list_adapter,
+)
+from app.core.config import settings
 from uuid import UUID
 
 router = APIRouter()
 
 # Endpoint 1: The Handshake
 @router.post("/generate_upload_url")
-async def genreate_upload_url(current_user = Depends(get_current_user)):
-    return await genarate_upload_url(user_id=current_user.id)
+async def genreate_upload_url(
+    current_user = Depends(get_current_user),
+    r2: R2Service = Depends(get_r2_service)
+):
+    return await genarate_upload_url(user_id=current_user.id, r2=r2)
 
 # Endpoint 2: The Trigger
+# The mail is queued in mail_jobs and picked up by `python -m app.worker`
 @router.post("/process")
 async def process_mail(
     file_key: str,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    new_mail = await initialize_mail(user_id=current_user.id, file_key=file_key, db=db)
-    
-    background_tasks.add_task(
-        process_mail_task, 
-        new_mail.id, 
-        file_key, 
-        db
-    )
+    try:
+        new_mail = await initialize_mail(user_id=current_user.id, file_key=file_key, db=db)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="File key was not issued to this user")
+    if new_mail is None:
+        raise HTTPException(status_code=409, detail="File already registered")
     
     return new_mail
 
+# Batch versions for sorting-line scanners: one auth check and one commit for N letters
+@router.post("/generate_upload_urls", response_model=list[UploadUrl])
+async def generate_upload_urls(
+    count: int = Query(ge=1, le=settings.MAIL_BATCH_MAX_SIZE),
+    current_user: User = Depends(get_current_user),
+    r2: R2Service = Depends(get_r2_service)
+):
+    return await genarate_upload_urls(user_id=current_user.id, count=count, r2=r2)
+
+@router.post("/process_batch", response_model=list[MailQueued])
+async def process_mail_batch(
+    batch: MailBatchCreate,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    try:
+        return await initialize_mails(user_id=current_user.id, file_keys=batch.file_keys, db=db)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="File key was not issued to this user")
+
 # # Endpoint 3: The History (With Dynamic Image Links)
-@router.get("/")
+# Pass the X-Next-Cursor response header back as `cursor` to fetch the next page;
+# limit/offset still works but gets slower the deeper the page.
+# view=full adds raw_ai_response to every row.
+@router.get("/", response_model=list[MailDetail], response_model_exclude_unset=True)
 async def get_mails(
     limit: int = Query(default=20, ge=1, le=100),
     offset: int = Query(default=0, ge=0),
+    cursor: str | None = Query(default=None),
+    view: MailView = Query(default=MailView.summary),
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    user_id: UUID = Depends(get_current_user_id),
+    r2: R2Service = Depends(get_r2_service)
 ):
-    return await get_all_mails(
-        user_id=current_user.id,
-        db=db,
-        limit=limit,
-        offset=offset
+    try:
+        mails, next_cursor = await get_all_mails(
+            user_id=user_id,
+            db=db,
+            r2=r2,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+            view=view
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    # Serialized by pydantic-core directly instead of jsonable_encoder + json.dumps
+    response = Response(
+        content=mail_list_adapter.dump_json(mails, exclude_unset=True),
+        media_type="application/json"
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response
+
+
+# Dashboard counts per status, sorting center and day, computed in the database
+# instead of from pages of GET /
+@router.get("/stats", response_model=MailStats)
+async def get_stats(
+    days: int | None = Query(default=None, ge=1, le=3660),
+    db: AsyncSession = Depends(get_db),
+    user_id: UUID = Depends(get_current_user_id),
+):
+    return await get_mail_stats(user_id=user_id, db=db, days=days)
+
+
+# Live status updates as server-sent events, instead of polling GET /{mail_id}.
+# Without mail_id every mail of the user is streamed.
+@router.get("/events")
+async def stream_mail_events(
+    mail_id: UUID | None = Query(default=None),
+    user_id: UUID = Depends(get_current_user_id),
+):
+    return StreamingResponse(
+        mail_event_stream(user_id=user_id, mail_id=mail_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
 
 # Endpoint 4: Get specific mail by ID
-@router.get("/{mail_id}")
+@router.get("/{mail_id}", response_model=MailDetail)
 async def get_mail(
     mail_id: UUID,
     db: AsyncSession = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    user_id: UUID = Depends(get_current_user_id),
+    r2: R2Service = Depends(get_r2_service)
 ):
-    mail = await get_mail_by_id(mail_id=mail_id, user_id=current_user.id, db=db)
+    mail = await get_mail_by_id(mail_id=mail_id, user_id=user_id, db=db, r2=r2)
     
     if not mail:
         raise HTTPException(status_code=404, detail="Mail not found")
@@ -0,0 +1,27 @@
+"""
+End-to-end benchmark harness for the /mails flow.
+
+Boots the API and a mail worker in one process against a local Postgres.
+R2, OpenAI and the pincode API are replaced by local fakes:
+- a moto S3 server
+- an OpenAI-compatible vision endpoint with configurable latency and
+  error rates
+- a pincode API stub
+
+The harness then drives scripted workloads and prints throughput and
+latency percentiles as JSON.
+
+From the backend directory, with DATABASE_* pointing at a migrated,
+disposable database:
+    python -m app.benchmarks --mails 200 --output runs/baseline.json
+
+Add --workloads in_flight_load, list_views or deep_pagination for the
+pool load test, the payload-size comparison and the 1M-row pagination
+benchmark (see the README).
+
+Compare two runs with:
+    python -m app.benchmarks.compare runs/baseline.json runs/candidate.json
+
+Needs moto[server] (pip install "moto[server]"); Pillow is used for
+distinct test envelopes when installed.
+"""
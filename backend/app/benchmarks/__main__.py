@@ -0,0 +1,271 @@
+"""
+Runs the benchmark; see the package docstring. Settings are pointed at the
+fakes through environment variables before any app module is imported.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+import uvicorn
+from prometheus_client import REGISTRY
+
+from app.benchmarks.fakes import FakeLatency, fake_openai_app, fake_pincode_app, start_s3_server
+from app.benchmarks.workloads import (
+    deep_pagination,
+    history_browsing,
+    in_flight_load,
+    list_views,
+    status_polling,
+    upload_burst,
+)
+
+WORKLOADS = ("upload_burst", "status_polling", "history_browsing", "in_flight_load", "list_views", "deep_pagination")
+# The others seed a large history or run long; ask for them by name
+DEFAULT_WORKLOADS = ("upload_burst", "status_polling", "history_browsing")
+SEEDED_WORKLOADS = {"list_views", "deep_pagination"}
+BUCKET = "benchmark"
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def _serve(app, port: int) -> tuple[uvicorn.Server, asyncio.Task]:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="on"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.05)
+    return server, task
+
+
+def _point_settings_at_fakes(s3_port: int, openai_port: int, pincode_port: int, args) -> None:
+    os.environ.update({
+        "R2_ENDPOINT_URL": f"http://127.0.0.1:{s3_port}",
+        "R2_ACCOUNT_ID": "benchmark",
+        "R2_ACCESS_KEY_ID": "benchmark",
+        "R2_SECRET_ACCESS_KEY": "benchmark",
+        "R2_BUCKET_NAME": BUCKET,
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{openai_port}/v1",
+        "OPENAI_API_KEY": "benchmark",
+        "PINCODE_API_BASE_URL": f"http://127.0.0.1:{pincode_port}",
+        "WEB_CONCURRENCY": "1",
+        "WORKER_CONCURRENCY": str(args.worker_concurrency),
+        "WORKER_POLL_INTERVAL_SECONDS": "0.2",
+        "MAIL_EVENTS_KEEPALIVE_SECONDS": "60",
+    })
+    os.environ.setdefault("PROJECT_NAME", "IntelliPost benchmark")
+    for variable, value in (
+        ("DB_POOL_SIZE", args.db_pool_size),
+        ("DB_MAX_OVERFLOW", args.db_max_overflow),
+        ("DB_POOL_TIMEOUT_SECONDS", args.db_pool_timeout),
+    ):
+        if value is not None:
+            os.environ[variable] = str(value)
+    if "in_flight_load" in args.workloads:
+        # Every claimed mail goes straight into a vision call, instead of queueing
+        # for the scheduler's capacity or being answered from the extraction cache
+        # (which keeps the envelopes of earlier runs), so each level really has
+        # that many in flight. Applies to the whole run.
+        os.environ.update({
+            "VISION_MAX_IN_FLIGHT": str(max(args.in_flight_levels)),
+            "VISION_REQUESTS_PER_MINUTE": "1000000",
+            "VISION_TOKENS_PER_MINUTE": "1000000000",
+            "EXTRACTION_CACHE_ENABLED": "false",
+        })
+    if not args.pincode_index:
+        # Send every lookup through the cache tiers and the stub API
+        os.environ["PINCODE_INDEX_PATH"] = ""
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args) -> dict:
+    s3_port, openai_port, pincode_port, api_port = (_free_port() for _ in range(4))
+    s3 = start_s3_server(s3_port, BUCKET)
+    _point_settings_at_fakes(s3_port, openai_port, pincode_port, args)
+
+    # Imported only now, so Settings() sees the fake endpoints
+    from app.main import app as api_app
+    from app.worker import MailWorker
+    from app.db.database import engine
+    from app.services.extraction_cache_service import extraction_cache
+    from app.utils.metrics import registry
+
+    openai_app = fake_openai_app(
+        latency=FakeLatency(args.llm_latency, args.llm_jitter),
+        error_rate=args.llm_error_rate,
+        rate_limit_rate=args.llm_rate_limit_rate,
+    )
+    pincode_app = fake_pincode_app(latency=FakeLatency(args.pincode_latency, args.pincode_latency / 2))
+    servers = [
+        await _serve(openai_app, openai_port),
+        await _serve(pincode_app, pincode_port),
+        await _serve(api_app, api_port),
+    ]
+    worker = MailWorker()
+    worker_task = asyncio.create_task(worker.run())
+
+    results = {}
+    limits = httpx.Limits(max_connections=args.concurrency * 4 + args.readers + 10)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{api_port}/api/v1", limits=limits, timeout=args.timeout,
+        ) as client:
+            email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+            credentials = {"email": email, "password": "benchmark-password"}
+            (await client.post("/auth/register", json={**credentials, "username": email})).raise_for_status()
+            response = await client.post("/auth/login", json=credentials)
+            response.raise_for_status()
+            token = response.json()["access_token"]
+
+            mail_ids = []
+            if "upload_burst" in args.workloads:
+                burst, mail_ids = await upload_burst(
+                    client, token, args.mails, args.batch_size, args.concurrency, seed=args.seed,
+                )
+                results["upload_burst"] = burst.summary()
+            if "status_polling" in args.workloads and mail_ids:
+                polling = await status_polling(client, token, mail_ids, args.poll_interval, args.timeout)
+                summary = polling.summary()
+                completed = polling.op("completed").latencies
+                summary["mails_per_minute"] = round(len(completed) / (polling.finished - polling.started) * 60, 1)
+                results["status_polling"] = summary
+            if "history_browsing" in args.workloads:
+                history = await history_browsing(client, token, args.readers, args.pages, args.page_size)
+                results["history_browsing"] = history.summary()
+            if "in_flight_load" in args.workloads:
+                load, levels = await in_flight_load(
+                    client, token, args.in_flight_levels,
+                    set_concurrency=lambda level: setattr(worker, "concurrency", level),
+                    checked_out=engine.pool.checkedout,
+                    pool_timeouts=lambda: REGISTRY.get_sample_value("intellipost_db_pool_timeouts_total") or 0.0,
+                    poll_interval=args.poll_interval,
+                    timeout=args.timeout,
+                    seed=args.seed + args.mails,
+                )
+                worker.concurrency = args.worker_concurrency
+                summary = load.summary()
+                summary["levels"] = levels
+                summary["max_sustained_in_flight"] = max(
+                    (level for level, outcome in levels.items() if outcome["sustained"]), default=0,
+                )
+                results["in_flight_load"] = summary
+            if SEEDED_WORKLOADS & set(args.workloads):
+                results |= await _seeded_workloads(client, token, email, args)
+    finally:
+        worker.stop()
+        await worker_task
+        for server, task in reversed(servers):
+            server.should_exit = True
+            await task
+        s3.stop()
+
+    return {
+        "label": args.label,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "label")},
+        "workloads": results,
+        "fakes": {
+            "openai": vars(openai_app.state.stats),
+            "pincode_api": vars(pincode_app.state.stats),
+        },
+        "scheduler": worker.scheduler.stats(),
+        "extraction_cache": extraction_cache.stats(),
+        "metrics": registry.render() if args.include_metrics else None,
+    }
+
+
+async def _seeded_workloads(client: httpx.AsyncClient, token: str, email: str, args) -> dict:
+    """Runs list_views and deep_pagination over --history-rows seeded mails, removed afterwards."""
+    from app.benchmarks.seed import cursors_at, delete_history, seed_history, user_id_for
+
+    user_id = await user_id_for(email)
+    await seed_history(user_id, args.history_rows, payload_rows=args.list_page_size)
+    results = {}
+    try:
+        if "list_views" in args.workloads:
+            views = await list_views(client, token, args.list_page_size, args.samples)
+            results["list_views"] = views.summary()
+        if "deep_pagination" in args.workloads:
+            depths = [depth for depth in args.depths if depth < args.history_rows]
+            cursors = await cursors_at(user_id, depths)
+            pagination = await deep_pagination(client, token, cursors, args.page_size, args.samples)
+            results["deep_pagination"] = pagination.summary()
+    finally:
+        await delete_history(user_id)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of the /mails flow against local fakes")
+    parser.add_argument("--workloads", nargs="+", choices=WORKLOADS, default=list(DEFAULT_WORKLOADS))
+    parser.add_argument("--mails", type=int, default=200, help="Envelopes uploaded in the burst")
+    parser.add_argument("--batch-size", type=int, default=20, help="Envelopes per process_batch call")
+    parser.add_argument("--concurrency", type=int, default=4, help="Batches uploaded at once")
+    parser.add_argument("--worker-concurrency", type=int, default=8)
+    parser.add_argument("--poll-interval", type=float, default=0.5)
+    parser.add_argument("--readers", type=int, default=10, help="Concurrent history browsers")
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--in-flight-levels", nargs="+", type=int, default=[8, 32, 128],
+                        help="Mails processed at once, one in_flight_load step each")
+    parser.add_argument("--history-rows", type=int, default=1_000_000,
+                        help="Mails seeded for list_views and deep_pagination")
+    parser.add_argument("--depths", nargs="+", type=int, default=[0, 1_000, 10_000, 100_000, 500_000, 990_000],
+                        help="Rows into the history where deep_pagination fetches a page")
+    parser.add_argument("--list-page-size", type=int, default=100, help="Page size for list_views")
+    parser.add_argument("--samples", type=int, default=20, help="Requests per page in list_views and deep_pagination")
+    parser.add_argument("--db-pool-size", type=int, default=None, help="DB_POOL_SIZE for the API and worker")
+    parser.add_argument("--db-max-overflow", type=int, default=None)
+    parser.add_argument("--db-pool-timeout", type=float, default=None, help="DB_POOL_TIMEOUT_SECONDS")
+    parser.add_argument("--llm-latency", type=float, default=2.0, help="Mean fake vision latency, seconds")
+    parser.add_argument("--llm-jitter", type=float, default=0.5)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--pincode-latency", type=float, default=0.2)
+    parser.add_argument("--pincode-index", action="store_true", help="Resolve pincodes from PINCODE_INDEX_PATH if built")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--include-metrics", action="store_true", help="Embed the Prometheus text in the output")
+    parser.add_argument("--label", default=None)
+    parser.add_argument("--output", default=None, help="Write the JSON here instead of stdout")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    report = asyncio.run(run(args))
+    report["wall_seconds"] = round(time.perf_counter() - started, 2)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"Wrote {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
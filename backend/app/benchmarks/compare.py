@@ -0,0 +1,71 @@
+"""
+Compares two benchmark reports operation by operation:
+    python -m app.benchmarks.compare runs/baseline.json runs/candidate.json
+
+Exits with status 1 if any p50/p99 got slower than --threshold (or the
+error count grew), so it can gate CI.
+"""
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p99_ms")
+# Workload-level figures where a drop is the regression
+HIGHER_IS_BETTER = (("status_polling", "mails_per_minute"), ("in_flight_load", "max_sustained_in_flight"))
+
+
+def compare(baseline: dict, candidate: dict, threshold: float) -> tuple[list[str], bool]:
+    lines, regressed = [], False
+    for workload, result in candidate["workloads"].items():
+        before_ops = baseline["workloads"].get(workload, {}).get("operations", {})
+        for operation, after in result["operations"].items():
+            before = before_ops.get(operation)
+            if before is None:
+                lines.append(f"{workload}.{operation}: new")
+                continue
+            for metric in METRICS:
+                if metric not in before or metric not in after:
+                    continue
+                change = (after[metric] - before[metric]) / before[metric] if before[metric] else 0.0
+                flag = ""
+                if change > threshold:
+                    flag, regressed = "  REGRESSION", True
+                lines.append(
+                    f"{workload}.{operation} {metric}: {before[metric]:.1f} -> {after[metric]:.1f} "
+                    f"({change:+.1%}){flag}"
+                )
+            if after.get("errors", 0) > before.get("errors", 0):
+                regressed = True
+                lines.append(f"{workload}.{operation} errors: {before['errors']} -> {after['errors']}  REGRESSION")
+
+    for workload, figure in HIGHER_IS_BETTER:
+        before_rate = baseline["workloads"].get(workload, {}).get(figure)
+        after_rate = candidate["workloads"].get(workload, {}).get(figure)
+        if before_rate and after_rate:
+            change = (after_rate - before_rate) / before_rate
+            flag = ""
+            if change < -threshold:
+                flag, regressed = "  REGRESSION", True
+            lines.append(f"{figure}: {before_rate} -> {after_rate} ({change:+.1%}){flag}")
+    return lines, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark reports")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    lines, regressed = compare(baseline, candidate, args.threshold)
+    print("\n".join(lines))
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Local stand-ins for the services the mail pipeline calls out to.
+They are plain ASGI apps, served by the harness with uvicorn, except S3,
+which is moto's own server.
+"""
+from dataclasses import dataclass
+from io import BytesIO
+import asyncio
+import json
+import random
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+try:
+    from PIL import Image, ImageDraw
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+try:
+    from moto.server import ThreadedMotoServer
+    MOTO_AVAILABLE = True
+except ImportError:
+    MOTO_AVAILABLE = False
+
+# Pincodes the fake model "reads"; the stub API knows all but the last one
+PINCODES = {
+    "110001": ("New Delhi GPO", "New Delhi", "Delhi"),
+    "400001": ("Mumbai GPO", "Mumbai", "Maharashtra"),
+    "560001": ("Bangalore GPO", "Bangalore", "Karnataka"),
+    "600001": ("Chennai GPO", "Chennai", "Tamil Nadu"),
+    "700001": ("Kolkata GPO", "Kolkata", "West Bengal"),
+    "999999": None,
+}
+
+
+@dataclass
+class FakeLatency:
+    """Uniformly distributed latency, in seconds."""
+    mean: float = 0.0
+    jitter: float = 0.0
+
+    async def sleep(self) -> None:
+        delay = self.mean + random.uniform(-self.jitter, self.jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+@dataclass
+class FakeStats:
+    requests: int = 0
+    images: int = 0
+    rate_limited: int = 0
+    errors: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+def _fake_address(rng: random.Random) -> dict:
+    return {
+        "name": f"Person {rng.randint(1, 10_000)}",
+        "address": f"{rng.randint(1, 999)} Main Road, Sector {rng.randint(1, 60)}",
+        "pincode": rng.choice(list(PINCODES)),
+    }
+
+
+def fake_vision_output(seed: str) -> dict:
+    """A VisionOutput-shaped extraction, stable for the same image URL."""
+    rng = random.Random(seed)
+    receiver, sender = _fake_address(rng), _fake_address(rng)
+    return {
+        "receiver_name": receiver["name"],
+        "receiver_address": receiver["address"],
+        "receiver_pincode": receiver["pincode"],
+        "sender_name": sender["name"],
+        "sender_address": sender["address"],
+        "sender_pincode": sender["pincode"],
+    }
+
+
+def _image_urls(messages: list[dict]) -> list[str]:
+    urls = []
+    for message in messages:
+        content = message.get("content")
+        if isinstance(content, list):
+            for part in content:
+                if part.get("type") == "image_url":
+                    urls.append(part["image_url"]["url"])
+    return urls
+
+
+def _output_arguments(tool: dict, urls: list[str]) -> dict:
+    """Fills the output tool pydantic-ai registered, for one or many images."""
+    properties = tool["function"].get("parameters", {}).get("properties", {})
+    wrapped = properties.get("response")
+    if wrapped is not None and wrapped.get("type") == "array":
+        # Batched request: list[BatchedVisionOutput], images numbered from 0
+        return {"response": [
+            {**fake_vision_output(url.split("?")[0]), "image_index": index}
+            for index, url in enumerate(urls)
+        ]}
+    return fake_vision_output(urls[0].split("?")[0] if urls else "")
+
+
+def fake_openai_app(
+    latency: FakeLatency = FakeLatency(),
+    error_rate: float = 0.0,
+    rate_limit_rate: float = 0.0,
+    retry_after_seconds: float = 1.0,
+    tokens_per_image: int = 1100,
+) -> FastAPI:
+    """
+    OpenAI-compatible /v1/chat/completions that answers with a tool call to
+    the output tool of the request. `rate_limit_rate` and `error_rate` are
+    the probabilities of a 429 (with Retry-After) and of a 500.
+    """
+    app = FastAPI()
+    app.state.stats = stats = FakeStats()
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats.requests += 1
+        await latency.sleep()
+
+        roll = random.random()
+        if roll < rate_limit_rate:
+            stats.rate_limited += 1
+            return JSONResponse(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status_code=429,
+                headers={"retry-after-ms": str(int(retry_after_seconds * 1000))},
+            )
+        if roll < rate_limit_rate + error_rate:
+            stats.errors += 1
+            return JSONResponse({"error": {"message": "Internal error", "type": "server_error"}}, status_code=500)
+
+        urls = _image_urls(body.get("messages", []))
+        stats.images += len(urls)
+        tool = body["tools"][0]
+        prompt_tokens = 600 + tokens_per_image * len(urls)
+        completion_tokens = 90 * max(len(urls), 1)
+        stats.prompt_tokens += prompt_tokens
+        stats.completion_tokens += completion_tokens
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake-vision"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "tool_calls",
+                "message": {
+                    "role": "assistant",
+                    "content": None,
+                    "tool_calls": [{
+                        "id": f"call_{uuid.uuid4().hex[:24]}",
+                        "type": "function",
+                        "function": {
+                            "name": tool["function"]["name"],
+                            "arguments": json.dumps(_output_arguments(tool, urls)),
+                        },
+                    }],
+                },
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    return app
+
+
+def fake_pincode_app(latency: FakeLatency = FakeLatency(), error_rate: float = 0.0) -> FastAPI:
+    """Answers GET /pincode/{pincode} in the India Post API's format."""
+    app = FastAPI()
+    app.state.stats = stats = FakeStats()
+
+    @app.get("/pincode/{pincode}")
+    async def get_pincode(pincode: str):
+        stats.requests += 1
+        await latency.sleep()
+        if random.random() < error_rate:
+            stats.errors += 1
+            return JSONResponse({"message": "Service unavailable"}, status_code=503)
+
+        known = PINCODES.get(pincode)
+        if known is None:
+            return [{"Message": "No records found", "Status": "Error", "PostOffice": None}]
+        name, division, state = known
+        return [{
+            "Message": "Number of pincode(s) found:1",
+            "Status": "Success",
+            "PostOffice": [{
+                "Name": name,
+                "District": division,
+                "Division": division,
+                "State": state,
+                "Pincode": pincode,
+            }],
+        }]
+
+    return app
+
+
+def start_s3_server(port: int, bucket: str) -> "ThreadedMotoServer":
+    """Starts moto's S3 server in a thread and creates the bucket."""
+    if not MOTO_AVAILABLE:
+        raise RuntimeError('The benchmark needs moto: pip install "moto[server]"')
+    import boto3
+
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=port)
+    server.start()
+    boto3.client(
+        "s3",
+        endpoint_url=f"http://127.0.0.1:{port}",
+        aws_access_key_id="benchmark",
+        aws_secret_access_key="benchmark",
+        region_name="us-east-1",
+    ).create_bucket(Bucket=bucket)
+    return server
+
+
+def envelope_image(seed: int, size: tuple[int, int] = (1600, 1000)) -> bytes:
+    """
+    A JPEG with a few seeded shapes on a white card, so every seed gives a
+    different content and perceptual hash (no accidental extraction cache
+    hits). Without Pillow it falls back to random bytes, which the pipeline
+    uploads as-is.
+    """
+    rng = random.Random(seed)
+    if not PIL_AVAILABLE:
+        return rng.randbytes(200_000)
+
+    picture = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(picture)
+    width, height = size
+    for _ in range(12):
+        x, y = rng.randrange(width), rng.randrange(height)
+        draw.rectangle(
+            (x, y, x + rng.randint(40, width // 3), y + rng.randint(10, height // 6)),
+            fill=tuple(rng.randrange(256) for _ in range(3)),
+        )
+    buffer = BytesIO()
+    picture.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
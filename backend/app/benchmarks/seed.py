@@ -0,0 +1,95 @@
+"""
+Bulk history for the benchmark user, written straight to Postgres: going
+through the API would take hours for a million mails. Imported only once
+the harness has pointed Settings at the fakes.
+"""
+import sys
+from uuid import UUID
+
+from sqlalchemy import text
+
+from app.controllers.mail import encode_mail_cursor
+from app.controllers.r2 import upload_key_prefix
+from app.db.database import engine
+
+SEED_CHUNK_ROWS = 100_000
+
+
+async def user_id_for(email: str) -> UUID:
+    async with engine.connect() as connection:
+        return (await connection.execute(text("SELECT id FROM users WHERE email = :email"), {"email": email})).scalar_one()
+
+
+async def seed_history(user_id: UUID, rows: int, payload_rows: int) -> None:
+    """
+    Adds `rows` completed mails one second apart, older than anything the
+    user already has, committed in chunks. The newest `payload_rows` of them
+    get a raw_ai_response in mail_payloads, for the full listing view.
+    """
+    async with engine.connect() as connection:
+        oldest = (await connection.execute(
+            text("SELECT coalesce(min(created_at), timezone('utc', now())) FROM mails WHERE user_id = :user_id"),
+            {"user_id": user_id},
+        )).scalar()
+    for first in range(1, rows + 1, SEED_CHUNK_ROWS):
+        last = min(first + SEED_CHUNK_ROWS - 1, rows)
+        async with engine.begin() as connection:
+            await connection.execute(
+                text("""
+                    INSERT INTO mails (id, user_id, image_s3_key, image_url, status, receiver_name,
+                                       receiver_address, receiver_pincode, assigned_sorting_center, sorted_at, created_at)
+                    SELECT gen_random_uuid(), :user_id, :prefix || 'seed-' || i || '.jpg', '',
+                           'COMPLETED', 'Person ' || i, i || ' Main Road', '110001', 'New Delhi',
+                           CAST(:oldest AS timestamp) - i * interval '1 second',
+                           CAST(:oldest AS timestamp) - i * interval '1 second'
+                    FROM generate_series(CAST(:first AS int), CAST(:last AS int)) AS i
+                """),
+                {"user_id": user_id, "prefix": upload_key_prefix(user_id), "oldest": oldest, "first": first, "last": last},
+            )
+        print(f"Seeded {last}/{rows} mails", file=sys.stderr)
+
+    async with engine.begin() as connection:
+        await connection.execute(
+            text("""
+                INSERT INTO mail_payloads (mail_id, raw_ai_response, created_at)
+                SELECT id, jsonb_build_object(
+                           'receiver_name', receiver_name, 'receiver_address', receiver_address,
+                           'receiver_pincode', receiver_pincode, 'sender_name', 'Sender ' || image_s3_key,
+                           'sender_address', '42 Station Road, Sector 7', 'sender_pincode', '400001'),
+                       created_at
+                FROM mails WHERE user_id = :user_id AND image_s3_key LIKE :prefix || 'seed-%'
+                ORDER BY created_at DESC LIMIT :payload_rows
+            """),
+            {"user_id": user_id, "prefix": upload_key_prefix(user_id), "payload_rows": payload_rows},
+        )
+        # Fresh statistics, as a long-lived table would have
+        await connection.execute(text("ANALYZE mails"))
+        await connection.execute(text("ANALYZE mail_payloads"))
+
+
+async def cursors_at(user_id: UUID, depths: list[int]) -> dict[int, str | None]:
+    """The cursor whose page starts `depth` rows into the user's history."""
+    cursors = {}
+    async with engine.connect() as connection:
+        for depth in depths:
+            if depth == 0:
+                cursors[depth] = None
+                continue
+            row = (await connection.execute(
+                text("""
+                    SELECT id, created_at FROM mails WHERE user_id = :user_id
+                    ORDER BY created_at DESC, id DESC OFFSET :skip LIMIT 1
+                """),
+                {"user_id": user_id, "skip": depth - 1},
+            )).one()
+            cursors[depth] = encode_mail_cursor(row)
+    return cursors
+
+
+async def delete_history(user_id: UUID) -> None:
+    """Removes the seeded mails; their payloads go with them (ON DELETE CASCADE)."""
+    async with engine.begin() as connection:
+        await connection.execute(
+            text("DELETE FROM mails WHERE user_id = :user_id AND image_s3_key LIKE :prefix || 'seed-%'"),
+            {"user_id": user_id, "prefix": upload_key_prefix(user_id)},
+        )
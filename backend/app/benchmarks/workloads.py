@@ -0,0 +1,308 @@
+"""
+Scripted client workloads against the public API. Each one returns a
+WorkloadResult with per-operation latency samples.
+"""
+from collections.abc import Callable
+from dataclasses import dataclass, field
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from app.benchmarks.fakes import envelope_image
+
+TERMINAL_STATUSES = {"completed", "failed"}
+
+
+@dataclass
+class OperationStats:
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    # Response body sizes, for the operations that record them
+    sizes: list[int] = field(default_factory=list)
+
+    def summary(self, duration: float) -> dict:
+        ordered = sorted(self.latencies)
+        summary = {"count": len(ordered), "errors": self.errors}
+        if self.sizes:
+            summary["mean_bytes"] = round(statistics.fmean(self.sizes))
+        if ordered:
+            def pick(q: float) -> float:
+                return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))] * 1000, 2)
+            summary |= {
+                "throughput_per_second": round(len(ordered) / duration, 2) if duration else None,
+                "mean_ms": round(statistics.fmean(ordered) * 1000, 2),
+                "p50_ms": pick(0.50),
+                "p90_ms": pick(0.90),
+                "p99_ms": pick(0.99),
+                "max_ms": round(ordered[-1] * 1000, 2),
+            }
+        return summary
+
+
+@dataclass
+class WorkloadResult:
+    name: str
+    started: float = field(default_factory=time.perf_counter)
+    finished: float | None = None
+    operations: dict[str, OperationStats] = field(default_factory=dict)
+
+    def op(self, name: str) -> OperationStats:
+        return self.operations.setdefault(name, OperationStats())
+
+    async def timed(self, name: str, request) -> httpx.Response | None:
+        """Awaits `request`, recording its latency, or an error on a non-2xx/transport failure."""
+        started = time.perf_counter()
+        try:
+            response = await request
+            response.raise_for_status()
+        except httpx.HTTPError:
+            self.op(name).errors += 1
+            return None
+        self.op(name).latencies.append(time.perf_counter() - started)
+        return response
+
+    def finish(self) -> "WorkloadResult":
+        self.finished = time.perf_counter()
+        return self
+
+    def summary(self) -> dict:
+        duration = (self.finished or time.perf_counter()) - self.started
+        return {
+            "duration_seconds": round(duration, 3),
+            "operations": {name: stats.summary(duration) for name, stats in self.operations.items()},
+        }
+
+
+async def upload_burst(
+    client: httpx.AsyncClient,
+    token: str,
+    mails: int,
+    batch_size: int,
+    concurrency: int,
+    seed: int = 0,
+) -> tuple[WorkloadResult, list[str]]:
+    """
+    What a sorting-line scanner does: presign a batch of upload URLs, PUT
+    the envelopes to storage, then queue them with one process_batch call.
+    Returns the ids of the queued mails.
+    """
+    # Rendered up front so image generation doesn't count against the API
+    images = [envelope_image(seed + index) for index in range(mails)]
+    result = WorkloadResult("upload_burst")
+    headers = {"Authorization": token}
+    slots = asyncio.Semaphore(concurrency)
+    mail_ids: list[str] = []
+
+    async def run_batch(first: int, count: int):
+        async with slots:
+            response = await result.timed(
+                "generate_upload_urls",
+                client.post("/mails/generate_upload_urls", params={"count": count}, headers=headers),
+            )
+            if response is None:
+                return
+            urls = response.json()
+
+            uploads = await asyncio.gather(*(
+                result.timed("upload", client.put(
+                    url["upload_url"],
+                    content=images[first + index],
+                    headers={"Content-Type": "image/jpeg"},
+                ))
+                for index, url in enumerate(urls)
+            ))
+            file_keys = [url["file_key"] for url, ok in zip(urls, uploads) if ok is not None]
+            if not file_keys:
+                return
+
+            response = await result.timed(
+                "process_batch",
+                client.post("/mails/process_batch", json={"file_keys": file_keys}, headers=headers),
+            )
+            if response is not None:
+                mail_ids.extend(mail["id"] for mail in response.json())
+
+    await asyncio.gather(*(
+        run_batch(first, min(batch_size, mails - first)) for first in range(0, mails, batch_size)
+    ))
+    return result.finish(), mail_ids
+
+
+async def status_polling(
+    client: httpx.AsyncClient,
+    token: str,
+    mail_ids: list[str],
+    interval: float,
+    timeout: float,
+) -> WorkloadResult:
+    """
+    Polls GET /mails/{id} for every queued mail until it is completed or
+    failed. "completed"/"failed" samples are the end-to-end time from the start
+    of polling to a terminal status, as a client sees it.
+    """
+    result = WorkloadResult("status_polling")
+    headers = {"Authorization": token}
+
+    async def poll(mail_id: str):
+        started = time.perf_counter()
+        while time.perf_counter() - started < timeout:
+            response = await result.timed("get_mail", client.get(f"/mails/{mail_id}", headers=headers))
+            status = response.json().get("status") if response is not None else None
+            if status in TERMINAL_STATUSES:
+                result.op(status).latencies.append(time.perf_counter() - started)
+                return
+            await asyncio.sleep(interval)
+        result.op("timed_out").errors += 1
+
+    await asyncio.gather(*(poll(mail_id) for mail_id in mail_ids))
+    return result.finish()
+
+
+async def history_browsing(
+    client: httpx.AsyncClient,
+    token: str,
+    readers: int,
+    pages: int,
+    page_size: int,
+) -> WorkloadResult:
+    """Each reader walks the history with the X-Next-Cursor header, like the app's infinite scroll."""
+    result = WorkloadResult("history_browsing")
+    headers = {"Authorization": token}
+
+    async def browse():
+        cursor = None
+        for _ in range(pages):
+            params = {"limit": page_size}
+            if cursor:
+                params["cursor"] = cursor
+            response = await result.timed("list_mails", client.get("/mails/", params=params, headers=headers))
+            if response is None:
+                return
+            cursor = response.headers.get("X-Next-Cursor")
+            if not cursor:
+                return
+
+    await asyncio.gather(*(browse() for _ in range(readers)))
+    return result.finish()
+
+
+async def in_flight_load(
+    client: httpx.AsyncClient,
+    token: str,
+    levels: list[int],
+    set_concurrency: Callable[[int], None],
+    checked_out: Callable[[], int],
+    pool_timeouts: Callable[[], float],
+    poll_interval: float,
+    timeout: float,
+    seed: int = 0,
+) -> tuple[WorkloadResult, dict]:
+    """
+    For each level, lets the worker run that many mails at once and queues
+    exactly that many, sampling how many pooled connections are checked out
+    until they finish. Progress is read from one GET /mails/stats per poll,
+    so the client itself holds at most one connection. A level is sustained
+    when every mail completes without a failed request or a pool checkout
+    timeout (the worker retries those, so they don't show as failed mails).
+    Returns the latencies and, per level, the peak and outcome.
+    """
+    result = WorkloadResult("in_flight_load")
+    headers = {"Authorization": token}
+    levels_summary = {}
+
+    async def finished_counts(operation: str) -> tuple[int, int] | None:
+        response = await result.timed(operation, client.get("/mails/stats", headers=headers))
+        if response is None:
+            return None
+        by_status = response.json()["by_status"]
+        return by_status.get("completed", 0), by_status.get("failed", 0)
+
+    for level in levels:
+        set_concurrency(level)
+        before = await finished_counts(f"{level}_in_flight.stats") or (0, 0)
+        timeouts_before = pool_timeouts()
+        peak = 0
+
+        async def sample():
+            nonlocal peak
+            while True:
+                peak = max(peak, checked_out())
+                await asyncio.sleep(0.01)
+
+        sampler = asyncio.create_task(sample())
+        completed = failed = 0
+        try:
+            burst, _ = await upload_burst(client, token, level, batch_size=level, concurrency=1, seed=seed)
+            started = time.perf_counter()
+            while time.perf_counter() - started < timeout:
+                counts = await finished_counts(f"{level}_in_flight.stats")
+                if counts is not None:
+                    completed, failed = counts[0] - before[0], counts[1] - before[1]
+                    if completed + failed >= level:
+                        result.op(f"{level}_in_flight.drained").latencies.append(time.perf_counter() - started)
+                        break
+                await asyncio.sleep(poll_interval)
+        finally:
+            sampler.cancel()
+        seed += level
+
+        errors = failed + sum(stats.errors for stats in burst.operations.values())
+        errors += result.op(f"{level}_in_flight.stats").errors
+        timeouts = int(pool_timeouts() - timeouts_before)
+        levels_summary[level] = {
+            "peak_connections_checked_out": peak,
+            "pool_timeouts": timeouts,
+            "completed": completed,
+            "errors": errors,
+            "sustained": errors == 0 and timeouts == 0 and completed == level,
+        }
+    return result.finish(), levels_summary
+
+
+async def deep_pagination(
+    client: httpx.AsyncClient,
+    token: str,
+    cursors: dict[int, str | None],
+    page_size: int,
+    samples: int,
+) -> WorkloadResult:
+    """
+    Fetches the page starting `depth` rows into a long history, by offset and
+    by cursor, `samples` times each, one request at a time so the numbers
+    are page latency rather than contention. `cursors` maps each depth to
+    the cursor for that page.
+    """
+    result = WorkloadResult("deep_pagination")
+    headers = {"Authorization": token}
+    for depth, cursor in cursors.items():
+        for _ in range(samples):
+            await result.timed(
+                f"offset_{depth}",
+                client.get("/mails/", params={"limit": page_size, "offset": depth}, headers=headers),
+            )
+            params = {"limit": page_size}
+            if cursor:
+                params["cursor"] = cursor
+            await result.timed(f"cursor_{depth}", client.get("/mails/", params=params, headers=headers))
+    return result.finish()
+
+
+async def list_views(
+    client: httpx.AsyncClient,
+    token: str,
+    page_size: int,
+    samples: int,
+) -> WorkloadResult:
+    """The newest history page in the summary and full views: latency and bytes per page."""
+    result = WorkloadResult("list_views")
+    headers = {"Authorization": token}
+    for _ in range(samples):
+        for view in ("summary", "full"):
+            response = await result.timed(
+                view, client.get("/mails/", params={"limit": page_size, "view": view}, headers=headers),
+            )
+            if response is not None:
+                result.op(view).sizes.append(len(response.content))
+    return result.finish()
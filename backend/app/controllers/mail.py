@@ -1,14 +1,48 @@
 from app.models.mail_model import Mail
-from app.models.enums.enums import ProcessingStatus
-from uuid import UUID
+from app.models.mail_stats_model import MailStatsDaily
+from app.models.mail_payload_model import MailPayload
+from app.models.enums.enums import ExtractionLane, ProcessingStatus
+from uuid import UUID, uuid4
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
+from sqlalchemy import Date, case, cast, update, tuple_, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, timedelta
+import base64
+import binascii
+import json
+import asyncio
+import time
+from app.db.database import AsyncSessionLocal
 from app.services.r2_service import R2Service
-from app.services.agent_service import AgentService
+from app.controllers.r2 import is_own_upload_key
+from app.services.extraction_scheduler_service import ExtractionScheduler, get_extraction_scheduler
 from app.services.pincode_lookup_service import PincodeLookupService
-import requests
+from app.services.job_queue_service import job_queue
+from app.services.extraction_cache_service import ExtractionCacheService, extraction_cache
+from app.services.image_preprocess_service import ImagePreprocessService, image_preprocessor
+from app.services.pincode_ocr_service import PincodeOcrService, pincode_ocr
+from app.services.mail_events_service import MailEventBroker, mail_events
+from app.utils.metrics import record_mail_outcome, record_ocr_read, timed_stage
+from collections.abc import AsyncIterator
+from app.core.config import settings
+from app.schemas.mail_schema import DayCount, MailDetail, MailStats, MailView, MailQueued, SortingCenterCount
 
-async def initialize_mail(user_id: UUID, file_key: str, db: AsyncSession) -> Mail:
+def _violates(error: IntegrityError, constraint: str) -> bool:
+    # asyncpg's own exception, the cause of the DBAPI error, names the violated constraint
+    cause = getattr(error.orig, "__cause__", None)
+    return getattr(cause, "constraint_name", None) == constraint
+
+
+async def initialize_mail(user_id: UUID, file_key: str, db: AsyncSession) -> Mail | None:
+    """
+    Registers an uploaded file. Repeating the call for the same file returns
+    the mail it already created; returns None if another user registered it.
+    Raises ValueError for a key outside the user's upload prefix.
+    """
+    if not is_own_upload_key(user_id, file_key):
+        raise ValueError("File key was not issued to this user")
     new_mail = Mail(
         user_id=user_id,
         image_s3_key=file_key,
@@ -16,122 +50,440 @@ async def initialize_mail(user_id: UUID, file_key: str, db: AsyncSession) -> Mai
         status=ProcessingStatus.PENDING
     )
     db.add(new_mail)
-    await db.commit()
+    try:
+        # The job references the mail, and nothing tells the session to insert the mail first
+        await db.flush()
+        # Queue the extraction in the same transaction so it can't be lost
+        job_queue.enqueue(db, mail_id=new_mail.id, file_key=file_key)
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        if not _violates(e, "ix_mails_image_s3_key"):
+            raise
+        # image_s3_key is unique: this file was registered already
+        result = await db.exec(
+            select(Mail).where(Mail.image_s3_key == file_key).where(Mail.user_id == user_id)
+        )
+        return result.first()
     await db.refresh(new_mail)
     
     return new_mail
 
 
-async def process_mail_task(mail_id: int, file_key: str, db: AsyncSession):
+async def initialize_mails(user_id: UUID, file_keys: list[str], db: AsyncSession) -> list[MailQueued]:
+    """
+    Registers many uploaded files at once: one multi-row INSERT ... RETURNING
+    for the mails and one for their jobs, committed together.
+    A retried batch is safe: files the user already registered are returned
+    with their current status instead of being queued again. Files that
+    belong to another user's mails are left out. Raises ValueError, before
+    writing anything, if any key is outside the user's upload prefix.
+    """
+    file_keys = list(dict.fromkeys(file_keys))
+    if not all(is_own_upload_key(user_id, file_key) for file_key in file_keys):
+        raise ValueError("File key was not issued to this user")
+    result = await db.execute(
+        insert(Mail)
+        .values([
+            {
+                "id": uuid4(),
+                "user_id": user_id,
+                "image_s3_key": file_key,
+                "image_url": "",
+                "status": ProcessingStatus.PENDING,
+            }
+            for file_key in file_keys
+        ])
+        .on_conflict_do_nothing(index_elements=[Mail.image_s3_key])
+        .returning(Mail.id, Mail.image_s3_key)
+    )
+    created = result.all()
+
+    await job_queue.enqueue_many(db, [(mail_id, file_key) for mail_id, file_key in created])
+    await db.commit()
 
-    mail_item = await db.get(Mail, mail_id)
-    r2 = R2Service()
-    agent = AgentService()
+    queued = {
+        file_key: MailQueued(id=mail_id, file_key=file_key, status=ProcessingStatus.PENDING)
+        for mail_id, file_key in created
+    }
+    if len(queued) < len(file_keys):
+        existing = await db.exec(
+            select(Mail.id, Mail.image_s3_key, Mail.status)
+            .where(Mail.image_s3_key.in_([key for key in file_keys if key not in queued]))
+            .where(Mail.user_id == user_id)
+        )
+        for mail_id, file_key, status in existing.all():
+            queued[file_key] = MailQueued(id=mail_id, file_key=file_key, status=status)
+
+    return [queued[file_key] for file_key in file_keys if file_key in queued]
+
+
+async def process_mail_task(
+    mail_id: UUID,
+    file_key: str,
+    agent: ExtractionScheduler | None = None,
+    r2: R2Service | None = None,
+    lane: ExtractionLane = ExtractionLane.INTERACTIVE,
+    cache: ExtractionCacheService | None = extraction_cache,
+    preprocessor: ImagePreprocessService | None = image_preprocessor,
+    ocr: PincodeOcrService | None = pincode_ocr,
+):
+    """
+    Runs extraction for one mail. Every DB step opens its own short-lived
+    session, so no pooled connection is held while the vision agent runs.
+    Re-raises on failure after marking the mail FAILED, so the worker can
+    decide whether to retry.
+    """
+    # The worker passes its process-wide clients; building them per mail is slow
+    r2 = r2 or R2Service()
+    agent = agent or get_extraction_scheduler()
     lookup = PincodeLookupService()
 
+    # Step 1: Set status to Processing
+    with timed_stage("claim", mail_id=str(mail_id)):
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                update(Mail)
+                .where(Mail.id == mail_id)
+                .values(status=ProcessingStatus.PROCESSING)
+                .returning(Mail.user_id)
+            )
+            user_id = result.scalar_one_or_none()
+            await db.commit()
+    if user_id is None:
+        return
+
+    started = time.perf_counter()
     try:
-        # Step 1: Set status to Processing
-        mail_item.status = ProcessingStatus.PROCESSING
-        db.add(mail_item)
-        await db.commit()
+        # Step 2: Reuse the output for an image we've already read, else give AI access to it
+        use_cache = cache is not None and settings.EXTRACTION_CACHE_ENABLED
+        use_preprocess = preprocessor is not None and settings.IMAGE_PREPROCESS_ENABLED
+        use_ocr = ocr is not None and settings.PINCODE_OCR_ENABLED and ocr.available
+        image = None
+        if use_cache or use_preprocess or use_ocr:
+            with timed_stage("download"):
+                image = await asyncio.to_thread(r2.download, file_key)
+
+        extracted_data = None
+        early_sort = None
+        if use_cache:
+            with timed_stage("cache_lookup"):
+                content_hash, perceptual_hash = await cache.fingerprint(image)
+                extracted_data = await cache.get(content_hash, perceptual_hash, user_id=user_id)
+
+        if extracted_data is None:
+            # Sort off a local OCR read while the vision model fills in the rest
+            if use_ocr:
+                early_sort = asyncio.create_task(assign_sorting_center_early(mail_id, image, ocr))
+            ai_key = file_key
+            try:
+                # The model reads a downscaled derivative rather than the full-size photo
+                if use_preprocess:
+                    with timed_stage("preprocess"):
+                        ai_key = await preprocessor.prepare(r2, file_key, image)
+                with timed_stage("presign"):
+                    ai_url = r2.generate_read_url(file_key=ai_key)
+                # Includes admission by the scheduler and pydantic-ai's output validation/retries
+                with timed_stage("agent", lane=lane.name.lower()):
+                    extracted_data = await agent.run_agent(user_input="", image_url=ai_url, lane=lane)
+            finally:
+                if early_sort is not None and not early_sort.done():
+                    early_sort.cancel()
+                # The derivative is only needed for this request; a retry makes a new one
+                if ai_key != file_key:
+                    await preprocessor.discard(r2, ai_key)
+            if use_cache:
+                await cache.put(content_hash, perceptual_hash, extracted_data, user_id=user_id)
+
+        # Step 3: Logic - Resolve Sorting Center (The "Lazy Loading" Logic)
+        pincode = extracted_data.get("receiver_pincode")
+        with timed_stage("pincode"):
+            sorting_division = await lookup.resolve_sorting_center(extracted_pincode=pincode)
+        if early_sort is not None and early_sort.done() and not early_sort.cancelled():
+            ocr_pincode = early_sort.result()
+            record_ocr_read("none" if ocr_pincode is None else "agreed" if ocr_pincode == pincode else "disagreed")
+
+        # Step 4: Map Data to Model
+        now = datetime.utcnow()
+        with timed_stage("commit"):
+            async with AsyncSessionLocal() as db:
+                await db.execute(
+                    update(Mail)
+                    .where(Mail.id == mail_id)
+                    .values(
+                        receiver_name=extracted_data.get("receiver_name"),
+                        receiver_address=extracted_data.get("receiver_address"),
+                        receiver_pincode=pincode,
+                        sender_name=extracted_data.get("sender_name"),
+                        sender_address=extracted_data.get("sender_address"),
+                        sender_pincode=extracted_data.get("sender_pincode"),
+                        assigned_sorting_center=sorting_division,
+                        # Keeps the OCR fast path's timestamp only if the model agreed with it
+                        sorted_at=case(
+                            (Mail.assigned_sorting_center.is_distinct_from(sorting_division), now),
+                            else_=func.coalesce(Mail.sorted_at, now),
+                        ),
+                        status=ProcessingStatus.COMPLETED,
+                    )
+                )
+                # A retried job overwrites the payload of the earlier attempt
+                payload = insert(MailPayload).values(mail_id=mail_id, raw_ai_response=extracted_data, created_at=now)
+                await db.execute(payload.on_conflict_do_update(
+                    index_elements=[MailPayload.mail_id],
+                    set_={"raw_ai_response": payload.excluded.raw_ai_response, "created_at": payload.excluded.created_at},
+                ))
+                await db.commit()
+        record_mail_outcome("completed", time.perf_counter() - started)
 
-        # Step 2: Give AI access to the image
-        ai_url = r2.generate_read_url(file_key=file_key)
-        extracted_data = await agent.run_agent(user_input="", image_url=ai_url)
-
-        # Step 3: Map Data to Model
-        mail_item.receiver_name = extracted_data.get("receiver_name")
-        mail_item.receiver_address = extracted_data.get("receiver_address")
-        mail_item.receiver_pincode = extracted_data.get("receiver_pincode")
-        mail_item.sender_name = extracted_data.get("sender_name")
-        mail_item.sender_address = extracted_data.get("sender_address")
-        mail_item.sender_pincode = extracted_data.get("sender_pincode")
-        mail_item.raw_ai_response = extracted_data
-
-        # Step 4: Logic - Resolve Sorting Center (The "Lazy Loading" Logic)
-        pincode = mail_item.receiver_pincode
-        print(pincode)
-        sorting_division = await lookup.resolve_sorting_center(extracted_pincode=pincode, db=db)
-
-        mail_item.status = ProcessingStatus.COMPLETED
-        mail_item.assigned_sorting_center = sorting_division
-        
     except Exception as e:
+        record_mail_outcome("failed", time.perf_counter() - started)
         print(f"Error processing mail {mail_id}: {e}")
-        mail_item.status = ProcessingStatus.FAILED
-    
-    finally:
-        db.add(mail_item)
-        await db.commit()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Mail)
+                .where(Mail.id == mail_id)
+                .values(status=ProcessingStatus.FAILED)
+            )
+            await db.commit()
+        raise
 
-async def get_all_mails(user_id: UUID, db: AsyncSession, limit: int = 20, offset: int = 0) -> list[dict]:
-    """Get all mails for a user with signed URLs"""
-    r2 = R2Service()
-    
+async def assign_sorting_center_early(mail_id: UUID, image: bytes, ocr: PincodeOcrService) -> str | None:
+    """
+    Sets the sorting center from a confident OCR read of the receiver
+    pincode, before the vision model answers. The final write in
+    process_mail_task overwrites it with the model's reading.
+    """
+    try:
+        # Whether the model agreed with the read is counted in process_mail_task
+        with timed_stage("ocr"):
+            match = await ocr.read_receiver_pincode(image)
+        if match is None:
+            return None
+        pincode, sorting_division = match
+
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                update(Mail)
+                .where(Mail.id == mail_id)
+                .where(Mail.status == ProcessingStatus.PROCESSING)
+                .values(
+                    receiver_pincode=pincode,
+                    assigned_sorting_center=sorting_division,
+                    sorted_at=datetime.utcnow(),
+                )
+            )
+            await db.commit()
+    except Exception as e:
+        print(f"OCR fast path failed for mail {mail_id}: {e}")
+        return None
+    return pincode
+
+
+def encode_mail_cursor(mail) -> str:
+    """Opaque keyset cursor pointing just past `mail` in the history listing."""
+    raw = json.dumps([mail.created_at.isoformat(), str(mail.id)])
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_mail_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Raises ValueError if the cursor wasn't produced by encode_mail_cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, mail_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(created_at), UUID(mail_id)
+    except (TypeError, json.JSONDecodeError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError("Invalid cursor") from e
+
+
+# Listing columns; image_url is replaced by a presigned URL and
+# raw_ai_response is only joined in from mail_payloads for the full view
+MAIL_SUMMARY_COLUMNS = (
+    Mail.id,
+    Mail.user_id,
+    Mail.image_s3_key,
+    Mail.status,
+    Mail.receiver_name,
+    Mail.receiver_address,
+    Mail.receiver_pincode,
+    Mail.sender_name,
+    Mail.sender_address,
+    Mail.sender_pincode,
+    Mail.assigned_sorting_center,
+    Mail.sorted_at,
+    Mail.created_at,
+    Mail.updated_at,
+)
+MAIL_DETAIL_COLUMNS = MAIL_SUMMARY_COLUMNS + (MailPayload.raw_ai_response,)
+
+
+async def get_all_mails(
+    user_id: UUID,
+    db: AsyncSession,
+    r2: R2Service,
+    limit: int = 20,
+    offset: int = 0,
+    cursor: str | None = None,
+    view: MailView = MailView.summary,
+) -> tuple[list[MailDetail], str | None]:
+    """
+    Get all mails for a user with signed URLs, newest first.
+    With a cursor, the page starts right after the cursor's row using the
+    (user_id, created_at, id) index, so deep pages cost the same as the first.
+    Only the columns for the requested view are selected; in the summary view
+    raw_ai_response is left unset so the response omits it.
+    Returns the page and the cursor for the next one (None on the last page).
+    """
+    columns = MAIL_DETAIL_COLUMNS if view == MailView.full else MAIL_SUMMARY_COLUMNS
     statement = (
-        select(Mail)
+        select(*columns)
         .where(Mail.user_id == user_id)
-        .order_by(Mail.created_at.desc())
+        .order_by(Mail.created_at.desc(), Mail.id.desc())
         .limit(limit)
-        .offset(offset)
     )
+    if view == MailView.full:
+        statement = statement.outerjoin(MailPayload, MailPayload.mail_id == Mail.id)
+    if cursor:
+        created_at, mail_id = decode_mail_cursor(cursor)
+        statement = statement.where(tuple_(Mail.created_at, Mail.id) < tuple_(created_at, mail_id))
+    else:
+        statement = statement.offset(offset)
+
     result = await db.exec(statement)
-    mails = result.all()
-    
-    response_list = []
-    for mail in mails:
-        temp_url = r2.generate_read_url(mail.image_s3_key)
-        mail_dict = {
-            "id": mail.id,
-            "user_id": mail.user_id,
-            "image_url": temp_url,
-            "image_s3_key": mail.image_s3_key,
-            "status": mail.status,
-            "receiver_name": mail.receiver_name,
-            "receiver_address": mail.receiver_address,
-            "receiver_pincode": mail.receiver_pincode,
-            "sender_name": mail.sender_name,
-            "sender_address": mail.sender_address,
-            "sender_pincode": mail.sender_pincode,
-            "raw_ai_response": mail.raw_ai_response,
-            "created_at": mail.created_at,
-            "updated_at": mail.updated_at,
-        }
-        response_list.append(mail_dict)
-    
-    return response_list
+    rows = result.all()
+    next_cursor = encode_mail_cursor(rows[-1]) if len(rows) == limit else None
+
+    mails = [
+        MailDetail(**row._mapping, image_url=r2.generate_read_url(row.image_s3_key))
+        for row in rows
+    ]
+    return mails, next_cursor
 
 
-async def get_mail_by_id(mail_id: UUID, user_id: UUID, db: AsyncSession) -> dict | None:
+async def get_mail_by_id(mail_id: UUID, user_id: UUID, db: AsyncSession, r2: R2Service) -> MailDetail | None:
     """Get a specific mail by ID with signed URL"""
-    r2 = R2Service()
-    
     statement = (
-        select(Mail)
+        select(*MAIL_DETAIL_COLUMNS)
+        .outerjoin(MailPayload, MailPayload.mail_id == Mail.id)
         .where(Mail.id == mail_id)
         .where(Mail.user_id == user_id)
     )
     result = await db.exec(statement)
-    mail = result.first()
+    row = result.first()
     
-    if not mail:
+    if not row:
         return None
     
-    temp_url = r2.generate_read_url(mail.image_s3_key)
-    
-    return {
-        "id": mail.id,
-        "user_id": mail.user_id,
-        "image_url": temp_url,
-        "image_s3_key": mail.image_s3_key,
-        "status": mail.status,
-        "receiver_name": mail.receiver_name,
-        "receiver_address": mail.receiver_address,
-        "receiver_pincode": mail.receiver_pincode,
-        "sender_name": mail.sender_name,
-        "sender_address": mail.sender_address,
-        "sender_pincode": mail.sender_pincode,
-        "raw_ai_response": mail.raw_ai_response,
-        "created_at": mail.created_at,
-        "updated_at": mail.updated_at,
-    }
\ No newline at end of file
+    return MailDetail(**row._mapping, image_url=r2.generate_read_url(row.image_s3_key))
+
+
+# grouping() bitmasks of the three GROUPING SETS in get_mail_stats (1 = column rolled up)
+_BY_STATUS, _BY_SORTING_CENTER, _BY_DAY = 0b011, 0b101, 0b110
+
+
+async def get_mail_stats(
+    user_id: UUID,
+    db: AsyncSession,
+    days: int | None = None,
+    from_summary: bool | None = None,
+) -> MailStats:
+    """
+    Mail counts per status, sorting center and creation day (UTC), for the
+    last `days` days or all time. One GROUPING SETS query computes all three.
+    From the summary table it reads a few rows per day, however many mails
+    the user has; otherwise it aggregates the user's mails via the
+    (user_id, created_at) index. `from_summary` defaults to
+    MAIL_STATS_FROM_SUMMARY.
+    """
+    if from_summary is None:
+        from_summary = settings.MAIL_STATS_FROM_SUMMARY
+    since = datetime.utcnow().date() - timedelta(days=days - 1) if days else None
+
+    if from_summary:
+        status, center, day = MailStatsDaily.status, MailStatsDaily.sorting_center, MailStatsDaily.day
+        count = func.sum(MailStatsDaily.count)
+        conditions = [MailStatsDaily.user_id == user_id]
+        if since:
+            conditions.append(MailStatsDaily.day >= since)
+    else:
+        status, center, day = Mail.status, Mail.assigned_sorting_center, cast(Mail.created_at, Date)
+        count = func.count()
+        conditions = [Mail.user_id == user_id]
+        if since:
+            conditions.append(Mail.created_at >= datetime.combine(since, datetime.min.time()))
+
+    statement = (
+        select(status, center, day, count, func.grouping(status, center, day))
+        .where(*conditions)
+        .group_by(func.grouping_sets(tuple_(status), tuple_(center), tuple_(day)))
+    )
+    result = await db.exec(statement)
+
+    by_status, by_center, by_day = {}, [], []
+    for row_status, row_center, row_day, row_count, grouping in result.all():
+        # Summary rows of mails that changed bucket can net out to zero
+        if not row_count:
+            continue
+        if grouping == _BY_STATUS:
+            by_status[row_status] = int(row_count)
+        elif grouping == _BY_SORTING_CENTER:
+            by_center.append(SortingCenterCount(sorting_center=row_center or None, count=int(row_count)))
+        elif grouping == _BY_DAY:
+            by_day.append(DayCount(day=row_day, count=int(row_count)))
+
+    return MailStats(
+        total=sum(by_status.values()),
+        by_status=by_status,
+        by_sorting_center=sorted(by_center, key=lambda entry: entry.count, reverse=True),
+        by_day=sorted(by_day, key=lambda entry: entry.day),
+        since=since,
+    )
+
+
+async def mail_event_stream(
+    user_id: UUID,
+    mail_id: UUID | None = None,
+    broker: MailEventBroker = mail_events,
+) -> AsyncIterator[str]:
+    """
+    Server-sent events for the user's mails, or only `mail_id` when given.
+    A single-mail stream starts with the mail's current state, so a change
+    that happened before the client subscribed isn't missed.
+    """
+    queue = broker.subscribe(user_id)
+    try:
+        if mail_id is not None:
+            async with AsyncSessionLocal() as db:
+                result = await db.exec(
+                    select(
+                        Mail.id,
+                        Mail.user_id,
+                        Mail.status,
+                        Mail.receiver_name,
+                        Mail.receiver_pincode,
+                        Mail.sender_name,
+                        Mail.sender_pincode,
+                        Mail.assigned_sorting_center,
+                        Mail.sorted_at,
+                    )
+                    .where(Mail.id == mail_id)
+                    .where(Mail.user_id == user_id)
+                )
+                row = result.first()
+            if row is None:
+                yield "event: error\ndata: {\"detail\": \"Mail not found\"}\n\n"
+                return
+            yield f"event: status\ndata: {json.dumps(row._asdict(), default=str)}\n\n"
+
+        while True:
+            try:
+                event_mail_id, payload = await asyncio.wait_for(
+                    queue.get(), timeout=settings.MAIL_EVENTS_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                # Comment line; keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            if mail_id is None or event_mail_id == str(mail_id):
+                yield f"event: status\ndata: {payload}\n\n"
+    finally:
+        broker.unsubscribe(user_id, queue)
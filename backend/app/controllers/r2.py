@@ -1,10 +1,20 @@
 from app.services.r2_service import R2Service
 from uuid import uuid4, UUID
 
-async def genarate_upload_url(user_id: UUID):
 
-    r2 = R2Service()
-    file_key = f"user_uploads/{user_id}/{uuid4()}.jpg"
+def upload_key_prefix(user_id: UUID) -> str:
+    return f"user_uploads/{user_id}/"
+
+
+def is_own_upload_key(user_id: UUID, file_key: str) -> bool:
+    """True for keys shaped like the ones presigned for this user; anything else may be someone else's object."""
+    name = file_key.removeprefix(upload_key_prefix(user_id))
+    return name != file_key and name != "" and "/" not in name
+
+
+async def genarate_upload_url(user_id: UUID, r2: R2Service):
+
+    file_key = f"{upload_key_prefix(user_id)}{uuid4()}.jpg"
     
     upload_url = r2.generate_upload_url(file_key)
     
@@ -12,3 +22,15 @@ async def genarate_upload_url(user_id: UUID):
         "upload_url": upload_url, # Flutter uploads here
         "file_key": file_key      # Flutter sends this back in step 2
     }
+
+
+async def genarate_upload_urls(user_id: UUID, count: int, r2: R2Service) -> list[dict]:
+    """Presigns `count` upload URLs in one call for batch scanners."""
+    urls = []
+    for _ in range(count):
+        file_key = f"{upload_key_prefix(user_id)}{uuid4()}.jpg"
+        urls.append({
+            "upload_url": r2.generate_upload_url(file_key),
+            "file_key": file_key
+        })
+    return urls
@@ -4,6 +4,7 @@ from pydantic import PostgresDsn, EmailStr, AnyHttpUrl, field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic_ai.models.openai import OpenAIModelName, OpenAIChatModelSettings, OpenAIChatModel
 from pydantic_ai.providers.openai import OpenAIProvider
+from openai import AsyncOpenAI
 from typing import Any
 import secrets
 from enum import Enum
@@ -15,12 +16,35 @@ class ModeEnum(str, Enum):
 
 class Settings(BaseSettings):
     MODE: ModeEnum = ModeEnum.development
+
+    # Observability: Prometheus text on internal ports, API_METRICS_PORT (served by
+    # app.serve) and the worker's --metrics-port, never on the public API port;
+    # OpenTelemetry spans need an SDK configured by the deployment
+    METRICS_ENABLED: bool = True
+    OTEL_SPANS_ENABLED: bool = False
+    API_METRICS_PORT: int | None = 9090
+    WORKER_METRICS_PORT: int | None = 9100
+    # How often each API process publishes its pool/cache gauges for the shared scrape
+    METRICS_REFRESH_SECONDS: float = 15.0
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str
 
     #* For JWT auth*
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60
     SECRET_KEY: str = secrets.token_urlsafe(32)
+    # Decoded tokens and users are cached per process. A changed or deleted user is
+    # evicted here at once, but other processes see it only after the user TTL.
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_TOKEN_CACHE_TTL_SECONDS: float = 300
+    AUTH_USER_CACHE_SIZE: int = 10000
+    AUTH_USER_CACHE_TTL_SECONDS: float = 60
+    # Read endpoints take the user id from the signed token without loading the user;
+    # a deleted user's token then keeps working on them until it expires
+    AUTH_TRUST_TOKEN_CLAIMS: bool = False
+
+    # Password hashing; raising BCRYPT_ROUNDS upgrades existing hashes on next login
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
 
     # Database parts
     DATABASE_USER: str
@@ -31,6 +55,36 @@ class Settings(BaseSettings):
 
     ASYNC_DATABASE_URI: PostgresDsn | str = ""
 
+    # Server processes and connection pooling. Postgres' max_connections
+    # (DB_MAX_CONNECTIONS) minus DB_RESERVED_CONNECTIONS is split across the
+    # WEB_CONCURRENCY API workers, each allowed pool_size + DB_MAX_OVERFLOW
+    # connections; that share includes the connection each one holds to
+    # LISTEN for mail status events. The reserve covers everything else:
+    # the mail workers' pools (give them an explicit DB_POOL_SIZE, e.g.
+    # --concurrency + 1, and reserve DB_POOL_SIZE + DB_MAX_OVERFLOW per
+    # worker), migrations and admin sessions.
+    WEB_CONCURRENCY: int = 2
+    DB_MAX_CONNECTIONS: int = 80
+    DB_RESERVED_CONNECTIONS: int = 20
+    DB_POOL_SIZE: int | None = None  # Set to override the derived per-worker size
+    DB_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT_SECONDS: float = 30
+    DB_POOL_RECYCLE_SECONDS: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_CACHE_SIZE: int = 100
+
+    @property
+    def r2_endpoint_url(self) -> str:
+        return self.R2_ENDPOINT_URL or f"https://{self.R2_ACCOUNT_ID}.r2.cloudflarestorage.com"
+
+    @property
+    def db_pool_size(self) -> int:
+        if self.DB_POOL_SIZE is not None:
+            return self.DB_POOL_SIZE
+        available = self.DB_MAX_CONNECTIONS - self.DB_RESERVED_CONNECTIONS
+        per_worker = available // max(self.WEB_CONCURRENCY, 1)
+        return max(per_worker - self.DB_MAX_OVERFLOW, 1)
+
     @field_validator("ASYNC_DATABASE_URI", mode="after")
     def assemble_db_connection(cls, v: str | None, info: FieldValidationInfo) -> Any:
         if isinstance(v, str) and v == "":
@@ -49,14 +103,106 @@ class Settings(BaseSettings):
     R2_ACCESS_KEY_ID: str
     R2_SECRET_ACCESS_KEY: str
     R2_BUCKET_NAME: str
+    # Any S3-compatible endpoint instead of R2 (e.g. a local moto server for benchmarks)
+    R2_ENDPOINT_URL: str | None = None
+
+    # Presigned GET URLs for listings and the vision agent
+    R2_FAST_PRESIGN: bool = True
+    R2_READ_URL_EXPIRES_SECONDS: int = 3600
+    R2_READ_URL_BUCKET_SECONDS: int = 900
+    R2_READ_URL_CACHE_SIZE: int = 20000
 
     OPENAI_API_KEY: str
+    # OpenAI-compatible endpoint to use instead of api.openai.com
+    OPENAI_BASE_URL: str | None = None
 
     VISION_MODEL_NAME: OpenAIModelName = "gpt-5"
     
     MODEL_TEMPERATURE: float = 0.1
     MODEL_TOP_P: float = 0.95
 
+    # Vision extraction scheduler (see app/services/extraction_scheduler_service.py)
+    VISION_MAX_IN_FLIGHT: int = 8
+    VISION_REQUESTS_PER_MINUTE: int = 500
+    VISION_TOKENS_PER_MINUTE: int = 200000
+    VISION_ESTIMATED_TOKENS_PER_REQUEST: int = 2000
+    VISION_RATE_LIMIT_RETRIES: int = 5
+    VISION_RATE_LIMIT_BACKOFF_SECONDS: float = 2.0
+    VISION_RATE_LIMIT_BACKOFF_MAX_SECONDS: float = 60.0
+    # Bulk-lane extractions arriving within the window share one multi-image request.
+    # 1 disables batching; WORKER_CONCURRENCY must be at least this for batches to fill.
+    VISION_BATCH_SIZE: int = 1
+    VISION_BATCH_WINDOW_SECONDS: float = 0.5
+
+    # Extraction result cache (see app/services/extraction_cache_service.py)
+    EXTRACTION_CACHE_ENABLED: bool = True
+    # Also reuse the output for an identical dHash among the same user's images (needs
+    # Pillow). Off by default: different envelopes with the same printed layout can
+    # share a dHash and would get each other's addresses.
+    EXTRACTION_CACHE_PERCEPTUAL_HASH: bool = False
+    EXTRACTION_CACHE_MAX_AGE_DAYS: int = 30
+    EXTRACTION_CACHE_MAX_ROWS: int = 100000
+    EXTRACTION_CACHE_PRUNE_INTERVAL_SECONDS: int = 3600
+
+    # Image preprocessing before extraction (needs Pillow; skipped without it)
+    IMAGE_PREPROCESS_ENABLED: bool = True
+    IMAGE_MAX_DIMENSION: int = 1600
+    IMAGE_JPEG_QUALITY: int = 80
+    IMAGE_PREPROCESS_WORKERS: int = 2
+    IMAGE_DERIVATIVE_PREFIX: str = "derived/"
+
+    # Local OCR pincode fast path (needs pytesseract, the tesseract binary and the pincode index)
+    PINCODE_OCR_ENABLED: bool = False
+    PINCODE_OCR_MAX_DIMENSION: int = 2000
+
+    # India Post pincode API
+    PINCODE_API_BASE_URL: str = "https://api.postalpincode.in"
+    PINCODE_API_TIMEOUT_SECONDS: float = 5.0
+    PINCODE_API_MAX_CONCURRENCY: int = 10
+    PINCODE_API_MAX_RETRIES: int = 3
+    PINCODE_API_RETRY_BACKOFF_SECONDS: float = 0.5
+
+    # Offline index built by app/scripts/load_pincode_directory.py (skipped if missing)
+    PINCODE_INDEX_PATH: str = "app/data/pincode_index.bin"
+
+    # In-process tier in front of the pincode_cache table
+    PINCODE_MEMORY_CACHE_SIZE: int = 4096
+    PINCODE_MEMORY_CACHE_TTL_SECONDS: float = 3600
+    PINCODE_NEGATIVE_CACHE_TTL_SECONDS: float = 300
+    PINCODE_CACHE_SYNC_SECONDS: float = 60
+
+    # Upper bound for the batch upload-URL and batch process endpoints
+    MAIL_BATCH_MAX_SIZE: int = 500
+
+    # Mail status stream (GET /mails/events), fed by LISTEN/NOTIFY
+    MAIL_EVENTS_QUEUE_SIZE: int = 100  # Per subscriber; the oldest events are dropped beyond this
+    MAIL_EVENTS_KEEPALIVE_SECONDS: float = 15.0
+    MAIL_EVENTS_RECONNECT_SECONDS: float = 2.0  # First retry; doubles per failed attempt up to the max
+    MAIL_EVENTS_RECONNECT_MAX_SECONDS: float = 60.0
+    # A half-open LISTEN socket never reports a drop; a SELECT 1 that doesn't answer in time does
+    MAIL_EVENTS_PING_SECONDS: float = 30.0
+    MAIL_EVENTS_PING_TIMEOUT_SECONDS: float = 5.0
+
+    # GET /mails/stats reads the trigger-maintained mail_stats_daily table; turn off to
+    # count straight from mails instead (one GROUP BY over the user's rows). The
+    # triggers run either way: writes to one user's mails on the same day update the
+    # same few bucket rows, so they queue on those row locks until each commits.
+    MAIL_STATS_FROM_SUMMARY: bool = True
+
+    # Mail processing worker (see app/worker.py)
+    WORKER_CONCURRENCY: int = 4
+    WORKER_POLL_INTERVAL_SECONDS: float = 1.0
+    JOB_MAX_ATTEMPTS: int = 5
+    JOB_RETRY_BACKOFF_SECONDS: float = 10.0
+    JOB_RETRY_BACKOFF_MAX_SECONDS: float = 600.0
+    # A worker refreshes the lock of each job it runs every JOB_HEARTBEAT_SECONDS; a
+    # lock not refreshed for JOB_LOCK_TIMEOUT_SECONDS (keep it 3-4 heartbeats) means
+    # the worker is gone, and the job is requeued
+    JOB_HEARTBEAT_SECONDS: int = 30
+    JOB_LOCK_TIMEOUT_SECONDS: int = 120
+    # How often each worker requeues jobs whose lock timed out (a crashed or killed worker's)
+    JOB_RECOVER_INTERVAL_SECONDS: int = 60
+
     model_config = SettingsConfigDict(case_sensitive=True, env_file="../.env")
 
 settings = Settings()
@@ -66,5 +212,10 @@ default_model_settings = OpenAIChatModelSettings(
     top_p=settings.MODEL_TOP_P
 )
 
-openai_provider = OpenAIProvider(api_key=settings.OPENAI_API_KEY)
+# The extraction scheduler owns 429 handling, so the SDK must not retry on its own
+openai_provider = OpenAIProvider(openai_client=AsyncOpenAI(
+    api_key=settings.OPENAI_API_KEY,
+    base_url=settings.OPENAI_BASE_URL,
+    max_retries=0,
+))
 vision_model = OpenAIChatModel(model_name=settings.VISION_MODEL_NAME, provider=openai_provider, settings=default_model_settings)
\ No newline at end of file
@@ -1,7 +1,10 @@
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
+import time
 
 from app.core.config import settings
+from app.utils.cache import TTLCache
+from app.utils.metrics import register_cache
 
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = "HS256"
@@ -18,4 +21,24 @@ def decode_access_token(token: str):
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         return payload
     except JWTError:
-        return None
\ No newline at end of file
+        return None
+
+# Token -> decoded payload; skips signature verification for repeat requests
+token_cache = TTLCache(
+    max_size=settings.AUTH_TOKEN_CACHE_SIZE,
+    ttl_seconds=settings.AUTH_TOKEN_CACHE_TTL_SECONDS,
+)
+register_cache("auth_token", token_cache.stats)
+
+def decode_access_token_cached(token: str):
+    payload = token_cache.get(token, None)
+    if payload is not None:
+        return payload
+
+    payload = decode_access_token(token)
+    if payload:
+        # Never keep a token past its own expiry
+        ttl = min(settings.AUTH_TOKEN_CACHE_TTL_SECONDS, payload.get("exp", 0) - time.time())
+        if ttl > 0:
+            token_cache.set(token, payload, ttl_seconds=ttl)
+    return payload
@@ -1,9 +1,21 @@
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
+from typing import Any
+from uuid import UUID
+from app.core.config import settings
 from app.models.user_model import User
 from app.schemas.user_schema import UserCreate, UserUpdate
-from app.core.security import hash_password
+from app.core.security import hash_password_async
 from app.crud.base_crud import CRUDBase
+from app.utils.cache import TTLCache
+from app.utils.metrics import register_cache
+
+# User id -> detached User, for authentication on every request
+user_cache = TTLCache(
+    max_size=settings.AUTH_USER_CACHE_SIZE,
+    ttl_seconds=settings.AUTH_USER_CACHE_TTL_SECONDS,
+)
+register_cache("auth_user", user_cache.stats)
 
 class UserCRUD(CRUDBase[User, UserCreate, UserUpdate]):
     async def get_by_email(self, db: AsyncSession, email: str) -> User | None:
@@ -14,7 +26,7 @@ class UserCRUD(CRUDBase[User, UserCreate, UserUpdate]):
         db_obj = User(
             username=obj_in.username,
             email=obj_in.email,
-            hashed_password=hash_password(obj_in.password),
+            hashed_password=await hash_password_async(obj_in.password),
         )
         db.add(db_obj)
         try:
@@ -25,4 +37,29 @@ class UserCRUD(CRUDBase[User, UserCreate, UserUpdate]):
         await db.refresh(db_obj)
         return db_obj
 
+    async def get_cached(self, db: AsyncSession, id: Any) -> User | None:
+        """
+        Like get(), but served from the process-wide user cache when possible.
+        The returned User is a detached copy; don't modify or add it to a session.
+        """
+        key = str(id)
+        user = user_cache.get(key, None)
+        if user is None:
+            user = await db.get(User, id)
+            if user is None:
+                return None
+            user = User.model_validate(user.model_dump())
+            user_cache.set(key, user)
+        return user
+
+    async def update(self, db: AsyncSession, *, db_obj: User, obj_in) -> User:
+        user = await super().update(db, db_obj=db_obj, obj_in=obj_in)
+        user_cache.pop(str(user.id))
+        return user
+
+    async def remove(self, db: AsyncSession, *, id: UUID) -> User:
+        user = await super().remove(db, id=id)
+        user_cache.pop(str(id))
+        return user
+
 user_crud = UserCRUD(User)
\ No newline at end of file
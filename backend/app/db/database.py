@@ -1,24 +1,75 @@
+import time
+
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import AsyncAdaptedQueuePool
 
 from app.core.config import settings # Assuming you have a settings file
+from prometheus_client import Counter, Histogram
+
+from app.utils.metrics import registry
+
+# Upper bounds, in seconds, of the pool checkout wait histogram
+POOL_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+pool_wait_seconds = Histogram(
+    "intellipost_db_pool_wait_seconds",
+    "Time sessions waited to check out a pooled connection.",
+    buckets=POOL_WAIT_BUCKETS,
+)
+pool_timeouts_total = Counter(
+    "intellipost_db_pool_timeouts_total",
+    "Checkouts that gave up waiting for a pooled connection.",
+)
+
 
-# These pooling settings are from your first example and are solid
-DB_POOL_SIZE = 83
-WEB_CONCURRENCY = 9
-POOL_SIZE = max(DB_POOL_SIZE // WEB_CONCURRENCY, 5)
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """AsyncAdaptedQueuePool that records checkout wait times in intellipost_db_pool_wait_seconds."""
 
-# Create the async engine
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except Exception:
+            pool_timeouts_total.inc()
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            pool_wait_seconds.observe(waited)
+
+
+# Create the async engine; every process (API worker or mail worker) gets its own pool
 engine = create_async_engine(
     str(settings.ASYNC_DATABASE_URI),
     echo=False,
-    poolclass=AsyncAdaptedQueuePool, # Use a standard pool
-    pool_size=POOL_SIZE,
-    max_overflow=10, # A reasonable overflow
+    poolclass=InstrumentedQueuePool,
+    pool_size=settings.db_pool_size,
+    max_overflow=settings.DB_MAX_OVERFLOW,
+    pool_timeout=settings.DB_POOL_TIMEOUT_SECONDS,
+    pool_recycle=settings.DB_POOL_RECYCLE_SECONDS,
+    pool_pre_ping=settings.DB_POOL_PRE_PING,
+    connect_args={
+        # asyncpg's own cache and SQLAlchemy's; 0 for both behind pgbouncer in transaction mode
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "prepared_statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+    },
 )
 
+
+registry.gauge(
+    "intellipost_db_pool_connections",
+    "Connections in this process's pool, by state.",
+    lambda: {
+        "checked_out": engine.pool.checkedout(),
+        "checked_in": engine.pool.checkedin(),
+        "overflow": max(engine.pool.overflow(), 0),
+    },
+    label="state",
+)
+registry.gauge("intellipost_db_pool_size", "Configured pool_size of this process's pool.", lambda: engine.pool.size())
+
+
 # Create a sessionmaker factory
 # This factory will create new AsyncSession objects when called
 AsyncSessionLocal = sessionmaker(
@@ -27,4 +78,4 @@ AsyncSessionLocal = sessionmaker(
     autoflush=False,
     autocommit=False,
     expire_on_commit=False
-)
\ No newline at end of file
+)
@@ -1,12 +1,35 @@
+from contextlib import asynccontextmanager
+import asyncio
 from fastapi import FastAPI
 from starlette.middleware.cors import CORSMiddleware
 
 from app.api.v1.api import router
 from app.core.config import settings
+from app.services.pincode_lookup_service import close_pincode_api_client
+from app.services.mail_events_service import mail_events
+from app.services.r2_service import R2Service
+from app.utils.metrics import mark_process_dead, multiprocess_enabled, refresh_periodically, register_cache, registry
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Built once per process: boto3 clients are costly to construct. Extraction (and its
+    # pydantic-ai agents) only runs in the mail worker.
+    app.state.r2_service = R2Service()
+    register_cache("r2_read_url", app.state.r2_service.read_url_cache.stats)
+    refresher = None
+    if settings.METRICS_ENABLED and multiprocess_enabled():
+        refresher = asyncio.create_task(refresh_periodically(settings.METRICS_REFRESH_SECONDS))
+    yield
+    if refresher is not None:
+        refresher.cancel()
+        mark_process_dead()
+    await mail_events.close()
+    await close_pincode_api_client()
 
 app = FastAPI(
     title=settings.PROJECT_NAME,
-    openapi_url=f"{settings.API_V1_STR}/openapi.json"
+    openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -15,6 +38,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Routers
@@ -22,4 +46,7 @@ app.include_router(router, prefix=settings.API_V1_STR)
 
 @app.get("/")
 def read_root():
-    return {"message": "Welcome to the Intellipost API"}
\ No newline at end of file
+    return {"message": "Welcome to the Intellipost API"}
+
+# Scraped on API_METRICS_PORT, which app.serve opens; not part of the public API
+registry.gauge("intellipost_mail_event_subscribers", "Open SSE mail status streams.", mail_events.subscriber_count)
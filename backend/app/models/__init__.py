@@ -1,3 +1,7 @@
 from .user_model import User
 from .mail_model import Mail
-from .pincode_cache_model import PincodeCache
\ No newline at end of file
+from .mail_job_model import MailJob
+from .pincode_cache_model import PincodeCache
+from .extraction_cache_model import ExtractionCache
+from .mail_stats_model import MailStatsDaily
+from .mail_payload_model import MailPayload
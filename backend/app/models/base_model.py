@@ -5,7 +5,7 @@ from uuid import UUID, uuid4
 
 class BaseUUIDModel(SQLModel):
 
-    id: UUID = Field(default_factory=uuid4, primary_key=True, index=True, nullable=False)
+    id: UUID = Field(default_factory=uuid4, primary_key=True, nullable=False)
 
     created_at: datetime = Field(
         default_factory=datetime.utcnow,
@@ -1,7 +1,18 @@
-from enum import Enum
+from enum import Enum, IntEnum
 
 class ProcessingStatus(str, Enum):
     PENDING = "pending"       # Uploaded to S3, waiting for Agent
     PROCESSING = "processing" # Agent is currently "looking" at it
     COMPLETED = "completed"   # Data extracted successfully
-    FAILED = "failed"
\ No newline at end of file
+    FAILED = "failed"
+
+class JobStatus(str, Enum):
+    QUEUED = "queued"     # Waiting for a worker (or for its retry backoff to pass)
+    RUNNING = "running"   # Claimed by a worker
+    DONE = "done"         # Processed successfully
+    DEAD = "dead"         # Retries exhausted, needs manual attention
+
+
+class ExtractionLane(IntEnum):
+    INTERACTIVE = 0   # Single uploads a user is waiting on
+    BULK = 1          # Batch uploads from sorting-line scanners
@@ -0,0 +1,27 @@
+from datetime import datetime
+from sqlmodel import SQLModel, Field
+from sqlalchemy import BigInteger, Column, Index, JSON
+from uuid import UUID
+
+class ExtractionCache(SQLModel, table=True):
+    """
+    Vision agent output keyed by the image it was extracted from, so a
+    re-scanned or duplicate envelope doesn't pay for a second LLM call.
+    """
+    __tablename__ = "extraction_cache"
+    __table_args__ = (
+        # Perceptual matches are only looked up among the same user's images
+        Index("ix_extraction_cache_user_id_perceptual_hash", "user_id", "perceptual_hash"),
+    )
+
+    content_hash: str = Field(primary_key=True)  # sha256 of the uploaded bytes
+    # 64-bit dHash stored as a signed bigint; matches re-encoded copies of the same image
+    perceptual_hash: int | None = Field(default=None, sa_column=Column(BigInteger))
+    # Owner of the mail the output was first extracted for
+    user_id: UUID | None = Field(default=None, foreign_key="users.id", ondelete="CASCADE")
+
+    output: dict = Field(default={}, sa_column=Column(JSON))
+
+    hits: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    last_used_at: datetime = Field(default_factory=datetime.utcnow, index=True)
@@ -0,0 +1,35 @@
+from datetime import datetime
+from sqlmodel import Field
+from sqlalchemy import Index, text
+from uuid import UUID
+
+from .base_model import BaseUUIDModel
+from .enums import ExtractionLane, JobStatus
+
+class MailJob(BaseUUIDModel, table=True):
+    """
+    Durable queue entry for a mail that still needs processing.
+    Workers claim rows with SELECT ... FOR UPDATE SKIP LOCKED, so any number
+    of worker processes can share the table without double-processing a mail.
+    """
+    __tablename__ = "mail_jobs"
+    __table_args__ = (
+        # Partial, so finished jobs piling up don't grow what claim() and recover() scan
+        Index("ix_mail_jobs_queued", "priority", "run_after", postgresql_where=text("status = 'QUEUED'")),
+        Index("ix_mail_jobs_running", "locked_at", postgresql_where=text("status = 'RUNNING'")),
+    )
+
+    mail_id: UUID = Field(foreign_key="mails.id", ondelete="CASCADE", unique=True, index=True)
+    file_key: str
+
+    status: JobStatus = Field(default=JobStatus.QUEUED)
+    # ExtractionLane value; lower runs first
+    priority: int = Field(default=ExtractionLane.INTERACTIVE, sa_column_kwargs={"server_default": "0"})
+    attempts: int = Field(default=0)
+    max_attempts: int = Field(default=5)
+
+    run_after: datetime = Field(default_factory=datetime.utcnow)
+    locked_at: datetime | None = None
+    # Set by each claim; updates from a worker whose claim was since requeued match nothing
+    claim_token: UUID | None = None
+    last_error: str | None = None
@@ -1,7 +1,8 @@
 from typing import TYPE_CHECKING, Optional, Any
 from sqlmodel import SQLModel, Field, Relationship
-from sqlalchemy import Column, JSON
+from sqlalchemy import Index, text
 from uuid import UUID
+from datetime import datetime
 
 from .base_model import BaseUUIDModel
 from .enums import ProcessingStatus
@@ -10,26 +11,33 @@ if TYPE_CHECKING:
     from .user_model import User
 
 class MailBase(SQLModel):
-    image_s3_key: str = Field(index=True)
+    image_s3_key: str = Field(index=True, unique=True)
     image_url: str 
     
     status: ProcessingStatus = Field(default=ProcessingStatus.PENDING)
     
     receiver_name: str | None = None
     receiver_address: str | None = None
-    receiver_pincode: str | None = Field(default=None, index=True) 
+    receiver_pincode: str | None = None
     
     sender_name: str | None = None
     sender_address: str | None = None
     sender_pincode: str | None = None
     
     assigned_sorting_center: str | None = None
+    # When assigned_sorting_center was set to its current value, by local OCR or the vision model
+    sorted_at: datetime | None = None
 
 class Mail(BaseUUIDModel, MailBase, table=True):
     __tablename__ = "mails"
-    
-    raw_ai_response: dict | list | None = Field(default=None, sa_column=Column(JSON))
+    __table_args__ = (
+        # Serves the per-user history listing, including keyset pagination
+        Index("ix_mails_user_id_created_at_id", "user_id", text("created_at DESC"), text("id DESC")),
+        # Unfinished mails only, for the worker's recovery scan
+        Index("ix_mails_unfinished", "id", postgresql_where=text("status IN ('PENDING', 'PROCESSING')")),
+    )
+    # The raw vision model output lives in mail_payloads (MailPayload)
 
-    user_id: UUID = Field(foreign_key="users.id", index=True)
+    user_id: UUID = Field(foreign_key="users.id")
     user: "User" = Relationship(back_populates="mails")
     
\ No newline at end of file
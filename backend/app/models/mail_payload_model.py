@@ -0,0 +1,18 @@
+from datetime import datetime
+from sqlmodel import SQLModel, Field
+from sqlalchemy import Column
+from sqlalchemy.dialects.postgresql import JSONB
+from uuid import UUID
+
+class MailPayload(SQLModel, table=True):
+    """
+    Raw vision model output for a mail, kept out of the mails table so the
+    listing and status queries don't read it with every row. Only the
+    detail endpoint and the full listing view join it in.
+    """
+    __tablename__ = "mail_payloads"
+
+    mail_id: UUID = Field(foreign_key="mails.id", ondelete="CASCADE", primary_key=True)
+    raw_ai_response: dict | list | None = Field(default=None, sa_column=Column(JSONB))
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
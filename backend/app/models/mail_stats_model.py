@@ -0,0 +1,27 @@
+from datetime import date
+from sqlmodel import SQLModel, Field
+from uuid import UUID
+
+from .enums import ProcessingStatus
+
+class MailStatsDaily(SQLModel, table=True):
+    """
+    Mail counts per user, creation day, status and sorting center, kept up
+    to date by statement-level triggers on mails (see the migration), so the
+    dashboard stats never have to scan a user's mails.
+
+    The price is on writes: every statement that inserts or changes a user's
+    mails upserts that user's bucket rows for the day, so concurrent
+    transactions for one user (a scanner's batches, the workers completing
+    its mails) take turns on those rows until each commits. Different users
+    don't contend.
+    """
+    __tablename__ = "mail_stats_daily"
+
+    user_id: UUID = Field(foreign_key="users.id", ondelete="CASCADE", primary_key=True)
+    day: date = Field(primary_key=True)  # UTC date of mails.created_at
+    status: ProcessingStatus = Field(primary_key=True)
+    # "" while the mail has no assigned_sorting_center (primary key columns can't be NULL)
+    sorting_center: str = Field(default="", primary_key=True)
+
+    count: int = Field(default=0)
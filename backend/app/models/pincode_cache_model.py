@@ -1,6 +1,7 @@
 from typing import Optional
 from sqlmodel import SQLModel, Field
-from sqlalchemy import Column, JSON
+from sqlalchemy import Column
+from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 
 class PincodeCache(SQLModel, table=True):
@@ -10,12 +11,12 @@ class PincodeCache(SQLModel, table=True):
     """
     __tablename__ = "pincode_cache"
 
-    pincode: str = Field(primary_key=True, index=True)
+    pincode: str = Field(primary_key=True)
     
     sorting_district: str  # e.g., "Hyderabad"
     sorting_division: str  # e.g., "Hyderabad City"
     state: str             # e.g., "Telangana"
     
-    raw_api_data: list | dict = Field(default={}, sa_column=Column(JSON))
+    raw_api_data: list | dict = Field(default={}, sa_column=Column(JSONB))
     
     updated_at: datetime = Field(default_factory=datetime.utcnow)
\ No newline at end of file
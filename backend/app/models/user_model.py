@@ -9,10 +9,10 @@ if TYPE_CHECKING:
 
 class UserBase(SQLModel):
     username: str
-    email: EmailStr = Field()
+    email: EmailStr = Field(index=True, unique=True)
 
 class User(BaseUUIDModel, UserBase, table=True):
     __tablename__ = "users"
 
-    hashed_password: str | None = Field(default=None, nullable=False, index=True)
+    hashed_password: str | None = Field(default=None, nullable=False)
     mails: list["Mail"] = Relationship(back_populates="user", sa_relationship_kwargs={"cascade": "all, delete"})
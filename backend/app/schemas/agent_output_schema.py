@@ -2,6 +2,32 @@ from pydantic import BaseModel, Field, field_validator
 import re
 
 
+def normalize_pincode(v: str | None) -> str:
+    """Returns the first 6-digit pincode in `v`, or "" if there isn't one."""
+    if not v or v.strip() == "":
+        return ""
+    
+    v = v.strip()
+    
+    # If multiple pincodes detected, take only the first valid one
+    if ',' in v or '/' in v or ' ' in v:
+        parts = re.split(r'[,/\s]+', v)
+        for part in parts:
+            part = part.strip()
+            if re.match(r'^\d{6}$', part):
+                return part
+        return ""
+    
+    # Validate single pincode format (exactly 6 digits)
+    if not re.match(r'^\d{6}$', v):
+        match = re.search(r'\d{6}', v)
+        if match:
+            return match.group()
+        return ""
+    
+    return v
+
+
 class VisionOutput(BaseModel):
     receiver_name: str = Field(
         description="Full name of the mail recipient. Extract from 'To:' section."
@@ -35,28 +61,7 @@ class VisionOutput(BaseModel):
     @field_validator('receiver_pincode', 'sender_pincode')
     @classmethod
     def validate_pincode(cls, v: str) -> str:
-        if not v or v.strip() == "":
-            return ""
-        
-        v = v.strip()
-        
-        # If multiple pincodes detected, take only the first valid one
-        if ',' in v or '/' in v or ' ' in v:
-            parts = re.split(r'[,/\s]+', v)
-            for part in parts:
-                part = part.strip()
-                if re.match(r'^\d{6}$', part):
-                    return part
-            return ""
-        
-        # Validate single pincode format (exactly 6 digits)
-        if not re.match(r'^\d{6}$', v):
-            match = re.search(r'\d{6}', v)
-            if match:
-                return match.group()
-            return ""
-        
-        return v
+        return normalize_pincode(v)
 
     @field_validator('receiver_name', 'sender_name', 'receiver_address', 'sender_address')
     @classmethod
@@ -64,4 +69,10 @@ class VisionOutput(BaseModel):
         if not v:
             return ""
         # Remove null bytes and strip whitespace
-        return v.replace('\x00', '').replace('\u0000', '').strip()
\ No newline at end of file
+        return v.replace('\x00', '').replace('\u0000', '').strip()
+
+
+class BatchedVisionOutput(VisionOutput):
+    image_index: int = Field(
+        description="Position of the envelope's image in the request, starting at 0."
+    )
@@ -0,0 +1,61 @@
+from pydantic import BaseModel, Field, TypeAdapter
+from datetime import date, datetime
+from enum import Enum
+from uuid import UUID
+
+from app.core.config import settings
+from app.models.enums.enums import ProcessingStatus
+
+class MailView(str, Enum):
+    summary = "summary"  # Everything except raw_ai_response
+    full = "full"
+
+class MailSummary(BaseModel):
+    id: UUID
+    user_id: UUID
+    image_url: str | None = None
+    image_s3_key: str
+    status: ProcessingStatus
+    receiver_name: str | None = None
+    receiver_address: str | None = None
+    receiver_pincode: str | None = None
+    sender_name: str | None = None
+    sender_address: str | None = None
+    sender_pincode: str | None = None
+    assigned_sorting_center: str | None = None
+    sorted_at: datetime | None = None
+    created_at: datetime
+    updated_at: datetime | None = None
+
+class MailDetail(MailSummary):
+    raw_ai_response: dict | list | None = None
+
+class UploadUrl(BaseModel):
+    upload_url: str
+    file_key: str
+
+class MailBatchCreate(BaseModel):
+    file_keys: list[str] = Field(min_length=1, max_length=settings.MAIL_BATCH_MAX_SIZE)
+
+class MailQueued(BaseModel):
+    id: UUID
+    file_key: str
+    status: ProcessingStatus
+
+class SortingCenterCount(BaseModel):
+    sorting_center: str | None  # None counts mails not sorted yet
+    count: int
+
+class DayCount(BaseModel):
+    day: date
+    count: int
+
+class MailStats(BaseModel):
+    total: int
+    by_status: dict[ProcessingStatus, int]
+    by_sorting_center: list[SortingCenterCount]  # Largest first
+    by_day: list[DayCount]  # Oldest first; days without mail are left out
+    since: date | None = None
+
+# Serializes a page straight to JSON bytes in pydantic-core
+mail_list_adapter = TypeAdapter(list[MailDetail])
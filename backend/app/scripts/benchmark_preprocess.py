@@ -0,0 +1,99 @@
+"""
+Measures what image preprocessing saves on a folder of sample envelopes.
+
+Run from the backend directory:
+    python -m app.scripts.benchmark_preprocess samples/
+    python -m app.scripts.benchmark_preprocess samples/ --extract
+
+Without --extract only bytes and preprocessing time are reported. With it,
+each image is also sent to the vision model twice (original and derivative,
+as data URLs) and latency and input tokens are compared. That costs money.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import asyncio
+import base64
+import os
+import statistics
+import time
+
+from app.core.config import settings
+from app.utils.image_preprocess import preprocess_image
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".heic")
+
+
+def _data_url(image: bytes) -> str:
+    return "data:image/jpeg;base64," + base64.b64encode(image).decode()
+
+
+async def _extract(agent, image: bytes) -> tuple[float, int]:
+    started = time.perf_counter()
+    _, usage = await agent.run_agent_with_usage(user_input="", image_url=_data_url(image))
+    return time.perf_counter() - started, usage.input_tokens
+
+
+async def _compare_extraction(pairs: list[tuple[bytes, bytes]]) -> None:
+    from app.services.agent_service import AgentService
+
+    agent = AgentService()
+    original_latency, original_tokens, derived_latency, derived_tokens = [], [], [], []
+    for original, derivative in pairs:
+        latency, tokens = await _extract(agent, original)
+        original_latency.append(latency)
+        original_tokens.append(tokens)
+        latency, tokens = await _extract(agent, derivative)
+        derived_latency.append(latency)
+        derived_tokens.append(tokens)
+
+    print(f"Extraction latency: original median {statistics.median(original_latency):.2f}s, "
+          f"derivative median {statistics.median(derived_latency):.2f}s")
+    print(f"Input tokens: original {sum(original_tokens)}, derivative {sum(derived_tokens)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark image preprocessing")
+    parser.add_argument("directory")
+    parser.add_argument("--max-dimension", type=int, default=settings.IMAGE_MAX_DIMENSION)
+    parser.add_argument("--quality", type=int, default=settings.IMAGE_JPEG_QUALITY)
+    parser.add_argument("--workers", type=int, default=settings.IMAGE_PREPROCESS_WORKERS)
+    parser.add_argument("--extract", action="store_true", help="Also compare vision model latency and tokens")
+    args = parser.parse_args()
+
+    paths = sorted(
+        os.path.join(args.directory, name)
+        for name in os.listdir(args.directory)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+    images = []
+    for path in paths:
+        with open(path, "rb") as file:
+            images.append(file.read())
+    if not images:
+        parser.error(f"No images found in {args.directory}")
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        derivatives = list(pool.map(
+            preprocess_image,
+            images,
+            [args.max_dimension] * len(images),
+            [args.quality] * len(images),
+        ))
+    elapsed = time.perf_counter() - started
+
+    # Images that wouldn't shrink are sent as-is, like in process_mail_task
+    pairs = [(image, derivative or image) for image, derivative in zip(images, derivatives)]
+    bytes_in = sum(len(image) for image, _ in pairs)
+    bytes_out = sum(len(derivative) for _, derivative in pairs)
+    print(f"Preprocessed {len(pairs)} images with {args.workers} worker(s) in {elapsed:.2f}s "
+          f"({elapsed / len(pairs) * 1000:.0f} ms/image)")
+    print(f"Bytes sent: {bytes_in / 2**20:.2f} MiB -> {bytes_out / 2**20:.2f} MiB "
+          f"({bytes_out / bytes_in:.0%}); {sum(1 for d in derivatives if d is None)} image(s) left unchanged")
+
+    if args.extract:
+        asyncio.run(_compare_extraction(pairs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Bulk-loads the India Post "All India Pincode Directory" CSV.
+
+Run from the backend directory:
+    python -m app.scripts.load_pincode_directory all_india_pincode.csv
+
+Rows are grouped per pincode and COPY'd into a temp table, then upserted
+into pincode_cache in one statement. The offline index read by
+PincodeLookupService is written to PINCODE_INDEX_PATH alongside.
+"""
+from collections import Counter, defaultdict
+from datetime import datetime
+import argparse
+import asyncio
+import csv
+import json
+import os
+import resource
+import time
+
+from app.core.config import settings
+from app.utils.pincode_index import PincodeIndex
+
+# Header names differ between releases of the directory
+PINCODE_COLUMNS = ("pincode",)
+DIVISION_COLUMNS = ("divisionname", "division")
+DISTRICT_COLUMNS = ("district", "districtname")
+STATE_COLUMNS = ("statename", "state")
+OFFICE_COLUMNS = ("officename", "office")
+
+
+def _column(header: list[str], candidates: tuple[str, ...]) -> int:
+    normalized = [name.strip().lower() for name in header]
+    for candidate in candidates:
+        if candidate in normalized:
+            return normalized.index(candidate)
+    raise ValueError(f"CSV has none of the columns {candidates}")
+
+
+def _clean_division(name: str) -> str:
+    # The API reports "Hyderabad City" where the directory says "Hyderabad City Division"
+    name = name.strip()
+    if name.lower().endswith(" division"):
+        name = name[: -len(" division")]
+    return name
+
+
+def read_directory(path: str) -> list[tuple[str, str, str, str, list[str]]]:
+    """
+    Returns one (pincode, district, division, state, office_names) row per pincode.
+    A pincode is served by several post offices; the most common division wins.
+    """
+    offices = defaultdict(list)
+    with open(path, newline="", encoding="utf-8-sig", errors="replace") as file:
+        reader = csv.reader(file)
+        header = next(reader)
+        pin_col = _column(header, PINCODE_COLUMNS)
+        division_col = _column(header, DIVISION_COLUMNS)
+        district_col = _column(header, DISTRICT_COLUMNS)
+        state_col = _column(header, STATE_COLUMNS)
+        office_col = _column(header, OFFICE_COLUMNS)
+
+        for row in reader:
+            pincode = row[pin_col].strip()
+            if len(pincode) != 6 or not pincode.isdigit():
+                continue
+            offices[pincode].append((
+                row[district_col].strip(),
+                _clean_division(row[division_col]),
+                row[state_col].strip(),
+                row[office_col].strip(),
+            ))
+
+    rows = []
+    for pincode, entries in offices.items():
+        district, division, state = Counter(entry[:3] for entry in entries).most_common(1)[0][0]
+        rows.append((pincode, district, division, state, [entry[3] for entry in entries]))
+    return rows
+
+
+async def copy_into_cache(rows: list[tuple[str, str, str, str, list[str]]]) -> None:
+    from app.db.database import engine
+
+    now = datetime.utcnow()
+    records = [
+        (pincode, district, division, state, json.dumps({"source": "directory", "offices": office_names}), now)
+        for pincode, district, division, state, office_names in rows
+    ]
+
+    async with engine.connect() as connection:
+        raw = await connection.get_raw_connection()
+        driver = raw.driver_connection
+        async with driver.transaction():
+            await driver.execute(
+                "CREATE TEMP TABLE pincode_stage (LIKE pincode_cache INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+            await driver.copy_records_to_table(
+                "pincode_stage",
+                records=records,
+                columns=["pincode", "sorting_district", "sorting_division", "state", "raw_api_data", "updated_at"],
+            )
+            await driver.execute(
+                """
+                INSERT INTO pincode_cache (pincode, sorting_district, sorting_division, state, raw_api_data, updated_at)
+                SELECT pincode, sorting_district, sorting_division, state, raw_api_data, updated_at FROM pincode_stage
+                ON CONFLICT (pincode) DO UPDATE SET
+                    sorting_district = EXCLUDED.sorting_district,
+                    sorting_division = EXCLUDED.sorting_division,
+                    state = EXCLUDED.state,
+                    raw_api_data = EXCLUDED.raw_api_data,
+                    updated_at = EXCLUDED.updated_at
+                """
+            )
+
+    await engine.dispose()
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # Peak rather than current RSS, reported in KiB on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load the India Post pincode directory")
+    parser.add_argument("csv_path")
+    parser.add_argument("--index-path", default=settings.PINCODE_INDEX_PATH)
+    parser.add_argument("--skip-db", action="store_true", help="Only build the offline index")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    rows = read_directory(args.csv_path)
+    print(f"Parsed {len(rows)} pincodes in {time.perf_counter() - started:.2f}s")
+
+    if not args.skip_db:
+        started = time.perf_counter()
+        asyncio.run(copy_into_cache(rows))
+        print(f"Upserted {len(rows)} rows into pincode_cache in {time.perf_counter() - started:.2f}s")
+
+    if args.index_path:
+        os.makedirs(os.path.dirname(args.index_path) or ".", exist_ok=True)
+        started = time.perf_counter()
+        count = PincodeIndex.build(((p, d, v, s) for p, d, v, s, _ in rows), args.index_path)
+        print(f"Wrote {count} pincodes to {args.index_path} "
+              f"({os.path.getsize(args.index_path) / 1024:.0f} KiB) in {time.perf_counter() - started:.2f}s")
+
+        rss_before = _rss_mb()
+        started = time.perf_counter()
+        index = PincodeIndex(args.index_path)
+        hits = sum(1 for pincode, *_ in rows if index.get(pincode))
+        print(f"Mapped index and looked up {hits} pincodes in {time.perf_counter() - started:.3f}s, "
+              f"RSS +{_rss_mb() - rss_before:.1f} MiB")
+        index.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Mixed login + history traffic against a running API, to see how much a
+login burst slows everyone else down on the same worker.
+
+Start a single uvicorn worker, register a user, then run from the backend
+directory:
+    python -m app.scripts.load_test_login --email a@b.com --password secret
+
+Reports latency percentiles for GET /mails/ with and without concurrent logins.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def _percentiles(samples: list[float]) -> str:
+    if not samples:
+        return "no samples"
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return (f"n={len(ordered)} p50={statistics.median(ordered) * 1000:.0f}ms "
+            f"p99={p99 * 1000:.0f}ms max={ordered[-1] * 1000:.0f}ms")
+
+
+async def _login_loop(client: httpx.AsyncClient, email: str, password: str, stop: asyncio.Event, latencies: list[float]):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.post("/auth/login", json={"email": email, "password": password})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+
+async def _history_loop(client: httpx.AsyncClient, token: str, stop: asyncio.Event, latencies: list[float]):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/mails/", headers={"Authorization": token}, params={"limit": 20})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+
+
+async def _phase(client, token, email, password, logins: int, readers: int, duration: float):
+    stop = asyncio.Event()
+    login_latencies, history_latencies = [], []
+    tasks = [asyncio.create_task(_login_loop(client, email, password, stop, login_latencies)) for _ in range(logins)]
+    tasks += [asyncio.create_task(_history_loop(client, token, stop, history_latencies)) for _ in range(readers)]
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return login_latencies, history_latencies
+
+
+async def run(base_url: str, email: str, password: str, logins: int, readers: int, duration: float):
+    limits = httpx.Limits(max_connections=logins + readers + 1)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        response = await client.post("/auth/login", json={"email": email, "password": password})
+        response.raise_for_status()
+        token = response.json()["access_token"]
+
+        _, baseline = await _phase(client, token, email, password, 0, readers, duration)
+        print(f"GET /mails/ alone:        {_percentiles(baseline)}")
+
+        login_latencies, mixed = await _phase(client, token, email, password, logins, readers, duration)
+        print(f"GET /mails/ during logins: {_percentiles(mixed)}")
+        print(f"POST /auth/login:          {_percentiles(login_latencies)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test logins mixed with history reads")
+    parser.add_argument("--base-url", default="http://localhost:8000/api/v1")
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--password", required=True)
+    parser.add_argument("--logins", type=int, default=20, help="Concurrent login loops")
+    parser.add_argument("--readers", type=int, default=20, help="Concurrent GET /mails/ loops")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds per phase")
+    args = parser.parse_args()
+    asyncio.run(run(args.base_url, args.email, args.password, args.logins, args.readers, args.duration))
+
+
+if __name__ == "__main__":
+    main()
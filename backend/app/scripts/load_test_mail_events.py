@@ -0,0 +1,79 @@
+"""
+Opens many idle subscribers on the mail status stream and counts the
+events that reach them.
+
+Start a single uvicorn worker, then run from the backend directory:
+    python -m app.scripts.load_test_mail_events --token <JWT> --subscribers 5000
+
+While it waits, process a mail for the token's user (or run
+`UPDATE mails SET status = status ...` in psql) to check that every
+subscriber gets the event. Raise the open-file limit (ulimit -n) on both
+ends first.
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+async def _subscribe(client: httpx.AsyncClient, url: str, token: str, connected: asyncio.Event,
+                     stats: dict, stop: asyncio.Event) -> None:
+    try:
+        async with client.stream("GET", url, headers={"Authorization": token}) as response:
+            if response.status_code != 200:
+                stats["failed"] += 1
+                return
+            stats["connected"] += 1
+            if stats["connected"] + stats["failed"] >= stats["target"]:
+                connected.set()
+            async for line in response.aiter_lines():
+                if line.startswith("event: status"):
+                    stats["events"] += 1
+                if stop.is_set():
+                    return
+    except httpx.HTTPError:
+        stats["failed"] += 1
+        if stats["connected"] + stats["failed"] >= stats["target"]:
+            connected.set()
+
+
+async def run(url: str, token: str, subscribers: int, duration: float) -> None:
+    stats = {"target": subscribers, "connected": 0, "failed": 0, "events": 0}
+    connected, stop = asyncio.Event(), asyncio.Event()
+    limits = httpx.Limits(max_connections=subscribers, max_keepalive_connections=0)
+    timeout = httpx.Timeout(connect=30.0, read=None, write=30.0, pool=None)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        started = time.perf_counter()
+        tasks = [
+            asyncio.create_task(_subscribe(client, url, token, connected, stats, stop))
+            for _ in range(subscribers)
+        ]
+        await connected.wait()
+        print(f"{stats['connected']} subscribers connected ({stats['failed']} failed) "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        print(f"Listening for {duration:.0f}s...")
+        await asyncio.sleep(duration)
+        stop.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(f"Received {stats['events']} status events "
+          f"({stats['events'] / max(stats['connected'], 1):.2f} per subscriber)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test GET /mails/events")
+    parser.add_argument("--url", default="http://localhost:8000/api/v1/mails/events")
+    parser.add_argument("--token", required=True, help="Value for the Authorization header")
+    parser.add_argument("--subscribers", type=int, default=5000)
+    parser.add_argument("--duration", type=float, default=60.0)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.token, args.subscribers, args.duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Reports how much the mail tables take on disk and how many pages the
+history queries touch, to compare a database before and after moving the
+raw payloads out of the mails table. Read-only; run from the backend
+directory against a populated database (staging or a restored copy):
+    python -m app.scripts.measure_mail_storage
+    alembic upgrade head
+    python -m app.scripts.measure_mail_storage
+
+Buffer counts come from EXPLAIN (ANALYZE, BUFFERS) of one page of the
+busiest user's history, in both views, plus the detail query.
+"""
+import argparse
+import asyncio
+import json
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from app.db.database import engine
+
+TABLES = ("mails", "mail_payloads", "pincode_cache")
+
+HISTORY_QUERY = """
+    SELECT m.id, m.status, m.receiver_name, m.receiver_pincode, m.assigned_sorting_center, m.created_at
+    FROM mails m WHERE m.user_id = :user_id
+    ORDER BY m.created_at DESC, m.id DESC LIMIT :limit
+"""
+
+
+def _mb(size: int | None) -> str:
+    return "-" if size is None else f"{size / 1024 / 1024:10.1f} MB"
+
+
+async def _sizes(connection: AsyncConnection) -> None:
+    print(f"{'table':<16}{'heap':>14}{'toast':>14}{'indexes':>14}{'rows':>12}")
+    for table in TABLES:
+        row = (await connection.execute(
+            text("""
+                SELECT pg_relation_size(c.oid), pg_relation_size(nullif(c.reltoastrelid, 0)),
+                       pg_indexes_size(c.oid), c.reltuples::bigint
+                FROM pg_class c WHERE c.oid = to_regclass(:table)
+            """),
+            {"table": table},
+        )).first()
+        if row is None:
+            print(f"{table:<16}{'(missing)':>14}")
+            continue
+        heap, toast, indexes, rows = row
+        print(f"{table:<16}{_mb(heap):>14}{_mb(toast):>14}{_mb(indexes):>14}{rows:>12}")
+
+
+def _buffers(plan: dict) -> tuple[int, int]:
+    # The top node's counts already include its children
+    return plan.get("Shared Hit Blocks", 0), plan.get("Shared Read Blocks", 0)
+
+
+async def _explain(connection: AsyncConnection, name: str, query: str, params: dict) -> None:
+    document = (await connection.execute(
+        text("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query), params
+    )).scalar()
+    if isinstance(document, str):
+        document = json.loads(document)
+    plan = document[0]
+    hit, read = _buffers(plan["Plan"])
+    print(f"{name:<28}{plan['Execution Time']:9.2f}ms  shared hit={hit:<8} read={read}")
+
+
+async def run(limit: int) -> None:
+    async with engine.connect() as connection:
+        await _sizes(connection)
+
+        busiest = (await connection.execute(
+            text("SELECT user_id FROM mails GROUP BY user_id ORDER BY count(*) DESC LIMIT 1")
+        )).scalar()
+        if busiest is None:
+            print("No mails to query")
+            return
+        sample = (await connection.execute(
+            text("SELECT id FROM mails WHERE user_id = :user_id ORDER BY created_at DESC LIMIT 1"),
+            {"user_id": busiest},
+        )).scalar()
+        has_payloads = (await connection.execute(text("SELECT to_regclass('mail_payloads')"))).scalar() is not None
+        # Before the move m.* carries the payload; afterwards it is joined in
+        payload_join = "LEFT JOIN mail_payloads p ON p.mail_id = m.id" if has_payloads else ""
+        payload_column = ", p.raw_ai_response" if has_payloads else ""
+
+        print()
+        await _explain(connection, "history page (summary)", HISTORY_QUERY, {"user_id": busiest, "limit": limit})
+        await _explain(
+            connection,
+            "history page (full)",
+            f"""
+                SELECT m.*{payload_column} FROM mails m {payload_join}
+                WHERE m.user_id = :user_id ORDER BY m.created_at DESC, m.id DESC LIMIT :limit
+            """,
+            {"user_id": busiest, "limit": limit},
+        )
+        await _explain(
+            connection,
+            "mail detail",
+            f"SELECT m.*{payload_column} FROM mails m {payload_join} WHERE m.id = :mail_id",
+            {"mail_id": sample},
+        )
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report mail table sizes and history query buffer usage")
+    parser.add_argument("--limit", type=int, default=20, help="History page size")
+    args = parser.parse_args()
+    asyncio.run(run(args.limit))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Production entrypoint for the API, used by the Docker image:
+    python -m app.serve
+
+The worker count comes from WEB_CONCURRENCY in Settings, the same value
+app/db/database.py divides the connection budget by, so the pools of all
+workers together stay within DB_MAX_CONNECTIONS less DB_RESERVED_CONNECTIONS,
+which is left to the mail workers, migrations and admin sessions.
+
+Prometheus metrics are served by this process on API_METRICS_PORT, apart
+from the public port, so they don't need to be hidden from the internet.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import glob
+import os
+import tempfile
+import threading
+
+import uvicorn
+
+from app.core.config import settings
+
+
+def prepare_metrics_dir() -> str:
+    """
+    Points prometheus_client at a directory shared by the uvicorn workers, so
+    the metrics served from this process cover all of them. Must run before
+    they start.
+    Samples left by a previous run are removed.
+    """
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="intellipost-metrics-")
+    os.makedirs(directory, exist_ok=True)
+    for stale in glob.glob(os.path.join(directory, "*.db")):
+        os.remove(stale)
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = directory
+    return directory
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        # Imported late: PROMETHEUS_MULTIPROC_DIR has to be set before app.utils.metrics loads
+        from app.utils.metrics import content_type, registry
+
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int) -> ThreadingHTTPServer:
+    """Answers every GET on `port` with the metrics registry, from a daemon thread."""
+    server = ThreadingHTTPServer(("0.0.0.0", port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IntelliPost API server")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--metrics-port", type=int, default=settings.API_METRICS_PORT,
+                        help="Internal port for Prometheus metrics; 0 to disable")
+    args = parser.parse_args()
+
+    if settings.METRICS_ENABLED and settings.WEB_CONCURRENCY > 1:
+        print(f"Sharing metrics between workers through {prepare_metrics_dir()}")
+    if settings.METRICS_ENABLED and args.metrics_port:
+        start_metrics_server(args.metrics_port)
+        print(f"Serving metrics on port {args.metrics_port}")
+    print(f"Starting {settings.WEB_CONCURRENCY} worker(s), each with a pool of "
+          f"{settings.db_pool_size} + {settings.DB_MAX_OVERFLOW} overflow connections")
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=settings.WEB_CONCURRENCY,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
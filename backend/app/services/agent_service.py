@@ -1,6 +1,13 @@
 from app.core.config import vision_model
 from pydantic_ai import Agent, ImageUrl
-from app.schemas.agent_output_schema import VisionOutput
+from pydantic_ai.usage import RunUsage
+from app.schemas.agent_output_schema import VisionOutput, BatchedVisionOutput
+
+
+def _run_usage(result) -> RunUsage:
+    # A method on pydantic-ai 1.x results, a property on later releases
+    usage = result.usage
+    return usage() if callable(usage) else usage
 
 
 class AgentService:
@@ -15,11 +22,48 @@ class AgentService:
                       output_type=self.output_type,
                       retries=3
                     )
+
+        # Several envelopes per request, so the instructions are billed once per batch
+        with open("app/prompts/batch_prompt.md", "r", encoding="utf-8") as file:
+            self.batch_instructions = self.instructions + file.read()
+        self.batch_agent = Agent(model=vision_model,
+                      instructions=self.batch_instructions,
+                      output_type=list[BatchedVisionOutput],
+                      retries=3
+                    )
         
     async def run_agent(self, user_input: str, image_url: str):
 
+        output, _ = await self.run_agent_with_usage(user_input=user_input, image_url=image_url)
+
+        return output
+
+    async def run_agent_with_usage(self, user_input: str, image_url: str) -> tuple[dict, RunUsage]:
+
         result = await self.agent.run(user_prompt=[user_input, ImageUrl(url=image_url)])
         output = result.output.model_dump()
 
-        return output
-    
\ No newline at end of file
+        return output, _run_usage(result)
+
+    async def run_agent_batch_with_usage(self, image_urls: list[str]) -> tuple[list[dict | None], RunUsage]:
+        """
+        Extracts several envelopes in one request. Outputs are returned in the
+        order of `image_urls`; an image the model skipped or answered twice
+        comes back as None so the caller can retry it on its own.
+        """
+        user_prompt = []
+        for position, image_url in enumerate(image_urls):
+            user_prompt += [f"Image {position}:", ImageUrl(url=image_url)]
+
+        result = await self.batch_agent.run(user_prompt=user_prompt)
+
+        answers: dict[int, list[BatchedVisionOutput]] = {}
+        for entry in result.output:
+            answers.setdefault(entry.image_index, []).append(entry)
+        # Ambiguous answers are dropped rather than guessed at
+        outputs = [
+            answers[position][0].model_dump(exclude={"image_index"}) if len(answers.get(position, [])) == 1 else None
+            for position in range(len(image_urls))
+        ]
+
+        return outputs, _run_usage(result)
@@ -0,0 +1,170 @@
+from datetime import datetime, timedelta
+from io import BytesIO
+import asyncio
+import hashlib
+from uuid import UUID
+
+from sqlalchemy import and_, delete, or_, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.extraction_cache_model import ExtractionCache
+from app.utils.metrics import register_cache
+
+try:
+    from PIL import Image
+    PERCEPTUAL_HASH_AVAILABLE = True
+except ImportError:
+    PERCEPTUAL_HASH_AVAILABLE = False
+
+
+def perceptual_hash(image: bytes) -> int | None:
+    """
+    64-bit difference hash (dHash) as a signed bigint. Survives re-encoding
+    and rescaling of the same scan; returns None if the bytes don't decode.
+    """
+    try:
+        with Image.open(BytesIO(image)) as picture:
+            picture.draft("L", (64, 64))  # Lets JPEG decode at a fraction of full size
+            pixels = list(picture.convert("L").resize((9, 8), Image.Resampling.LANCZOS).getdata())
+    except Exception:
+        return None
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def fingerprint(image: bytes, use_perceptual_hash: bool = True) -> tuple[str, int | None]:
+    """Returns (sha256 hex, perceptual hash or None). CPU-bound; run it off the event loop."""
+    content_hash = hashlib.sha256(image).hexdigest()
+    if not (use_perceptual_hash and PERCEPTUAL_HASH_AVAILABLE):
+        return content_hash, None
+    return content_hash, perceptual_hash(image)
+
+
+class ExtractionCacheService:
+    """
+    Stores vision agent output per image fingerprint. An exact sha256 match
+    wins; otherwise, when perceptual hashing is on, an identical perceptual
+    hash among the same user's images (the same envelope saved again at
+    another size or quality) is reused. A dHash match is never shared across
+    users, since unrelated envelopes with the same layout can collide.
+    """
+
+    def __init__(
+        self,
+        use_perceptual_hash: bool = settings.EXTRACTION_CACHE_PERCEPTUAL_HASH,
+        max_age_days: int = settings.EXTRACTION_CACHE_MAX_AGE_DAYS,
+        max_rows: int = settings.EXTRACTION_CACHE_MAX_ROWS,
+    ):
+        self.use_perceptual_hash = use_perceptual_hash
+        self.max_age_days = max_age_days
+        self.max_rows = max_rows
+
+        self.hits = 0
+        self.misses = 0
+
+    async def fingerprint(self, image: bytes) -> tuple[str, int | None]:
+        return await asyncio.to_thread(fingerprint, image, self.use_perceptual_hash)
+
+    async def get(
+        self,
+        content_hash: str,
+        perceptual_hash: int | None = None,
+        user_id: UUID | None = None,
+    ) -> dict | None:
+        condition = ExtractionCache.content_hash == content_hash
+        if perceptual_hash is not None and user_id is not None:
+            condition = or_(condition, and_(
+                ExtractionCache.user_id == user_id,
+                ExtractionCache.perceptual_hash == perceptual_hash,
+            ))
+
+        async with AsyncSessionLocal() as db:
+            result = await db.exec(
+                select(ExtractionCache.content_hash, ExtractionCache.output)
+                .where(condition)
+                .order_by((ExtractionCache.content_hash == content_hash).desc())
+                .limit(1)
+            )
+            row = result.first()
+            if row is None:
+                self.misses += 1
+                return None
+
+            await db.execute(
+                update(ExtractionCache)
+                .where(ExtractionCache.content_hash == row.content_hash)
+                .values(hits=ExtractionCache.hits + 1, last_used_at=datetime.utcnow())
+            )
+            await db.commit()
+
+        self.hits += 1
+        return row.output
+
+    async def put(
+        self,
+        content_hash: str,
+        perceptual_hash: int | None,
+        output: dict,
+        user_id: UUID | None = None,
+    ) -> None:
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            await db.execute(
+                insert(ExtractionCache)
+                .values(
+                    content_hash=content_hash,
+                    perceptual_hash=perceptual_hash,
+                    user_id=user_id,
+                    output=output,
+                    hits=0,
+                    created_at=now,
+                    last_used_at=now,
+                )
+                .on_conflict_do_update(
+                    index_elements=["content_hash"],
+                    set_={"output": output, "last_used_at": now},
+                )
+            )
+            await db.commit()
+
+    async def prune(self) -> int:
+        """
+        Deletes entries unused for max_age_days, then the least recently used
+        ones beyond max_rows. Returns the number of rows deleted.
+        """
+        async with AsyncSessionLocal() as db:
+            expired = await db.execute(
+                delete(ExtractionCache)
+                .where(ExtractionCache.last_used_at < datetime.utcnow() - timedelta(days=self.max_age_days))
+            )
+
+            overflow = (
+                select(ExtractionCache.content_hash)
+                .order_by(ExtractionCache.last_used_at.desc())
+                .offset(self.max_rows)
+            )
+            evicted = await db.execute(
+                delete(ExtractionCache).where(ExtractionCache.content_hash.in_(overflow))
+            )
+            await db.commit()
+
+        return expired.rowcount + evicted.rowcount
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+extraction_cache = ExtractionCacheService()
+register_cache("extraction", extraction_cache.stats)
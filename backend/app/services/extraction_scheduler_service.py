@@ -0,0 +1,330 @@
+"""
+Admission control in front of the vision agent.
+
+Every extraction in a process goes through one ExtractionScheduler, which
+keeps the OpenAI account inside its limits instead of discovering them
+through 429s:
+- a cap on requests in flight,
+- token buckets for requests and tokens per minute,
+- two priority lanes, so a user waiting on a single upload isn't stuck
+  behind a scanner's batch,
+- a shared cooldown after a 429, taken from the rate-limit headers when
+  the API sends them and from exponential backoff otherwise,
+- optionally, batching of bulk-lane envelopes into multi-image requests.
+"""
+from itertools import count
+import asyncio
+import heapq
+import random
+import re
+import time
+
+from pydantic_ai.exceptions import ModelHTTPError
+
+from app.core.config import settings
+from app.models.enums.enums import ExtractionLane
+from app.services.agent_service import AgentService
+from app.utils.metrics import record_llm_request
+
+# OpenAI reports resets as durations such as "1s", "6m0s" or "120ms"
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset_duration(value: str | None) -> float | None:
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def rate_limit_delay(error: ModelHTTPError) -> float | None:
+    """Seconds the API asked us to wait, or None if the response didn't say."""
+    headers = getattr(error, "headers", None)
+    if headers is None:
+        # Older pydantic-ai releases only keep the headers on the SDK exception
+        response = getattr(error.__cause__, "response", None)
+        headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    headers = {key.lower(): value for key, value in headers.items()}
+
+    if "retry-after-ms" in headers:
+        delay = parse_reset_duration(headers["retry-after-ms"])
+        return delay / 1000 if delay is not None else None
+    if "retry-after" in headers:
+        return parse_reset_duration(headers["retry-after"])
+
+    # Without Retry-After, wait for whichever exhausted limit resets last
+    resets = []
+    for limit in ("requests", "tokens"):
+        if headers.get(f"x-ratelimit-remaining-{limit}") == "0":
+            resets.append(parse_reset_duration(headers.get(f"x-ratelimit-reset-{limit}")))
+    resets = [reset for reset in resets if reset is not None]
+    return max(resets) if resets else None
+
+
+class TokenBucket:
+    """Refills continuously at `per_minute` and holds at most one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = self.capacity
+        self._updated_at = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` can be taken; 0 if it can be taken now."""
+        self._refill()
+        # A request bigger than the bucket only has to wait for a full bucket
+        missing = min(amount, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate) if self.rate else float("inf")
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= amount
+
+    def adjust(self, amount: float) -> None:
+        """Returns (positive) or charges (negative) tokens once actual usage is known."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+    def drain(self) -> None:
+        """Empties the bucket after the API reported the limit as exhausted."""
+        self._refill()
+        self.tokens = min(self.tokens, 0.0)
+
+
+class ExtractionScheduler:
+    """
+    Wraps an AgentService with the same run_agent() call. Requests wait in a
+    priority queue (lane first, then arrival order) until a slot, request
+    budget and token budget are all free.
+    """
+
+    def __init__(
+        self,
+        agent: AgentService,
+        max_in_flight: int = settings.VISION_MAX_IN_FLIGHT,
+        requests_per_minute: int = settings.VISION_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = settings.VISION_TOKENS_PER_MINUTE,
+        estimated_tokens: int = settings.VISION_ESTIMATED_TOKENS_PER_REQUEST,
+        retries: int = settings.VISION_RATE_LIMIT_RETRIES,
+        backoff_seconds: float = settings.VISION_RATE_LIMIT_BACKOFF_SECONDS,
+        backoff_max_seconds: float = settings.VISION_RATE_LIMIT_BACKOFF_MAX_SECONDS,
+        batch_size: int = settings.VISION_BATCH_SIZE,
+        batch_window_seconds: float = settings.VISION_BATCH_WINDOW_SECONDS,
+    ):
+        self.agent = agent
+        self.max_in_flight = max_in_flight
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.estimated_tokens = estimated_tokens
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.batch_size = batch_size
+        self.batch_window_seconds = batch_window_seconds
+
+        self._condition = asyncio.Condition()
+        self._waiting: list[tuple[int, int]] = []
+        self._sequence = count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._rate_limit_streak = 0
+
+        self._batch: list[tuple[str, asyncio.Future]] = []
+        self._batch_timer: asyncio.TimerHandle | None = None
+        self._batch_tasks: set[asyncio.Task] = set()
+
+        self.completed = 0
+        self.rate_limited = 0
+        self.batches = 0
+        self.batch_fallbacks = 0
+
+    async def run_agent(
+        self,
+        user_input: str,
+        image_url: str,
+        lane: ExtractionLane = ExtractionLane.BULK,
+    ) -> dict:
+        # Interactive requests never wait out a batch window
+        if self.batch_size > 1 and lane == ExtractionLane.BULK and not user_input:
+            output = await self._run_batched(image_url)
+            if output is not None:
+                return output
+        return await self._run_single(user_input, image_url, lane)
+
+    async def _run_single(self, user_input: str, image_url: str, lane: ExtractionLane) -> dict:
+        for attempt in range(self.retries + 1):
+            await self._acquire(lane)
+            try:
+                output, usage = await self.agent.run_agent_with_usage(user_input=user_input, image_url=image_url)
+            except ModelHTTPError as e:
+                record_llm_request("single", "rate_limited" if e.status_code == 429 else "error")
+                if e.status_code != 429 or attempt == self.retries:
+                    raise
+                self._on_rate_limited(e)
+                continue
+            except Exception:
+                record_llm_request("single", "error")
+                raise
+            finally:
+                await self._release()
+
+            record_llm_request("single", "ok", usage)
+            self._rate_limit_streak = 0
+            self.completed += 1
+            # Settle the estimate charged at admission against what the call really used
+            if usage is not None and usage.total_tokens:
+                self.tokens.adjust(self.estimated_tokens - usage.total_tokens)
+            return output
+
+    async def _run_batched(self, image_url: str) -> dict | None:
+        """
+        Adds the image to the open batch and waits for its output. Returns
+        None if the batch didn't produce one, so the caller falls back to
+        a single-image request.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._batch.append((image_url, future))
+        if len(self._batch) >= self.batch_size:
+            self._flush_batch()
+        elif self._batch_timer is None:
+            self._batch_timer = asyncio.get_running_loop().call_later(self.batch_window_seconds, self._flush_batch)
+        return await future
+
+    def _flush_batch(self) -> None:
+        if self._batch_timer is not None:
+            self._batch_timer.cancel()
+            self._batch_timer = None
+        batch, self._batch = self._batch, []
+
+        if len(batch) == 1:
+            # Nothing to share the prompt with; the caller makes a plain request
+            _, future = batch[0]
+            if not future.done():
+                future.set_result(None)
+        elif batch:
+            task = asyncio.create_task(self._send_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _send_batch(self, batch: list[tuple[str, asyncio.Future]]) -> None:
+        image_urls = [image_url for image_url, _ in batch]
+        outputs: list[dict | None] = [None] * len(batch)
+        try:
+            await self._acquire(ExtractionLane.BULK, tokens=self.estimated_tokens * len(batch))
+            try:
+                outputs, usage = await self.agent.run_agent_batch_with_usage(image_urls)
+            finally:
+                await self._release()
+        except ModelHTTPError as e:
+            # Rate limits still pause everyone; the images are retried one by one
+            if e.status_code == 429:
+                record_llm_request("batch", "rate_limited")
+                self._on_rate_limited(e)
+            else:
+                record_llm_request("batch", "error")
+                print(f"Batched vision request for {len(batch)} images failed: {e}")
+        except Exception as e:
+            record_llm_request("batch", "error")
+            print(f"Batched vision request for {len(batch)} images failed: {e}")
+        else:
+            record_llm_request("batch", "ok", usage)
+            self._rate_limit_streak = 0
+            self.batches += 1
+            if usage is not None and usage.total_tokens:
+                self.tokens.adjust(self.estimated_tokens * len(batch) - usage.total_tokens)
+        finally:
+            # Also on cancellation: every waiter gets an answer, None meaning "ask on your own"
+            for (_, future), output in zip(batch, outputs):
+                if output is None:
+                    self.batch_fallbacks += 1
+                else:
+                    self.completed += 1
+                if not future.done():
+                    future.set_result(output)
+
+    async def _acquire(self, lane: ExtractionLane, tokens: int | None = None) -> None:
+        tokens = self.estimated_tokens if tokens is None else tokens
+        ticket = (int(lane), next(self._sequence))
+        async with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    delay = None
+                    if self._waiting[0] == ticket and self._in_flight < self.max_in_flight:
+                        delay = max(
+                            self._paused_until - time.monotonic(),
+                            self.requests.wait_time(1),
+                            self.tokens.wait_time(tokens),
+                        )
+                        if delay <= 0:
+                            break
+                    try:
+                        # Only the head of the queue sleeps on a budget; the rest wait for a notify
+                        await asyncio.wait_for(self._condition.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+                raise
+
+            heapq.heappop(self._waiting)
+            self._in_flight += 1
+            self.requests.consume(1)
+            self.tokens.consume(tokens)
+            self._condition.notify_all()
+
+    async def _release(self) -> None:
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def _on_rate_limited(self, error: ModelHTTPError) -> None:
+        self.rate_limited += 1
+        self._rate_limit_streak += 1
+
+        delay = rate_limit_delay(error)
+        if delay is None:
+            delay = min(self.backoff_seconds * 2 ** (self._rate_limit_streak - 1), self.backoff_max_seconds)
+            delay = random.uniform(delay / 2, delay)
+        # Every waiter holds off, not only the request that hit the limit
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        self.requests.drain()
+        print(f"Vision API rate limited; pausing extraction for {delay:.1f}s")
+
+    def stats(self) -> dict[str, int | float]:
+        return {
+            "in_flight": self._in_flight,
+            "waiting": len(self._waiting),
+            "paused_for_seconds": max(0.0, self._paused_until - time.monotonic()),
+            "completed": self.completed,
+            "rate_limited": self.rate_limited,
+            "batches": self.batches,
+            "batch_fallbacks": self.batch_fallbacks,
+        }
+
+
+_extraction_scheduler: ExtractionScheduler | None = None
+
+
+def get_extraction_scheduler() -> ExtractionScheduler:
+    """Process-wide scheduler; limits only hold if every extraction shares it."""
+    global _extraction_scheduler
+    if _extraction_scheduler is None:
+        _extraction_scheduler = ExtractionScheduler(AgentService())
+    return _extraction_scheduler
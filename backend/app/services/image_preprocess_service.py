@@ -0,0 +1,83 @@
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import os
+
+from app.core.config import settings
+from app.services.r2_service import R2Service
+
+try:
+    from app.utils.image_preprocess import preprocess_image
+    IMAGE_PREPROCESS_AVAILABLE = True
+except ImportError:
+    IMAGE_PREPROCESS_AVAILABLE = False
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def get_image_preprocess_pool() -> ProcessPoolExecutor:
+    """Process pool for CPU-bound image work: preprocessing and pincode OCR."""
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_PREPROCESS_WORKERS)
+    return _pool
+
+
+def shutdown_image_preprocess_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+class ImagePreprocessService:
+    """
+    Produces the smaller derivative the vision model reads instead of the
+    raw upload. Decoding and resizing run in a process pool so a burst of
+    multi-MB photos doesn't stall the worker's event loop.
+    """
+
+    def __init__(
+        self,
+        max_dimension: int = settings.IMAGE_MAX_DIMENSION,
+        quality: int = settings.IMAGE_JPEG_QUALITY,
+        derivative_prefix: str = settings.IMAGE_DERIVATIVE_PREFIX,
+    ):
+        self.max_dimension = max_dimension
+        self.quality = quality
+        self.derivative_prefix = derivative_prefix
+
+    def derivative_key(self, file_key: str) -> str:
+        return f"{self.derivative_prefix}{os.path.splitext(file_key)[0]}.jpg"
+
+    async def prepare(self, r2: R2Service, file_key: str, image: bytes) -> str:
+        """
+        Uploads the derivative and returns its key, or returns `file_key`
+        unchanged when preprocessing is unavailable or wouldn't shrink it.
+        """
+        if not IMAGE_PREPROCESS_AVAILABLE:
+            return file_key
+
+        loop = asyncio.get_running_loop()
+        derivative = await loop.run_in_executor(
+            get_image_preprocess_pool(), preprocess_image, image, self.max_dimension, self.quality
+        )
+        if derivative is None:
+            return file_key
+
+        key = self.derivative_key(file_key)
+        await asyncio.to_thread(r2.upload, key, derivative, "image/jpeg")
+        return key
+
+    async def discard(self, r2: R2Service, key: str) -> None:
+        """
+        Deletes a derivative once the model has read it. A failure only
+        leaves the object behind for the bucket's lifecycle rule on
+        derivative_prefix, so it is logged rather than raised.
+        """
+        try:
+            await asyncio.to_thread(r2.delete, key)
+        except Exception as e:
+            print(f"Error deleting image derivative {key}: {e}")
+
+
+image_preprocessor = ImagePreprocessService()
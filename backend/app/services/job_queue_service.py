@@ -0,0 +1,236 @@
+from datetime import datetime, timedelta
+from uuid import UUID, uuid4
+import random
+
+from sqlalchemy import update
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from app.core.config import settings
+from app.models.mail_model import Mail
+from app.models.mail_job_model import MailJob
+from app.models.enums.enums import ExtractionLane, JobStatus, ProcessingStatus
+
+
+class JobQueueService:
+    """Postgres-backed queue of mails waiting for extraction."""
+
+    def __init__(
+        self,
+        max_attempts: int = settings.JOB_MAX_ATTEMPTS,
+        backoff_seconds: float = settings.JOB_RETRY_BACKOFF_SECONDS,
+        backoff_max_seconds: float = settings.JOB_RETRY_BACKOFF_MAX_SECONDS,
+        lock_timeout_seconds: int = settings.JOB_LOCK_TIMEOUT_SECONDS,
+    ):
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.backoff_max_seconds = backoff_max_seconds
+        self.lock_timeout_seconds = lock_timeout_seconds
+
+    def enqueue(
+        self,
+        db: AsyncSession,
+        mail_id: UUID,
+        file_key: str,
+        priority: ExtractionLane = ExtractionLane.INTERACTIVE,
+    ) -> MailJob:
+        """
+        Adds a job to the session. The caller commits, so the job is written
+        in the same transaction as the mail it belongs to.
+        """
+        job = MailJob(mail_id=mail_id, file_key=file_key, max_attempts=self.max_attempts, priority=priority)
+        db.add(job)
+        return job
+
+    async def enqueue_many(
+        self,
+        db: AsyncSession,
+        mails: list[tuple[UUID, str]],
+        priority: ExtractionLane = ExtractionLane.BULK,
+    ) -> None:
+        """
+        Queues (mail_id, file_key) pairs with one multi-row INSERT. Mails that
+        already have a job are skipped. The caller commits.
+        """
+        if not mails:
+            return
+        now = datetime.utcnow()
+        rows = [
+            {
+                "id": uuid4(),
+                "mail_id": mail_id,
+                "file_key": file_key,
+                "status": JobStatus.QUEUED,
+                "attempts": 0,
+                "max_attempts": self.max_attempts,
+                "priority": priority,
+                "run_after": now,
+                "created_at": now,
+            }
+            for mail_id, file_key in mails
+        ]
+        # Chunked to stay under Postgres' limit of 32767 bind parameters per statement
+        for start in range(0, len(rows), 1000):
+            await db.execute(
+                insert(MailJob)
+                .values(rows[start:start + 1000])
+                .on_conflict_do_nothing(index_elements=["mail_id"])
+            )
+
+    async def claim(self, db: AsyncSession, limit: int) -> list[MailJob]:
+        """
+        Locks up to `limit` due jobs, interactive ones first, skipping rows
+        other workers hold.
+        """
+        now = datetime.utcnow()
+        statement = (
+            select(MailJob)
+            .where(MailJob.status == JobStatus.QUEUED)
+            .where(MailJob.run_after <= now)
+            .order_by(MailJob.priority, MailJob.run_after)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await db.exec(statement)
+        jobs = result.all()
+
+        for job in jobs:
+            job.status = JobStatus.RUNNING
+            job.locked_at = now
+            job.claim_token = uuid4()
+            job.attempts += 1
+            db.add(job)
+        await db.commit()
+
+        return jobs
+
+    @staticmethod
+    def _owned(job: MailJob) -> tuple:
+        # Matches the job only while the claim that returned `job` still holds it
+        return (
+            MailJob.id == job.id,
+            MailJob.status == JobStatus.RUNNING,
+            MailJob.claim_token == job.claim_token,
+        )
+
+    async def heartbeat(self, db: AsyncSession, job: MailJob) -> bool:
+        """
+        Refreshes the lock of a running job so recover() leaves it alone.
+        Returns False if the claim was lost (the job was requeued meanwhile).
+        """
+        result = await db.execute(
+            update(MailJob).where(*self._owned(job)).values(locked_at=datetime.utcnow())
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+    async def complete(self, db: AsyncSession, job: MailJob) -> bool:
+        """Marks the job DONE. Returns False, changing nothing, if the claim was lost."""
+        result = await db.execute(
+            update(MailJob)
+            .where(*self._owned(job))
+            .values(status=JobStatus.DONE, locked_at=None, claim_token=None, last_error=None)
+        )
+        await db.commit()
+        return result.rowcount == 1
+
+    async def fail(self, db: AsyncSession, job: MailJob, error: str) -> JobStatus | None:
+        """
+        Schedules a retry with exponential backoff, or dead-letters the job
+        once it has used up its attempts. Returns the job's new status, or
+        None, changing nothing, if the claim was lost.
+        """
+        if job.attempts >= job.max_attempts:
+            result = await db.execute(
+                update(MailJob)
+                .where(*self._owned(job))
+                .values(status=JobStatus.DEAD, locked_at=None, claim_token=None, last_error=error)
+            )
+            await db.commit()
+            return JobStatus.DEAD if result.rowcount == 1 else None
+
+        delay = min(self.backoff_seconds * 2 ** (job.attempts - 1), self.backoff_max_seconds)
+        delay += random.uniform(0, self.backoff_seconds)
+        result = await db.execute(
+            update(MailJob)
+            .where(*self._owned(job))
+            .values(
+                status=JobStatus.QUEUED,
+                locked_at=None,
+                claim_token=None,
+                last_error=error,
+                run_after=datetime.utcnow() + timedelta(seconds=delay),
+            )
+        )
+        if result.rowcount != 1:
+            await db.rollback()
+            return None
+        # The mail goes back to PENDING until the retry runs
+        await db.execute(
+            update(Mail)
+            .where(Mail.id == job.mail_id)
+            .values(status=ProcessingStatus.PENDING)
+        )
+        await db.commit()
+        return JobStatus.QUEUED
+
+    async def recover(self, db: AsyncSession, orphans: bool = True) -> int:
+        """
+        Makes work lost in a crash claimable again:
+        - RUNNING jobs whose lock is older than the lock timeout are requeued.
+          Running workers refresh their locks (heartbeat()), so only jobs of
+          a worker that died or stalled get there. Jobs that were on their
+          last attempt are dead-lettered instead, so a mail that keeps
+          killing its worker doesn't come back forever.
+        - With `orphans`, PENDING/PROCESSING mails that never got a job are
+          enqueued. Mails and their jobs are written in one transaction, so
+          only data from before the queue existed needs this; it anti-joins
+          every unfinished mail against mail_jobs and is best left to startup.
+        Returns the number of jobs requeued or created.
+        """
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=self.lock_timeout_seconds)
+        dead = await db.execute(
+            update(MailJob)
+            .where(MailJob.status == JobStatus.RUNNING)
+            .where(MailJob.locked_at < stale_before)
+            .where(MailJob.attempts >= MailJob.max_attempts)
+            .values(
+                status=JobStatus.DEAD,
+                locked_at=None,
+                claim_token=None,
+                last_error="Worker stopped during the last attempt (crashed or killed)",
+            )
+            .returning(MailJob.mail_id)
+        )
+        dead_mail_ids = dead.scalars().all()
+        if dead_mail_ids:
+            await db.execute(
+                update(Mail).where(Mail.id.in_(dead_mail_ids)).values(status=ProcessingStatus.FAILED)
+            )
+            print(f"Dead-lettered {len(dead_mail_ids)} mail job(s) whose worker stopped during their last attempt")
+        stale = await db.execute(
+            update(MailJob)
+            .where(MailJob.status == JobStatus.RUNNING)
+            .where(MailJob.locked_at < stale_before)
+            .values(status=JobStatus.QUEUED, locked_at=None, claim_token=None, run_after=now)
+        )
+
+        orphaned = []
+        if orphans:
+            result = await db.exec(
+                select(Mail.id, Mail.image_s3_key)
+                .outerjoin(MailJob, MailJob.mail_id == Mail.id)
+                .where(Mail.status.in_([ProcessingStatus.PENDING, ProcessingStatus.PROCESSING]))
+                .where(MailJob.id.is_(None))
+            )
+            orphaned = result.all()
+            # Another worker may be recovering at the same time; conflicts are skipped
+            await self.enqueue_many(db, [(mail_id, file_key) for mail_id, file_key in orphaned])
+
+        await db.commit()
+        return stale.rowcount + len(orphaned)
+
+
+job_queue = JobQueueService()
@@ -0,0 +1,130 @@
+from collections.abc import Hashable
+import asyncio
+import json
+import random
+
+from app.core.config import settings
+from app.db.database import engine
+
+# Channel the mails_notify_status trigger publishes on
+MAIL_STATUS_CHANNEL = "mail_status"
+
+
+class MailEventBroker:
+    """
+    Fans mail status notifications out to the SSE subscribers of this
+    process. One pooled connection LISTENs for the whole process, however
+    many clients are connected. It is pinged periodically and re-established,
+    with backoff, if it drops or stops answering. Because
+    the trigger fires in Postgres, updates made by any worker or API
+    process reach every subscriber.
+    """
+
+    def __init__(
+        self,
+        channel: str = MAIL_STATUS_CHANNEL,
+        queue_size: int = settings.MAIL_EVENTS_QUEUE_SIZE,
+        reconnect_seconds: float = settings.MAIL_EVENTS_RECONNECT_SECONDS,
+        reconnect_max_seconds: float = settings.MAIL_EVENTS_RECONNECT_MAX_SECONDS,
+        ping_seconds: float = settings.MAIL_EVENTS_PING_SECONDS,
+        ping_timeout_seconds: float = settings.MAIL_EVENTS_PING_TIMEOUT_SECONDS,
+    ):
+        self.channel = channel
+        self.queue_size = queue_size
+        self.reconnect_seconds = reconnect_seconds
+        self.reconnect_max_seconds = reconnect_max_seconds
+        self.ping_seconds = ping_seconds
+        self.ping_timeout_seconds = ping_timeout_seconds
+        self._subscribers: dict[str, set[asyncio.Queue]] = {}
+        self._task: asyncio.Task | None = None
+
+        self.delivered = 0
+        self.dropped = 0
+
+    def subscribe(self, user_id: Hashable) -> asyncio.Queue:
+        """Returns a queue of (mail_id, JSON payload) for the user's mails."""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._listen())
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.setdefault(str(user_id), set()).add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: Hashable, queue: asyncio.Queue) -> None:
+        queues = self._subscribers.get(str(user_id))
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self._subscribers[str(user_id)]
+
+    def subscriber_count(self) -> int:
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _listen(self) -> None:
+        failures = 0
+        while True:
+            try:
+                async with engine.connect() as connection:
+                    raw = await connection.get_raw_connection()
+                    driver = raw.driver_connection
+                    lost = asyncio.Event()
+                    driver.add_termination_listener(lambda _: lost.set())
+                    await driver.add_listener(self.channel, self._on_notify)
+                    failures = 0
+                    try:
+                        await self._watch(connection, driver, lost)
+                    finally:
+                        if not driver.is_closed():
+                            await driver.remove_listener(self.channel, self._on_notify)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Mail event listener error: {e}")
+            # Updates made while disconnected are missed; clients resync from GET /mails/{mail_id}.
+            # Full jitter, so the API processes don't all reconnect at once after a DB restart
+            failures = min(failures + 1, 16)
+            await asyncio.sleep(random.uniform(0, min(self.reconnect_max_seconds, self.reconnect_seconds * 2 ** (failures - 1))))
+
+    async def _watch(self, connection, driver, lost: asyncio.Event) -> None:
+        """Returns once the connection is closed; raises if it stops answering pings."""
+        while True:
+            try:
+                await asyncio.wait_for(lost.wait(), self.ping_seconds)
+                return
+            except TimeoutError:
+                pass
+            try:
+                await asyncio.wait_for(driver.fetchval("SELECT 1"), self.ping_timeout_seconds)
+            except Exception as e:
+                # Closes the socket without waiting on the server, and keeps it out of the pool
+                await connection.invalidate()
+                raise ConnectionError(f"no answer to a ping within {self.ping_timeout_seconds}s") from e
+
+    def _on_notify(self, connection, pid: int, channel: str, payload: str) -> None:
+        try:
+            event = json.loads(payload)
+        except ValueError:
+            return
+        queues = self._subscribers.get(event.get("user_id"))
+        if not queues:
+            return
+
+        for queue in queues:
+            # A slow client loses its oldest events rather than growing without bound
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait((event.get("id"), payload))
+            self.delivered += 1
+
+
+mail_events = MailEventBroker()
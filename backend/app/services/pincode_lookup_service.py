@@ -1,39 +1,243 @@
 from app.models.pincode_cache_model import PincodeCache
-from sqlmodel.ext.asyncio.session import AsyncSession
+from app.db.database import AsyncSessionLocal
+from app.core.config import settings
+from app.utils.cache import TTLCache, SingleFlight, MISSING
+from app.utils.metrics import register_cache
+from app.utils.pincode_index import PincodeIndex
 from sqlmodel import select
-import requests
+from sqlalchemy.dialects.postgresql import insert
+from datetime import datetime
+import asyncio
+import os
+import random
+import time
+import httpx
+
+try:
+    import h2  # noqa: F401  (httpx only speaks HTTP/2 when h2 is installed)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class PincodeApiClient:
+    """
+    Pooled, non-blocking client for the India Post pincode API.
+    One instance is shared per process so connections are kept alive
+    between lookups. Point `base_url` at a local stub server in tests.
+    """
+
+    def __init__(
+        self,
+        base_url: str = settings.PINCODE_API_BASE_URL,
+        timeout: float = settings.PINCODE_API_TIMEOUT_SECONDS,
+        max_concurrency: int = settings.PINCODE_API_MAX_CONCURRENCY,
+        max_retries: int = settings.PINCODE_API_MAX_RETRIES,
+        backoff_seconds: float = settings.PINCODE_API_RETRY_BACKOFF_SECONDS,
+    ):
+        self.client = httpx.AsyncClient(
+            base_url=base_url,
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+                keepalive_expiry=30,
+            ),
+            http2=HTTP2_AVAILABLE,
+        )
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self._slots = asyncio.Semaphore(max_concurrency)
+
+    async def get_pincode(self, pincode: str) -> list:
+        """
+        Returns the decoded API payload. Timeouts, connection errors, 429s and
+        5xx responses are retried with full-jitter exponential backoff.
+        """
+        for attempt in range(self.max_retries + 1):
+            is_last_attempt = attempt == self.max_retries
+            try:
+                async with self._slots:
+                    response = await self.client.get(f"/pincode/{pincode}")
+                if response.status_code not in RETRYABLE_STATUS_CODES or is_last_attempt:
+                    response.raise_for_status()
+                    return response.json()
+            except httpx.TransportError:
+                if is_last_attempt:
+                    raise
+
+            await asyncio.sleep(random.uniform(0, self.backoff_seconds * 2 ** attempt))
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_api_client: PincodeApiClient | None = None
+
+def get_pincode_api_client() -> PincodeApiClient:
+    global _api_client
+    if _api_client is None:
+        _api_client = PincodeApiClient()
+    return _api_client
+
+async def close_pincode_api_client():
+    global _api_client
+    if _api_client is not None:
+        await _api_client.aclose()
+        _api_client = None
+
+
+_pincode_index: PincodeIndex | None = None
+_pincode_index_loaded = False
+
+def get_pincode_index() -> PincodeIndex | None:
+    """Maps the prebuilt directory index once per process; None if it hasn't been built."""
+    global _pincode_index, _pincode_index_loaded
+    if not _pincode_index_loaded:
+        _pincode_index_loaded = True
+        if settings.PINCODE_INDEX_PATH and os.path.exists(settings.PINCODE_INDEX_PATH):
+            _pincode_index = PincodeIndex(settings.PINCODE_INDEX_PATH)
+    return _pincode_index
+
+
+class PincodeMemoryCache(TTLCache):
+    """
+    In-process LRU/TTL tier in front of the pincode_cache table.
+    Values are (sorting_division, updated_at) for known pincodes, and None for
+    pincodes the API reported as invalid (kept for a shorter TTL).
+    At most once per sync interval, one query picks up rows whose updated_at
+    moved since the last sync and evicts them.
+    """
+
+    def __init__(
+        self,
+        max_size: int = settings.PINCODE_MEMORY_CACHE_SIZE,
+        ttl_seconds: float = settings.PINCODE_MEMORY_CACHE_TTL_SECONDS,
+        negative_ttl_seconds: float = settings.PINCODE_NEGATIVE_CACHE_TTL_SECONDS,
+        sync_interval_seconds: float = settings.PINCODE_CACHE_SYNC_SECONDS,
+    ):
+        super().__init__(max_size=max_size, ttl_seconds=ttl_seconds)
+        self.negative_ttl_seconds = negative_ttl_seconds
+        self.sync_interval_seconds = sync_interval_seconds
+        self._synced_at = time.monotonic()
+        self._high_water = datetime.utcnow()
+
+    def set_invalid(self, pincode: str) -> None:
+        self.set(pincode, None, ttl_seconds=self.negative_ttl_seconds)
+
+    async def sync(self) -> int:
+        """Evicts entries whose row changed in the DB. Returns how many were evicted."""
+        if time.monotonic() - self._synced_at < self.sync_interval_seconds:
+            return 0
+        self._synced_at = time.monotonic()
+
+        async with AsyncSessionLocal() as db:
+            result = await db.exec(
+                select(PincodeCache.pincode, PincodeCache.updated_at)
+                .where(PincodeCache.updated_at > self._high_water)
+            )
+            changed = result.all()
+
+        evicted = 0
+        for pincode, updated_at in changed:
+            self._high_water = max(self._high_water, updated_at)
+            value = self.peek(pincode)
+            if value is MISSING:
+                continue
+            if value is None or value[1] != updated_at:
+                self.pop(pincode)
+                evicted += 1
+        return evicted
+
+
+pincode_memory_cache = PincodeMemoryCache()
+register_cache("pincode", pincode_memory_cache.stats)
+# Concurrent misses for the same pincode share one DB read + API call
+pincode_lookups_in_flight = SingleFlight()
+
 
 class PincodeLookupService():
 
-    async def resolve_sorting_center(self, extracted_pincode: str, db: AsyncSession):
+    def __init__(
+        self,
+        api_client: PincodeApiClient | None = None,
+        memory_cache: PincodeMemoryCache = pincode_memory_cache,
+        index: PincodeIndex | None = None,
+    ):
+        self.api_client = api_client or get_pincode_api_client()
+        self.memory_cache = memory_cache
+        self.index = index or get_pincode_index()
+
+    async def resolve_sorting_center(self, extracted_pincode: str):
+        # Offline directory index: no DB or network needed
+        if self.index:
+            entry = self.index.get(extracted_pincode)
+            if entry:
+                return entry[1]
+
+        # 0. Check the in-process cache (also remembers invalid pincodes)
+        await self.memory_cache.sync()
+        cached = self.memory_cache.get(extracted_pincode)
+        if cached is not MISSING:
+            return cached[0] if cached else None
+
+        return await pincode_lookups_in_flight.do(
+            extracted_pincode, lambda: self._resolve_uncached(extracted_pincode)
+        )
+
+    async def _resolve_uncached(self, extracted_pincode: str):
+        # Sessions are opened per step so no connection is held during the API call
         # 1. Check Local Cache
-        result = await db.exec(select(PincodeCache).where(PincodeCache.pincode == extracted_pincode))
-        cached_info = result.first()
-        
+        async with AsyncSessionLocal() as db:
+            # Leaves raw_api_data (TOASTed JSONB) unread
+            result = await db.exec(
+                select(PincodeCache.sorting_division, PincodeCache.updated_at)
+                .where(PincodeCache.pincode == extracted_pincode)
+            )
+            cached_info = result.first()
+
         if cached_info:
-            return cached_info.sorting_division
+            sorting_division, updated_at = cached_info
+            self.memory_cache.set(extracted_pincode, (sorting_division, updated_at))
+            return sorting_division
 
         # 2. If missing, fetch from External API
-        response = requests.get(f"https://api.postalpincode.in/pincode/{extracted_pincode}")
-        data = response.json()
+        data = await self.api_client.get_pincode(extracted_pincode)
 
         if data[0]["Status"] == "Success":
             # The API returns a list of POs. Usually, the Division is consistent across them.
             # We pick the first one to determine routing.
             first_po = data[0]["PostOffice"][0]
-            
-            # Create new cache entry
-            new_entry = PincodeCache(
+            sorting_division = first_po.get("Division")
+            updated_at = datetime.utcnow()
+
+            # Upsert the cache entry; another process may have written it meanwhile
+            statement = insert(PincodeCache).values(
                 pincode=extracted_pincode,
                 sorting_district=first_po.get("District"),
-                sorting_division=first_po.get("Division"),
+                sorting_division=sorting_division,
                 state=first_po.get("State"),
-                raw_api_data=data
+                raw_api_data=data,
+                updated_at=updated_at,
             )
-            db.add(new_entry)
-            await db.commit()
-            
-            return new_entry.sorting_division
-        
-        return None
+            statement = statement.on_conflict_do_update(
+                index_elements=[PincodeCache.pincode],
+                set_={
+                    "sorting_district": statement.excluded.sorting_district,
+                    "sorting_division": statement.excluded.sorting_division,
+                    "state": statement.excluded.state,
+                    "raw_api_data": statement.excluded.raw_api_data,
+                    "updated_at": statement.excluded.updated_at,
+                },
+            )
+            async with AsyncSessionLocal() as db:
+                await db.execute(statement)
+                await db.commit()
 
+            self.memory_cache.set(extracted_pincode, (sorting_division, updated_at))
+            return sorting_division
+
+        self.memory_cache.set_invalid(extracted_pincode)
+        return None
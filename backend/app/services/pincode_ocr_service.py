@@ -0,0 +1,92 @@
+from collections.abc import Callable
+import asyncio
+import re
+
+from app.core.config import settings
+from app.schemas.agent_output_schema import normalize_pincode
+from app.services.image_preprocess_service import get_image_preprocess_pool
+from app.services.pincode_lookup_service import get_pincode_index
+from app.utils.pincode_index import PincodeIndex
+
+try:
+    from app.utils.pincode_ocr import ocr_text
+    PINCODE_OCR_AVAILABLE = True
+except ImportError:
+    PINCODE_OCR_AVAILABLE = False
+
+# Pincodes are often printed as "500 001" or "500-001"; OCR keeps those gaps
+PINCODE_CANDIDATE = re.compile(r"(?<!\d)\d{3}[ \-]?\d{3}(?!\d)")
+TO_LABEL = re.compile(r"\bto\b\s*[:\-]?", re.IGNORECASE)
+FROM_LABEL = re.compile(r"\bfrom\b\s*[:\-]?", re.IGNORECASE)
+
+
+def find_pincodes(text: str, is_known: Callable[[str], bool]) -> list[str]:
+    """Distinct pincodes in `text`, in reading order, that `is_known` accepts."""
+    found = []
+    for match in PINCODE_CANDIDATE.finditer(text):
+        pincode = normalize_pincode(re.sub(r"\D", "", match.group()))
+        if pincode and pincode not in found and is_known(pincode):
+            found.append(pincode)
+    return found
+
+
+def pick_receiver_pincode(text: str, is_known: Callable[[str], bool]) -> str | None:
+    """
+    Returns the receiver's pincode only when the OCR text leaves no doubt:
+    exactly one known pincode sits in the "To" block (up to the next "From"
+    label), or there are no labels at all and the text holds a single known
+    pincode. A lone pincode next to a "From" label may well be the sender's,
+    so that returns None, and sorting waits for the LLM.
+    """
+    to_label = TO_LABEL.search(text)
+    if to_label is None:
+        if FROM_LABEL.search(text) is not None:
+            return None
+        pincodes = find_pincodes(text, is_known)
+        return pincodes[0] if len(pincodes) == 1 else None
+
+    receiver_block = text[to_label.end():]
+    from_label = FROM_LABEL.search(receiver_block)
+    if from_label is not None:
+        receiver_block = receiver_block[:from_label.start()]
+
+    pincodes = find_pincodes(receiver_block, is_known)
+    return pincodes[0] if len(pincodes) == 1 else None
+
+
+class PincodeOcrService:
+    """
+    Reads the receiver pincode off the envelope with local OCR so the mail
+    can be sorted before the vision model answers. Candidates are only
+    trusted if the offline pincode index knows them.
+    """
+
+    def __init__(
+        self,
+        index: PincodeIndex | None = None,
+        max_dimension: int = settings.PINCODE_OCR_MAX_DIMENSION,
+    ):
+        self._index = index
+        self.max_dimension = max_dimension
+
+    @property
+    def index(self) -> PincodeIndex | None:
+        return self._index or get_pincode_index()
+
+    @property
+    def available(self) -> bool:
+        return PINCODE_OCR_AVAILABLE and self.index is not None
+
+    async def read_receiver_pincode(self, image: bytes) -> tuple[str, str] | None:
+        """Returns (pincode, sorting_division) when OCR is confident, else None."""
+        index = self.index
+        if not PINCODE_OCR_AVAILABLE or index is None:
+            return None
+
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(get_image_preprocess_pool(), ocr_text, image, self.max_dimension)
+        pincode = pick_receiver_pincode(text, lambda candidate: index.get(candidate) is not None)
+        return (pincode, index.get(pincode)[1]) if pincode else None
+
+
+pincode_ocr = PincodeOcrService()
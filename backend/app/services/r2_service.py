@@ -1,6 +1,74 @@
+from datetime import datetime, timezone
+from urllib.parse import quote, urlsplit
+import hashlib
+import hmac
+import time
 import boto3
 from botocore.config import Config
 from app.core.config import settings
+from app.utils.cache import TTLCache
+
+
+class SigV4Presigner:
+    """
+    Computes S3 SigV4 query-string signatures directly, without going through
+    botocore's request machinery. Produces the same URLs as
+    generate_presigned_url('get_object' / 'put_object') for a path-style endpoint.
+    """
+
+    def __init__(self, access_key_id: str, secret_access_key: str, host: str, region: str = "auto", scheme: str = "https"):
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.host = host
+        self.scheme = scheme
+        self.region = region
+        # The signing key only depends on the date, so it is derived once per day
+        self._signing_keys: dict[str, bytes] = {}
+
+    def _signing_key(self, datestamp: str) -> bytes:
+        key = self._signing_keys.get(datestamp)
+        if key is None:
+            key = f"AWS4{self.secret_access_key}".encode()
+            for part in (datestamp, self.region, "s3", "aws4_request"):
+                key = hmac.new(key, part.encode(), hashlib.sha256).digest()
+            self._signing_keys = {datestamp: key}
+        return key
+
+    def presign_get(self, bucket: str, key: str, expires_in: int, signed_at: int) -> str:
+        """Signs a GET for `key` as of the unix time `signed_at`."""
+        return self._presign("GET", bucket, key, expires_in, signed_at, headers={})
+
+    def presign_put(self, bucket: str, key: str, content_type: str, expires_in: int, signed_at: int) -> str:
+        """Signs a PUT for `key`; the uploader must send the same Content-Type."""
+        return self._presign("PUT", bucket, key, expires_in, signed_at, headers={"content-type": content_type})
+
+    def _presign(self, method: str, bucket: str, key: str, expires_in: int, signed_at: int, headers: dict[str, str]) -> str:
+        timestamp = datetime.fromtimestamp(signed_at, tz=timezone.utc)
+        amz_date = timestamp.strftime("%Y%m%dT%H%M%SZ")
+        datestamp = amz_date[:8]
+        scope = f"{datestamp}/{self.region}/s3/aws4_request"
+
+        headers = {**headers, "host": self.host}
+        signed_headers = ";".join(sorted(headers))
+        canonical_headers = "".join(f"{name}:{headers[name]}\n" for name in sorted(headers))
+
+        path = f"/{bucket}/{quote(key, safe='/~')}"
+        query = (
+            "X-Amz-Algorithm=AWS4-HMAC-SHA256"
+            f"&X-Amz-Credential={quote(f'{self.access_key_id}/{scope}', safe='-_.~')}"
+            f"&X-Amz-Date={amz_date}"
+            f"&X-Amz-Expires={expires_in}"
+            f"&X-Amz-SignedHeaders={quote(signed_headers, safe='-_.~')}"
+        )
+        canonical_request = f"{method}\n{path}\n{query}\n{canonical_headers}\n{signed_headers}\nUNSIGNED-PAYLOAD"
+        string_to_sign = (
+            f"AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n"
+            f"{hashlib.sha256(canonical_request.encode()).hexdigest()}"
+        )
+        signature = hmac.new(self._signing_key(datestamp), string_to_sign.encode(), hashlib.sha256).hexdigest()
+
+        return f"{self.scheme}://{self.host}{path}?{query}&X-Amz-Signature={signature}"
+
 
 class R2Service:
     def __init__(self):
@@ -8,18 +76,41 @@ class R2Service:
         # Connection Config
         self.s3_client = boto3.client(
             service_name='s3',
-            endpoint_url=f"https://{settings.R2_ACCOUNT_ID}.r2.cloudflarestorage.com",
+            endpoint_url=settings.r2_endpoint_url,
             aws_access_key_id=settings.R2_ACCESS_KEY_ID,
             aws_secret_access_key=settings.R2_SECRET_ACCESS_KEY,
             region_name="auto",
             config=Config(signature_version='s3v4')
         )
 
+        # Read URLs are signed as of the start of their expiry bucket, so the
+        # same (key, bucket) always yields the same URL and can be cached
+        endpoint = urlsplit(settings.r2_endpoint_url)
+        self.presigner = SigV4Presigner(
+            access_key_id=settings.R2_ACCESS_KEY_ID,
+            secret_access_key=settings.R2_SECRET_ACCESS_KEY,
+            host=endpoint.netloc,
+            scheme=endpoint.scheme,
+        )
+        self.read_url_cache = TTLCache(
+            max_size=settings.R2_READ_URL_CACHE_SIZE,
+            ttl_seconds=settings.R2_READ_URL_BUCKET_SECONDS,
+        )
+
     def generate_upload_url(self, file_key: str, content_type: str = "image/jpeg"):
         """
         Generates a URL that the Frontend can use to PUT the file.
-        Expires in 3600 seconds (1 hour).
+        Expires in 300 seconds (5 minutes).
         """
+        if settings.R2_FAST_PRESIGN:
+            return self.presigner.presign_put(
+                bucket=settings.R2_BUCKET_NAME,
+                key=file_key,
+                content_type=content_type,
+                expires_in=300,
+                signed_at=int(time.time()),
+            )
+
         try:
             url = self.s3_client.generate_presigned_url(
                 ClientMethod='put_object',
@@ -36,9 +127,42 @@ class R2Service:
             return None
 
     def generate_read_url(self, file_key: str):
-        """Generates a GET URL for the AI or User to view the file."""
-        return self.s3_client.generate_presigned_url(
-            ClientMethod='get_object',
-            Params={'Bucket': settings.R2_BUCKET_NAME, 'Key': file_key},
-            ExpiresIn=3600
-        )
\ No newline at end of file
+        """
+        Generates a GET URL for the AI or User to view the file.
+        Every URL handed out stays valid for at least
+        R2_READ_URL_EXPIRES_SECONDS - R2_READ_URL_BUCKET_SECONDS.
+        """
+        if not settings.R2_FAST_PRESIGN:
+            return self.s3_client.generate_presigned_url(
+                ClientMethod='get_object',
+                Params={'Bucket': settings.R2_BUCKET_NAME, 'Key': file_key},
+                ExpiresIn=settings.R2_READ_URL_EXPIRES_SECONDS
+            )
+
+        bucket_seconds = settings.R2_READ_URL_BUCKET_SECONDS
+        signed_at = int(time.time()) // bucket_seconds * bucket_seconds
+        cache_key = (file_key, signed_at)
+
+        url = self.read_url_cache.get(cache_key, None)
+        if url is None:
+            url = self.presigner.presign_get(
+                bucket=settings.R2_BUCKET_NAME,
+                key=file_key,
+                expires_in=settings.R2_READ_URL_EXPIRES_SECONDS,
+                signed_at=signed_at,
+            )
+            self.read_url_cache.set(cache_key, url)
+        return url
+
+    def download(self, file_key: str) -> bytes:
+        """Fetches an uploaded file. Blocking; call it through asyncio.to_thread."""
+        response = self.s3_client.get_object(Bucket=settings.R2_BUCKET_NAME, Key=file_key)
+        return response["Body"].read()
+
+    def upload(self, file_key: str, body: bytes, content_type: str = "image/jpeg") -> None:
+        """Stores a file the server produced itself. Blocking; call it through asyncio.to_thread."""
+        self.s3_client.put_object(Bucket=settings.R2_BUCKET_NAME, Key=file_key, Body=body, ContentType=content_type)
+
+    def delete(self, file_key: str) -> None:
+        """Removes a file the server produced itself. Blocking; call it through asyncio.to_thread."""
+        self.s3_client.delete_object(Bucket=settings.R2_BUCKET_NAME, Key=file_key)
@@ -0,0 +1,68 @@
+"""
+Shrinks an uploaded envelope photo before it is sent to the vision model.
+
+Everything here is plain CPU work on bytes, so it can run in a process
+pool; keep it free of settings, DB and network access.
+"""
+from io import BytesIO
+
+from PIL import Image, ImageChops, ImageOps
+
+# Pixels this far from the corner colour count as envelope, not background
+BORDER_THRESHOLD = 24
+# Long side, in pixels, of the copy the crop box is searched on
+ANALYSIS_SIZE = 256
+
+
+def _crop_to_content(picture: Image.Image, padding: float = 0.02) -> Image.Image:
+    """
+    Trims the even background (table, scanner bed) around the envelope.
+    The box is found on a small copy, which is cheaper and averages out
+    sensor noise; the corner pixel is taken as the background colour. A
+    small margin is kept so text on the envelope's edge isn't clipped.
+    """
+    factor = max(1, max(picture.size) // ANALYSIS_SIZE)
+    small = picture.reduce(factor)
+    background = Image.new(small.mode, small.size, small.getpixel((0, 0)))
+    difference = ImageChops.difference(small, background).convert("L")
+    box = difference.point(lambda value: 255 if value > BORDER_THRESHOLD else 0).getbbox()
+    if box is None:
+        return picture
+
+    left, top, right, bottom = (edge * factor for edge in box)
+    # Not worth a crop that keeps almost everything
+    if (right - left) * (bottom - top) > 0.9 * picture.width * picture.height:
+        return picture
+
+    pad_x, pad_y = int(picture.width * padding), int(picture.height * padding)
+    return picture.crop((
+        max(0, left - pad_x),
+        max(0, top - pad_y),
+        min(picture.width, right + pad_x),
+        min(picture.height, bottom + pad_y),
+    ))
+
+
+def preprocess_image(data: bytes, max_dimension: int, quality: int) -> bytes | None:
+    """
+    Decodes, auto-orients from EXIF, crops away the background, downscales
+    so the longer side is at most `max_dimension` and re-encodes as JPEG.
+    Returns None when the bytes aren't an image or the result isn't smaller.
+    """
+    try:
+        with Image.open(BytesIO(data)) as picture:
+            # JPEG can decode straight at a reduced scale, which is much cheaper
+            scale = min(1.0, max_dimension / max(picture.size))
+            picture.draft("RGB", (int(picture.width * scale), int(picture.height * scale)))
+            picture = ImageOps.exif_transpose(picture)
+            picture = picture.convert("RGB")
+    except Exception:
+        return None
+
+    picture = _crop_to_content(picture)
+    picture.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+    output = BytesIO()
+    picture.save(output, format="JPEG", quality=quality, optimize=True, progressive=True)
+    derivative = output.getvalue()
+    return derivative if len(derivative) < len(data) else None
@@ -0,0 +1,214 @@
+"""
+Prometheus metrics for the API and the mail worker, on prometheus_client.
+
+A mail worker is one process and serves its own metrics port. The API runs
+WEB_CONCURRENCY uvicorn processes behind one port, so app/serve.py points
+PROMETHEUS_MULTIPROC_DIR at a shared directory before they start: every
+process writes its samples there, and app.serve's own metrics port
+reports the sum over all of them. The variable has to be set before this
+module is first imported.
+"""
+from collections.abc import Callable
+from contextlib import contextmanager, nullcontext
+import asyncio
+import os
+import time
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+from app.core.config import settings
+
+try:
+    from opentelemetry import trace
+    OTEL_AVAILABLE = True
+except ImportError:
+    OTEL_AVAILABLE = False
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+class Registry:
+    """
+    Scrape output plus gauges whose value is read from a callback (pool
+    state, cache stats...). Callback gauges can't be read across processes,
+    so refresh() copies them into ordinary gauges; it runs before every
+    scrape and, in the API, periodically so the other processes' values
+    stay current too.
+    """
+
+    def __init__(self):
+        self._gauges: dict[str, tuple[Gauge, Callable[[], float | dict[str, float]], str]] = {}
+
+    def gauge(
+        self,
+        name: str,
+        help: str,
+        read: Callable[[], float | dict[str, float]],
+        label: str = "",
+        multiprocess_mode: str = "livesum",
+    ) -> None:
+        """
+        `read` returns a single value, or a dict keyed by the value of `label`
+        for a labelled gauge. Registering a name again replaces its callback.
+        """
+        existing = self._gauges.get(name)
+        gauge = existing[0] if existing else Gauge(
+            name, help, [label] if label else [], multiprocess_mode=multiprocess_mode,
+        )
+        self._gauges[name] = (gauge, read, label)
+
+    def refresh(self) -> None:
+        for gauge, read, label in self._gauges.values():
+            try:
+                value = read()
+            except Exception:
+                continue
+            if isinstance(value, dict):
+                for key, item in value.items():
+                    gauge.labels(key).set(item)
+            else:
+                gauge.set(value)
+
+    def render(self) -> str:
+        self.refresh()
+        if multiprocess_enabled():
+            # A fresh registry per scrape, as prometheus_client's multiprocess mode requires
+            collected = CollectorRegistry()
+            multiprocess.MultiProcessCollector(collected)
+            return generate_latest(collected).decode()
+        return generate_latest(REGISTRY).decode()
+
+
+registry = Registry()
+content_type = CONTENT_TYPE_LATEST
+
+
+async def refresh_periodically(interval: float) -> None:
+    """Keeps this process's callback gauges current for scrapes answered by its siblings."""
+    while True:
+        registry.refresh()
+        await asyncio.sleep(interval)
+
+
+def mark_process_dead() -> None:
+    """Drops this process's live gauges from the shared directory on shutdown."""
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(os.getpid())
+
+
+mail_stage_seconds = Histogram(
+    "intellipost_mail_stage_seconds",
+    "Time spent in each step of mail processing.",
+    ["stage", "outcome"],
+    buckets=DEFAULT_BUCKETS,
+)
+mails_processed_total = Counter(
+    "intellipost_mails_processed_total",
+    "Mails that finished processing, by outcome.",
+    ["outcome"],
+)
+ocr_pincode_reads_total = Counter(
+    "intellipost_ocr_pincode_reads_total",
+    "OCR fast path reads that finished before the vision model answered, by whether the model read the same pincode.",
+    ["result"],
+)
+llm_requests_total = Counter(
+    "intellipost_llm_requests_total",
+    "Vision model requests, by kind (single/batch) and outcome.",
+    ["kind", "outcome"],
+)
+llm_tokens_total = Counter(
+    "intellipost_llm_tokens_total",
+    "Tokens billed by the vision model, from the pydantic-ai run usage.",
+    ["direction"],
+)
+
+_tracer = trace.get_tracer("intellipost") if OTEL_AVAILABLE else None
+
+
+@contextmanager
+def _timed_stage(stage: str, attributes: dict):
+    span = _tracer.start_as_current_span(f"mail.{stage}", attributes=attributes) if (
+        settings.OTEL_SPANS_ENABLED and _tracer is not None
+    ) else nullcontext()
+    started = time.perf_counter()
+    outcome = "ok"
+    with span:
+        try:
+            yield
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            mail_stage_seconds.labels(stage, outcome).observe(time.perf_counter() - started)
+
+
+_disabled = nullcontext()
+
+
+def timed_stage(stage: str, **attributes):
+    """
+    Times a block into intellipost_mail_stage_seconds (outcome "error" if it
+    raises) and, with OTEL_SPANS_ENABLED, wraps it in a span. A no-op
+    context manager when METRICS_ENABLED is off.
+    """
+    if not settings.METRICS_ENABLED:
+        return _disabled
+    return _timed_stage(stage, attributes)
+
+
+def record_llm_request(kind: str, outcome: str, usage=None) -> None:
+    """Counts a vision request and, when given its RunUsage, the tokens it billed."""
+    if not settings.METRICS_ENABLED:
+        return
+    llm_requests_total.labels(kind, outcome).inc()
+    if usage is not None:
+        llm_tokens_total.labels("input").inc(usage.input_tokens or 0)
+        llm_tokens_total.labels("output").inc(usage.output_tokens or 0)
+
+
+def record_ocr_read(result: str) -> None:
+    """Counts an OCR fast path read: "agreed" or "disagreed" with the vision model, or "none"."""
+    if not settings.METRICS_ENABLED:
+        return
+    ocr_pincode_reads_total.labels(result).inc()
+
+
+def record_mail_outcome(outcome: str, seconds: float) -> None:
+    if not settings.METRICS_ENABLED:
+        return
+    mails_processed_total.labels(outcome).inc()
+    mail_stage_seconds.labels("total", outcome).observe(seconds)
+
+
+_caches: dict[str, Callable[[], dict]] = {}
+
+
+def register_cache(name: str, stats: Callable[[], dict]) -> None:
+    """Publishes a cache's stats() (hits, misses, size...) as labelled gauges."""
+    _caches[name] = stats
+
+
+def _cache_stat(field: str) -> Callable[[], dict[str, float]]:
+    def read() -> dict[str, float]:
+        values = {}
+        for name, stats in _caches.items():
+            value = stats().get(field)
+            if value is not None:
+                values[name] = value
+        return values
+    return read
+
+
+# Summed over the API processes; take hit rates as hits / (hits + misses) in queries
+for _field, _help in (
+    ("hits", "Cache hits since the process started."),
+    ("misses", "Cache misses since the process started."),
+    ("size", "Entries currently in the cache."),
+):
+    registry.gauge(f"intellipost_cache_{_field}", _help, _cache_stat(_field), label="cache")
@@ -0,0 +1,101 @@
+"""
+Read-only, memory-mapped pincode -> (district, division, state) index.
+
+File layout:
+    8 bytes   magic b"PININDX1"
+    4 bytes   little-endian length of the JSON names table
+    N bytes   JSON list of [district, division, state] rows (row 0 is unused)
+    padding   to a 2-byte boundary
+    1.8 MB    uint16 slot per pincode 100000..999999, 0 = not in the directory
+
+Lookups are a single array read; only the pages that are touched get paged in.
+"""
+from collections.abc import Iterable
+import json
+import mmap
+import os
+import struct
+import sys
+
+MAGIC = b"PININDX1"
+FIRST_PINCODE = 100000
+SLOT_COUNT = 900000
+
+
+class PincodeIndex:
+
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if self._mmap[:8] != MAGIC:
+            raise ValueError(f"{path} is not a pincode index file")
+        (names_len,) = struct.unpack_from("<I", self._mmap, 8)
+        names_end = 12 + names_len
+        self.names: list[tuple[str, str, str]] = [
+            tuple(row) for row in json.loads(self._mmap[12:names_end])
+        ]
+
+        # The slot array is read in native byte order
+        if sys.byteorder != "little":
+            raise RuntimeError("PincodeIndex files can only be mapped on little-endian hosts")
+        slots_start = names_end + (names_end % 2)
+        self._slots = memoryview(self._mmap)[slots_start:slots_start + SLOT_COUNT * 2].cast("H")
+
+    def get(self, pincode: str | None) -> tuple[str, str, str] | None:
+        """Returns (district, division, state), or None if the pincode isn't indexed."""
+        if not pincode or len(pincode) != 6 or not pincode.isdigit():
+            return None
+        slot = int(pincode) - FIRST_PINCODE
+        if slot < 0:
+            return None
+        name_id = self._slots[slot]
+        return self.names[name_id] if name_id else None
+
+    def __len__(self) -> int:
+        return sum(1 for name_id in self._slots if name_id)
+
+    def close(self):
+        self._slots.release()
+        self._mmap.close()
+
+    @staticmethod
+    def build(entries: Iterable[tuple[str, str, str, str]], path: str) -> int:
+        """
+        Writes an index file from (pincode, district, division, state) rows.
+        Returns the number of pincodes written.
+        """
+        names: list[tuple[str, str, str]] = [("", "", "")]
+        name_ids: dict[tuple[str, str, str], int] = {}
+        slots = [0] * SLOT_COUNT
+        count = 0
+
+        for pincode, district, division, state in entries:
+            slot = int(pincode) - FIRST_PINCODE
+            if not 0 <= slot < SLOT_COUNT:
+                continue
+            key = (district, division, state)
+            if key not in name_ids:
+                name_ids[key] = len(names)
+                names.append(key)
+            if not slots[slot]:
+                count += 1
+            slots[slot] = name_ids[key]
+
+        if len(names) > 0xFFFF:
+            raise ValueError("Too many distinct district/division/state rows for a uint16 index")
+
+        names_blob = json.dumps(names, separators=(",", ":")).encode("utf-8")
+        slot_array = struct.pack(f"<{SLOT_COUNT}H", *slots)
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as file:
+            file.write(MAGIC)
+            file.write(struct.pack("<I", len(names_blob)))
+            file.write(names_blob)
+            if (12 + len(names_blob)) % 2:
+                file.write(b"\0")
+            file.write(slot_array)
+        os.replace(tmp_path, path)
+
+        return count
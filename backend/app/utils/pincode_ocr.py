@@ -0,0 +1,27 @@
+"""
+CPU-only OCR of an envelope photo with Tesseract.
+
+Like app/utils/image_preprocess.py this only works on bytes, so it can run
+in the process pool. Needs pytesseract and the tesseract binary.
+"""
+from io import BytesIO
+
+from PIL import Image, ImageOps
+import pytesseract
+
+
+def ocr_text(data: bytes, max_dimension: int) -> str:
+    """Returns the text Tesseract reads on the image, or "" if it doesn't decode."""
+    try:
+        with Image.open(BytesIO(data)) as picture:
+            scale = min(1.0, max_dimension / max(picture.size))
+            picture.draft("L", (int(picture.width * scale), int(picture.height * scale)))
+            picture = ImageOps.exif_transpose(picture)
+            picture = picture.convert("L")
+    except Exception:
+        return ""
+
+    picture.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+    picture = ImageOps.autocontrast(picture)
+    # Sparse-text mode: envelopes are scattered blocks, not a page of paragraphs
+    return pytesseract.image_to_string(picture, config="--psm 11")
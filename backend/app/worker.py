@@ -0,0 +1,251 @@
+"""
+Standalone mail-processing worker.
+
+Run from the backend directory (next to the API):
+    python -m app.worker --concurrency 8
+
+Any number of workers can run against the same database; jobs are claimed
+with SELECT ... FOR UPDATE SKIP LOCKED. Each worker serves Prometheus
+metrics on --metrics-port (WORKER_METRICS_PORT).
+"""
+import argparse
+import asyncio
+import signal
+import time
+from datetime import datetime
+
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.controllers.mail import process_mail_task
+from app.models.mail_job_model import MailJob
+from app.models.enums.enums import ExtractionLane, JobStatus
+from app.services.agent_service import AgentService
+from app.services.extraction_scheduler_service import ExtractionScheduler
+from app.services.r2_service import R2Service
+from app.services.job_queue_service import JobQueueService, job_queue
+from app.services.extraction_cache_service import PERCEPTUAL_HASH_AVAILABLE, extraction_cache
+from app.services.image_preprocess_service import IMAGE_PREPROCESS_AVAILABLE, shutdown_image_preprocess_pool
+from app.services.pincode_ocr_service import PINCODE_OCR_AVAILABLE, pincode_ocr
+from app.services.pincode_lookup_service import close_pincode_api_client
+from app.utils.metrics import content_type, mail_stage_seconds, register_cache, registry
+
+
+def report_unavailable_features() -> list[str]:
+    """
+    Prints, once at startup, each enabled feature whose optional dependency
+    is missing; the pipeline skips those silently per mail. Returns them.
+    """
+    missing = []
+    if settings.IMAGE_PREPROCESS_ENABLED and not IMAGE_PREPROCESS_AVAILABLE:
+        missing.append("IMAGE_PREPROCESS_ENABLED (needs Pillow)")
+    if settings.EXTRACTION_CACHE_ENABLED and settings.EXTRACTION_CACHE_PERCEPTUAL_HASH and not PERCEPTUAL_HASH_AVAILABLE:
+        missing.append("EXTRACTION_CACHE_PERCEPTUAL_HASH (needs Pillow)")
+    if settings.PINCODE_OCR_ENABLED and not pincode_ocr.available:
+        needs = "the pincode index" if PINCODE_OCR_AVAILABLE else "the ocr extra and the tesseract binary"
+        missing.append(f"PINCODE_OCR_ENABLED (needs {needs})")
+    for feature in missing:
+        print(f"Warning: {feature} is set but unavailable; it is skipped for every mail")
+    return missing
+
+
+class MailWorker:
+
+    def __init__(
+        self,
+        concurrency: int = settings.WORKER_CONCURRENCY,
+        poll_interval: float = settings.WORKER_POLL_INTERVAL_SECONDS,
+        queue: JobQueueService = job_queue,
+        agent: AgentService | None = None,
+        r2: R2Service | None = None,
+        heartbeat_seconds: float = settings.JOB_HEARTBEAT_SECONDS,
+    ):
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.heartbeat_seconds = heartbeat_seconds
+        self.queue = queue
+        # Shared by every job; pass a fake agent (anything with run_agent_with_usage)
+        # here to run the pipeline without OpenAI
+        self.agent = agent or AgentService()
+        # Claimed jobs queue here for OpenAI capacity, interactive lane first
+        self.scheduler = ExtractionScheduler(self.agent)
+        self.r2 = r2 or R2Service()
+        if hasattr(self.r2, "read_url_cache"):
+            register_cache("r2_read_url", self.r2.read_url_cache.stats)
+        registry.gauge(
+            "intellipost_extraction_scheduler_requests",
+            "Vision requests in flight or waiting for admission.",
+            lambda: {k: v for k, v in self.scheduler.stats().items() if k in ("in_flight", "waiting")},
+            label="state",
+        )
+        registry.gauge(
+            "intellipost_worker_jobs_in_flight", "Mail jobs this worker is processing.", lambda: len(self._in_flight),
+        )
+        self._stopping = asyncio.Event()
+        self._in_flight: set[asyncio.Task] = set()
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run(self):
+        report_unavailable_features()
+
+        # The orphaned-mail scan only runs at startup; later passes requeue stale locks
+        await self._recover(orphans=True)
+        next_recover_at = time.monotonic() + settings.JOB_RECOVER_INTERVAL_SECONDS
+        next_prune_at = 0.0
+        while not self._stopping.is_set():
+            if time.monotonic() >= next_recover_at:
+                next_recover_at = time.monotonic() + settings.JOB_RECOVER_INTERVAL_SECONDS
+                await self._recover(orphans=False)
+
+            if settings.EXTRACTION_CACHE_ENABLED and time.monotonic() >= next_prune_at:
+                next_prune_at = time.monotonic() + settings.EXTRACTION_CACHE_PRUNE_INTERVAL_SECONDS
+                await self._prune_extraction_cache()
+
+            free_slots = self.concurrency - len(self._in_flight)
+            jobs = []
+            if free_slots > 0:
+                async with AsyncSessionLocal() as db:
+                    jobs = await self.queue.claim(db, limit=free_slots)
+
+            for job in jobs:
+                task = asyncio.create_task(self._run_job(job))
+                self._in_flight.add(task)
+                task.add_done_callback(self._in_flight.discard)
+
+            # Poll again right away while there is a backlog and free capacity
+            if not jobs or len(self._in_flight) >= self.concurrency:
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+        # Let claimed jobs finish; anything cut short is requeued by a worker's recovery
+        # pass once its lock is older than JOB_LOCK_TIMEOUT_SECONDS
+        if self._in_flight:
+            await asyncio.gather(*self._in_flight, return_exceptions=True)
+
+    async def _recover(self, orphans: bool):
+        try:
+            async with AsyncSessionLocal() as db:
+                recovered = await self.queue.recover(db, orphans=orphans)
+        except Exception as e:
+            print(f"Error recovering mail jobs: {e}")
+            return
+        if recovered:
+            print(f"Worker recovered {recovered} unfinished mail job(s)")
+
+    async def _prune_extraction_cache(self):
+        try:
+            pruned = await extraction_cache.prune()
+        except Exception as e:
+            print(f"Error pruning extraction cache: {e}")
+            return
+        stats = extraction_cache.stats()
+        print(f"Extraction cache: pruned {pruned} entries, hit rate {stats['hit_rate']:.1%} "
+              f"({stats['hits']} hits / {stats['misses']} misses)")
+
+    async def run_once(self) -> int:
+        """Claims and processes one batch of jobs. Returns how many ran."""
+        async with AsyncSessionLocal() as db:
+            jobs = await self.queue.claim(db, limit=self.concurrency)
+        await asyncio.gather(*(self._run_job(job) for job in jobs))
+        return len(jobs)
+
+    async def _run_job(self, job: MailJob):
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await self._process_job(job)
+        finally:
+            heartbeat.cancel()
+
+    async def _heartbeat(self, job: MailJob):
+        # Keeps the job's lock fresh while it waits on the scheduler or the vision model,
+        # so another worker's recovery pass doesn't requeue it
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                async with AsyncSessionLocal() as db:
+                    if not await self.queue.heartbeat(db, job):
+                        print(f"Mail job {job.id} for mail {job.mail_id} was requeued while running")
+                        return
+            except Exception as e:
+                print(f"Error refreshing the lock of mail job {job.id}: {e}")
+
+    async def _process_job(self, job: MailJob):
+        if settings.METRICS_ENABLED:
+            # From when the job became runnable (enqueue, or retry backoff) to its claim
+            waited = max((datetime.utcnow() - job.run_after).total_seconds(), 0.0)
+            mail_stage_seconds.labels("queue_wait", "ok").observe(waited)
+        try:
+            await process_mail_task(
+                job.mail_id,
+                job.file_key,
+                agent=self.scheduler,
+                r2=self.r2,
+                lane=ExtractionLane(job.priority),
+            )
+        except Exception as e:
+            async with AsyncSessionLocal() as db:
+                new_status = await self.queue.fail(db, job, error=f"{type(e).__name__}: {e}")
+            if new_status is None:
+                print(f"Mail job {job.id} lost its claim while running; leaving the failure to its new owner")
+            elif new_status == JobStatus.DEAD:
+                print(f"Mail job {job.id} for mail {job.mail_id} dead-lettered after {job.attempts} attempts")
+            return
+
+        async with AsyncSessionLocal() as db:
+            if not await self.queue.complete(db, job):
+                print(f"Mail job {job.id} lost its claim while running; leaving it to its new owner")
+
+async def serve_metrics(port: int) -> asyncio.AbstractServer:
+    """Bare-bones HTTP server answering every request with the metrics registry."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = registry.render().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                + f"Content-Type: {content_type}\r\n".encode()
+                + f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode()
+                + body
+            )
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, port=port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="IntelliPost mail-processing worker")
+    parser.add_argument("--concurrency", type=int, default=settings.WORKER_CONCURRENCY)
+    parser.add_argument("--poll-interval", type=float, default=settings.WORKER_POLL_INTERVAL_SECONDS)
+    parser.add_argument("--metrics-port", type=int, default=settings.WORKER_METRICS_PORT,
+                        help="Port for Prometheus metrics; 0 to disable")
+    args = parser.parse_args()
+
+    async def _serve():
+        worker = MailWorker(concurrency=args.concurrency, poll_interval=args.poll_interval)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, worker.stop)
+        metrics_server = None
+        if settings.METRICS_ENABLED and args.metrics_port:
+            metrics_server = await serve_metrics(args.metrics_port)
+        try:
+            await worker.run()
+        finally:
+            if metrics_server is not None:
+                metrics_server.close()
+            await close_pincode_api_client()
+            shutdown_image_preprocess_pool()
+
+    asyncio.run(_serve())
+
+
+if __name__ == "__main__":
+    main()
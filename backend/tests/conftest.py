@@ -0,0 +1,110 @@
+"""
+Shared test setup. The app reads its prompts relative to backend/, so tests
+run from there whatever directory pytest started in. Settings need the
+R2/OpenAI/database variables before app modules are imported; dummies fill
+in whatever the environment doesn't set. Nothing here talks to R2, OpenAI
+or the pincode API.
+
+Tests using the `postgres` fixture run against DATABASE_URL, a disposable
+database already migrated with `alembic upgrade head`, and are skipped when
+it isn't set or can't be reached.
+"""
+import os
+from uuid import uuid4
+
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+DATABASE_URL = os.environ.get("DATABASE_URL")
+
+for _name, _value in {
+    "PROJECT_NAME": "intellipost-tests",
+    "DATABASE_USER": "postgres",
+    "DATABASE_PASSWORD": "postgres",
+    "DATABASE_HOST": "localhost",
+    "DATABASE_PORT": "5432",
+    "DATABASE_NAME": "intellipost_test",
+    "R2_ACCOUNT_ID": "test",
+    "R2_ACCESS_KEY_ID": "test",
+    "R2_SECRET_ACCESS_KEY": "test",
+    "R2_BUCKET_NAME": "test-bucket",
+    "OPENAI_API_KEY": "sk-test",
+    "METRICS_ENABLED": "false",
+}.items():
+    os.environ.setdefault(_name, _value)
+if DATABASE_URL:
+    os.environ["ASYNC_DATABASE_URI"] = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from openai import AsyncOpenAI
+from pydantic_ai.models.openai import OpenAIChatModel
+from pydantic_ai.providers.openai import OpenAIProvider
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.core.config import settings
+from app.services.agent_service import AgentService
+
+
+def _vision_agent_for(openai_app: FastAPI) -> AgentService:
+    client = AsyncOpenAI(
+        api_key="sk-test",
+        base_url="http://fake-openai/v1",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.ASGITransport(app=openai_app)),
+    )
+    model = OpenAIChatModel(model_name=settings.VISION_MODEL_NAME, provider=OpenAIProvider(openai_client=client))
+    agent = AgentService()
+    agent.agent.model = model
+    agent.batch_agent.model = model
+    return agent
+
+
+@pytest.fixture
+def vision_agent_for():
+    """
+    Builds an AgentService whose model talks to an OpenAI-compatible ASGI app
+    (e.g. the benchmark's fake_openai_app) in-process, with SDK retries off as
+    in production.
+    """
+    return _vision_agent_for
+
+
+@pytest.fixture
+async def postgres():
+    """
+    The app's engine, pointed at DATABASE_URL. Skips the test when it isn't set
+    or the server can't be reached; the pool is disposed afterwards because
+    each test runs on its own event loop.
+    """
+    if not DATABASE_URL:
+        pytest.skip("DATABASE_URL is not set")
+    from app.db.database import engine
+
+    try:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+    except (OSError, SQLAlchemyError) as e:
+        await engine.dispose()
+        pytest.skip(f"Postgres is not reachable: {e}")
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+async def test_user(postgres):
+    """A throwaway user; its mails (and their jobs and payloads) are deleted afterwards."""
+    from app.db.database import AsyncSessionLocal
+    from app.models.user_model import User
+
+    user = User(username="pytest", email=f"{uuid4().hex}@tests.intellipost.dev", hashed_password="!")
+    async with AsyncSessionLocal() as db:
+        db.add(user)
+        await db.commit()
+        await db.refresh(user)
+    yield user
+    async with AsyncSessionLocal() as db:
+        await db.execute(text("DELETE FROM mails WHERE user_id = :user_id"), {"user_id": user.id})
+        await db.execute(text("DELETE FROM users WHERE id = :user_id"), {"user_id": user.id})
+        await db.commit()
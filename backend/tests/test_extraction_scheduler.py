@@ -0,0 +1,228 @@
+import asyncio
+import time
+
+import pytest
+from pydantic_ai.exceptions import ModelHTTPError
+from pydantic_ai.usage import RunUsage
+
+from app.benchmarks.fakes import FakeLatency, fake_openai_app, fake_vision_output
+from app.models.enums.enums import ExtractionLane
+from app.services.extraction_scheduler_service import ExtractionScheduler
+
+
+class RecordingAgent:
+    """Answers in the order requests are admitted; `gate` holds the first call open."""
+
+    def __init__(self, usage: RunUsage | None = None):
+        self.usage = usage
+        self.admitted: list[str] = []
+        self.gate = asyncio.Event()
+        self.gate.set()
+
+    async def run_agent_with_usage(self, user_input: str, image_url: str):
+        self.admitted.append(image_url)
+        await self.gate.wait()
+        return fake_vision_output(image_url), self.usage
+
+
+def make_scheduler(agent, **overrides) -> ExtractionScheduler:
+    options = dict(
+        max_in_flight=1,
+        requests_per_minute=6000,
+        tokens_per_minute=6_000_000,
+        estimated_tokens=100,
+        retries=2,
+        backoff_seconds=0.1,
+        backoff_max_seconds=0.4,
+        batch_size=1,
+    )
+    options.update(overrides)
+    return ExtractionScheduler(agent, **options)
+
+
+async def test_interactive_lane_is_admitted_before_queued_bulk_requests():
+    agent = RecordingAgent()
+    scheduler = make_scheduler(agent)
+
+    agent.gate.clear()
+    first = asyncio.create_task(scheduler.run_agent("", "first", ExtractionLane.BULK))
+    await asyncio.sleep(0.01)
+    queued = []
+    for image_url, lane in (
+        ("bulk-1", ExtractionLane.BULK),
+        ("bulk-2", ExtractionLane.BULK),
+        ("interactive", ExtractionLane.INTERACTIVE),
+    ):
+        queued.append(asyncio.create_task(scheduler.run_agent("", image_url, lane)))
+        await asyncio.sleep(0.01)
+    assert scheduler.stats()["waiting"] == 3
+
+    agent.gate.set()
+    await asyncio.gather(first, *queued)
+
+    assert agent.admitted == ["first", "interactive", "bulk-1", "bulk-2"]
+    assert scheduler.stats()["completed"] == 4
+
+
+async def test_max_in_flight_caps_concurrent_calls():
+    agent = RecordingAgent()
+    scheduler = make_scheduler(agent, max_in_flight=3)
+
+    agent.gate.clear()
+    tasks = [asyncio.create_task(scheduler.run_agent("", f"image-{i}")) for i in range(10)]
+    await asyncio.sleep(0.05)
+    assert len(agent.admitted) == 3
+    assert scheduler.stats()["in_flight"] == 3
+
+    agent.gate.set()
+    await asyncio.gather(*tasks)
+    assert len(agent.admitted) == 10
+
+
+async def test_empty_request_bucket_delays_admission():
+    # 600 requests/minute refill one request every 0.1s
+    scheduler = make_scheduler(RecordingAgent(), requests_per_minute=600)
+    scheduler.requests.tokens = 0
+
+    started = time.monotonic()
+    await scheduler.run_agent("", "image")
+    assert time.monotonic() - started >= 0.09
+
+
+async def test_token_estimate_is_settled_against_actual_usage():
+    # 600 tokens/minute refill 10 tokens a second, so the bucket barely moves during the test
+    agent = RecordingAgent(usage=RunUsage(input_tokens=30, output_tokens=10))
+    scheduler = make_scheduler(agent, tokens_per_minute=600, estimated_tokens=100)
+
+    await scheduler.run_agent("", "image")
+
+    assert scheduler.tokens.tokens == pytest.approx(600 - 40, abs=2)
+
+
+async def test_token_bucket_delays_requests_over_the_estimate_budget():
+    # 60000 tokens/minute refill 1000 a second; the second request has to wait ~0.1s
+    scheduler = make_scheduler(RecordingAgent(), tokens_per_minute=60000, estimated_tokens=100)
+    scheduler.tokens.tokens = 100
+
+    await scheduler.run_agent("", "first")
+    started = time.monotonic()
+    await scheduler.run_agent("", "second")
+    assert time.monotonic() - started >= 0.09
+
+
+async def test_429_pauses_for_retry_after_then_gives_up(vision_agent_for):
+    openai_app = fake_openai_app(rate_limit_rate=1.0, retry_after_seconds=0.2)
+    scheduler = make_scheduler(vision_agent_for(openai_app), retries=1)
+
+    started = time.monotonic()
+    with pytest.raises(ModelHTTPError) as raised:
+        await scheduler.run_agent("", "https://example.com/envelope.jpg")
+
+    assert raised.value.status_code == 429
+    assert openai_app.state.stats.requests == 2
+    # The retry waited out the retry-after-ms the fake sent
+    assert time.monotonic() - started >= 0.2
+    assert scheduler.stats()["rate_limited"] == 1
+
+
+class RateLimitedAgent(RecordingAgent):
+    """Fails the first `failures` calls with a 429 that carries no rate-limit headers."""
+
+    def __init__(self, failures: int):
+        super().__init__()
+        self.failures = failures
+
+    async def run_agent_with_usage(self, user_input: str, image_url: str):
+        if self.failures:
+            self.failures -= 1
+            self.admitted.append(image_url)
+            raise ModelHTTPError(status_code=429, model_name="fake-vision")
+        return await super().run_agent_with_usage(user_input, image_url)
+
+
+def test_backoff_without_headers_grows_exponentially_up_to_the_cap():
+    scheduler = make_scheduler(RecordingAgent(), backoff_seconds=1.0, backoff_max_seconds=3.0)
+
+    pauses = []
+    for _ in range(4):
+        scheduler._paused_until = 0.0
+        scheduler._on_rate_limited(ModelHTTPError(status_code=429, model_name="fake-vision"))
+        pauses.append(scheduler._paused_until - time.monotonic())
+
+    # Jittered between half and all of 1s, 2s, then the 3s cap
+    for pause, (low, high) in zip(pauses, [(0.5, 1.0), (1.0, 2.0), (1.5, 3.0), (1.5, 3.0)]):
+        assert low - 0.05 <= pause <= high
+    assert scheduler.requests.tokens <= 0
+
+
+async def test_rate_limited_request_is_retried_after_backoff_and_resets_the_streak():
+    agent = RateLimitedAgent(failures=2)
+    scheduler = make_scheduler(agent, backoff_seconds=0.1, backoff_max_seconds=0.4)
+
+    started = time.monotonic()
+    output = await scheduler.run_agent("", "image")
+
+    assert output == fake_vision_output("image")
+    assert agent.admitted == ["image", "image", "image"]
+    # Backoffs of 0.05-0.1s and then 0.1-0.2s
+    assert time.monotonic() - started >= 0.15
+    assert scheduler.stats()["rate_limited"] == 2
+    assert scheduler._rate_limit_streak == 0
+
+
+async def _extract_all(scheduler: ExtractionScheduler, mails: int) -> float:
+    started = time.monotonic()
+    outputs = await asyncio.gather(*(
+        scheduler.run_agent("", f"https://example.com/envelope-{i}.jpg") for i in range(mails)
+    ))
+    assert all(output["receiver_pincode"] for output in outputs)
+    return time.monotonic() - started
+
+
+async def test_batching_raises_throughput_and_lowers_cost_per_mail(vision_agent_for):
+    mails = 24
+    results = {}
+    for batch_size in (1, 6):
+        openai_app = fake_openai_app(latency=FakeLatency(mean=0.05))
+        scheduler = make_scheduler(
+            vision_agent_for(openai_app),
+            max_in_flight=2,
+            batch_size=batch_size,
+            batch_window_seconds=0.02,
+        )
+        elapsed = await _extract_all(scheduler, mails)
+        stats = openai_app.state.stats
+        results[batch_size] = {
+            "mails_per_minute": mails / elapsed * 60,
+            "tokens_per_mail": (stats.prompt_tokens + stats.completion_tokens) / mails,
+            "requests": stats.requests,
+        }
+
+    single, batched = results[1], results[6]
+    assert single["requests"] == mails
+    assert batched["requests"] == mails // 6
+    assert batched["mails_per_minute"] > 2 * single["mails_per_minute"]
+    # The fixed per-request prompt is paid once per batch instead of once per mail
+    assert batched["tokens_per_mail"] < single["tokens_per_mail"]
+
+
+class StuckBatchAgent(RecordingAgent):
+    async def run_agent_batch_with_usage(self, image_urls: list[str]):
+        await asyncio.Event().wait()
+
+
+async def test_cancelled_batch_falls_back_to_single_requests():
+    agent = StuckBatchAgent()
+    scheduler = make_scheduler(agent, max_in_flight=4, batch_size=3, batch_window_seconds=0.01)
+
+    callers = [asyncio.create_task(scheduler.run_agent("", f"image-{i}")) for i in range(3)]
+    await asyncio.sleep(0.05)
+    assert len(scheduler._batch_tasks) == 1
+    for task in list(scheduler._batch_tasks):
+        task.cancel()
+
+    outputs = await asyncio.wait_for(asyncio.gather(*callers), timeout=1)
+    assert outputs == [fake_vision_output(f"image-{i}") for i in range(3)]
+    assert sorted(agent.admitted) == ["image-0", "image-1", "image-2"]
+    assert scheduler.stats()["batch_fallbacks"] == 3
+    assert scheduler.stats()["in_flight"] == 0
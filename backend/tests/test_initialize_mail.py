@@ -0,0 +1,44 @@
+from uuid import uuid4
+
+import pytest
+from sqlalchemy.exc import IntegrityError
+
+from app.controllers.mail import initialize_mail, initialize_mails
+from app.db.database import AsyncSessionLocal
+
+
+async def test_registering_a_file_twice_returns_the_same_mail(test_user):
+    file_key = f"user_uploads/{test_user.id}/{uuid4().hex}.jpg"
+    async with AsyncSessionLocal() as db:
+        first = await initialize_mail(test_user.id, file_key, db)
+    async with AsyncSessionLocal() as db:
+        second = await initialize_mail(test_user.id, file_key, db)
+
+    assert first is not None
+    assert second.id == first.id
+
+
+async def test_other_integrity_errors_are_not_taken_for_duplicates(test_user):
+    # No such user: the mail's foreign key fails, not the unique file key
+    missing_user = uuid4()
+    async with AsyncSessionLocal() as db:
+        with pytest.raises(IntegrityError):
+            await initialize_mail(missing_user, f"user_uploads/{missing_user}/{uuid4().hex}.jpg", db)
+
+
+@pytest.mark.parametrize("file_key", [
+    "user_uploads/{other}/scan.jpg",
+    "user_uploads/{me}/../{other}/scan.jpg",
+    "user_uploads/{me}/",
+    "user_uploads/{me}",
+    "elsewhere/{me}/scan.jpg",
+])
+async def test_keys_outside_the_upload_prefix_are_rejected(file_key):
+    # Rejected before the database is touched, so no session is needed
+    me, other = uuid4(), uuid4()
+    file_key = file_key.format(me=me, other=other)
+
+    with pytest.raises(ValueError):
+        await initialize_mail(me, file_key, db=None)
+    with pytest.raises(ValueError):
+        await initialize_mails(me, [f"user_uploads/{me}/scan.jpg", file_key], db=None)
@@ -0,0 +1,254 @@
+"""
+Claim, retry and dead-letter against Postgres (skipped without DATABASE_URL),
+with a fake vision agent and a fake R2 so no external service is called.
+"""
+from datetime import datetime, timedelta
+from uuid import uuid4
+import asyncio
+
+import pytest
+from sqlmodel import select
+
+from app.benchmarks.fakes import fake_vision_output
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.enums.enums import ExtractionLane, JobStatus, ProcessingStatus
+from app.models.mail_job_model import MailJob
+from app.models.mail_model import Mail
+from app.services.job_queue_service import JobQueueService
+from app.services.pincode_lookup_service import pincode_memory_cache
+from app.worker import MailWorker
+
+# Older than anything a real upload gets, so claim() takes these jobs first
+LONG_AGO = datetime(2000, 1, 1)
+
+
+class FakeVisionAgent:
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.calls = 0
+
+    async def run_agent_with_usage(self, user_input: str, image_url: str):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("vision model unavailable")
+        return {**fake_vision_output(image_url), "receiver_pincode": "110001"}, None
+
+
+class FakeR2:
+    def generate_read_url(self, file_key: str) -> str:
+        return f"https://r2.test/{file_key}"
+
+
+@pytest.fixture(autouse=True)
+def pipeline_without_downloads(monkeypatch):
+    # The fake R2 has no objects, and the pincode resolves from memory
+    monkeypatch.setattr(settings, "EXTRACTION_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "IMAGE_PREPROCESS_ENABLED", False)
+    monkeypatch.setattr(settings, "PINCODE_OCR_ENABLED", False)
+    pincode_memory_cache.set("110001", ("New Delhi", datetime.utcnow()))
+
+
+async def add_mails(user_id, count: int, queue: JobQueueService, **job_values) -> list[Mail]:
+    mails = []
+    async with AsyncSessionLocal() as db:
+        for i in range(count):
+            mail = Mail(user_id=user_id, image_s3_key=f"user_uploads/{user_id}/{uuid4().hex}.jpg", image_url="")
+            db.add(mail)
+            await db.flush()
+            job = queue.enqueue(db, mail_id=mail.id, file_key=mail.image_s3_key)
+            job.run_after = LONG_AGO
+            for name, value in job_values.items():
+                setattr(job, name, value)
+            mails.append(mail)
+        await db.commit()
+    return mails
+
+
+async def job_for(mail: Mail) -> MailJob:
+    async with AsyncSessionLocal() as db:
+        return (await db.exec(select(MailJob).where(MailJob.mail_id == mail.id))).one()
+
+
+async def mail_status(mail: Mail) -> ProcessingStatus:
+    async with AsyncSessionLocal() as db:
+        return (await db.exec(select(Mail.status).where(Mail.id == mail.id))).one()
+
+
+async def test_claim_takes_interactive_jobs_first_and_only_once(test_user):
+    queue = JobQueueService()
+    bulk = await add_mails(test_user.id, 2, queue, priority=ExtractionLane.BULK)
+    interactive = await add_mails(test_user.id, 1, queue)
+
+    async with AsyncSessionLocal() as db:
+        first = await queue.claim(db, limit=2)
+    async with AsyncSessionLocal() as db:
+        second = await queue.claim(db, limit=2)
+
+    assert [job.mail_id for job in first] == [interactive[0].id, bulk[0].id]
+    assert all(job.status == JobStatus.RUNNING and job.attempts == 1 for job in first)
+    assert [job.mail_id for job in second][:1] == [bulk[1].id]
+    assert not {job.id for job in first} & {job.id for job in second}
+
+
+async def test_concurrent_claims_never_share_a_job(test_user):
+    queue = JobQueueService()
+    mails = await add_mails(test_user.id, 6, queue)
+
+    async def claim():
+        async with AsyncSessionLocal() as db:
+            return await queue.claim(db, limit=2)
+
+    claimed = [job.mail_id for jobs in await asyncio.gather(*(claim() for _ in range(4))) for job in jobs]
+    ours = [mail_id for mail_id in claimed if mail_id in {mail.id for mail in mails}]
+    assert sorted(ours) == sorted(mail.id for mail in mails)
+
+
+async def test_successful_job_completes_the_mail(test_user):
+    queue = JobQueueService()
+    [mail] = await add_mails(test_user.id, 1, queue)
+    worker = MailWorker(concurrency=1, queue=queue, agent=FakeVisionAgent(), r2=FakeR2())
+
+    await worker.run_once()
+
+    job = await job_for(mail)
+    assert job.status == JobStatus.DONE
+    async with AsyncSessionLocal() as db:
+        stored = (await db.exec(select(Mail).where(Mail.id == mail.id))).one()
+    assert stored.status == ProcessingStatus.COMPLETED
+    assert stored.assigned_sorting_center == "New Delhi"
+
+
+async def test_failed_job_is_retried_then_dead_lettered(test_user):
+    queue = JobQueueService(max_attempts=2, backoff_seconds=0)
+    [mail] = await add_mails(test_user.id, 1, queue)
+    agent = FakeVisionAgent(failures=2)
+    worker = MailWorker(concurrency=1, queue=queue, agent=agent, r2=FakeR2())
+
+    await worker.run_once()
+    job = await job_for(mail)
+    assert (job.status, job.attempts) == (JobStatus.QUEUED, 1)
+    assert "vision model unavailable" in job.last_error
+    assert await mail_status(mail) == ProcessingStatus.PENDING
+
+    await worker.run_once()
+    job = await job_for(mail)
+    assert (job.status, job.attempts) == (JobStatus.DEAD, 2)
+    assert job.locked_at is None
+    assert await mail_status(mail) == ProcessingStatus.FAILED
+    assert agent.calls == 2
+
+
+async def test_retry_succeeds_after_a_transient_failure(test_user):
+    queue = JobQueueService(max_attempts=3, backoff_seconds=0)
+    [mail] = await add_mails(test_user.id, 1, queue)
+    worker = MailWorker(concurrency=1, queue=queue, agent=FakeVisionAgent(failures=1), r2=FakeR2())
+
+    await worker.run_once()
+    await worker.run_once()
+
+    job = await job_for(mail)
+    assert (job.status, job.attempts) == (JobStatus.DONE, 2)
+    assert await mail_status(mail) == ProcessingStatus.COMPLETED
+
+
+async def test_running_worker_periodically_requeues_stale_jobs(test_user, monkeypatch):
+    monkeypatch.setattr(settings, "JOB_RECOVER_INTERVAL_SECONDS", 0)
+    queue = JobQueueService(lock_timeout_seconds=60)
+    worker = MailWorker(concurrency=1, poll_interval=0.05, queue=queue, agent=FakeVisionAgent(), r2=FakeR2())
+    running = asyncio.create_task(worker.run())
+    try:
+        await asyncio.sleep(0.2)
+        # Left behind by a worker that died after claiming it, after this one started
+        [mail] = await add_mails(
+            test_user.id, 1, queue,
+            status=JobStatus.RUNNING, attempts=1, locked_at=datetime.utcnow() - timedelta(minutes=5),
+        )
+        for _ in range(100):
+            if (await job_for(mail)).status == JobStatus.DONE:
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        worker.stop()
+        await running
+
+    job = await job_for(mail)
+    assert (job.status, job.attempts) == (JobStatus.DONE, 2)
+    assert await mail_status(mail) == ProcessingStatus.COMPLETED
+
+
+class SlowVisionAgent(FakeVisionAgent):
+    def __init__(self, seconds: float):
+        super().__init__()
+        self.seconds = seconds
+
+    async def run_agent_with_usage(self, user_input: str, image_url: str):
+        await asyncio.sleep(self.seconds)
+        return await super().run_agent_with_usage(user_input, image_url)
+
+
+async def test_heartbeat_keeps_a_long_job_from_being_requeued(test_user):
+    queue = JobQueueService(lock_timeout_seconds=1)
+    [mail] = await add_mails(test_user.id, 1, queue)
+    agent = SlowVisionAgent(seconds=2.5)
+    worker = MailWorker(concurrency=1, queue=queue, agent=agent, r2=FakeR2(), heartbeat_seconds=0.2)
+
+    async def recover_like_another_worker():
+        while True:
+            async with AsyncSessionLocal() as db:
+                await queue.recover(db, orphans=False)
+            await asyncio.sleep(0.1)
+
+    recovering = asyncio.create_task(recover_like_another_worker())
+    try:
+        await worker.run_once()
+    finally:
+        recovering.cancel()
+
+    job = await job_for(mail)
+    assert (job.status, job.attempts) == (JobStatus.DONE, 1)
+    assert agent.calls == 1
+
+
+async def test_a_requeued_claim_can_no_longer_finish_the_job(test_user):
+    queue = JobQueueService(max_attempts=5, backoff_seconds=0)
+    [mail] = await add_mails(test_user.id, 1, queue)
+    async with AsyncSessionLocal() as db:
+        [first] = [job for job in await queue.claim(db, limit=10) if job.mail_id == mail.id]
+
+    # The first claim's lock went stale; recovery requeues it and a second worker claims it
+    async with AsyncSessionLocal() as db:
+        stored = (await db.exec(select(MailJob).where(MailJob.id == first.id))).one()
+        stored.locked_at = datetime.utcnow() - timedelta(hours=1)
+        db.add(stored)
+        await db.commit()
+        await queue.recover(db, orphans=False)
+    async with AsyncSessionLocal() as db:
+        [second] = [job for job in await queue.claim(db, limit=10) if job.mail_id == mail.id]
+
+    async with AsyncSessionLocal() as db:
+        assert not await queue.heartbeat(db, first)
+        assert not await queue.complete(db, first)
+        assert await queue.fail(db, first, error="late failure") is None
+    job = await job_for(mail)
+    assert (job.status, job.claim_token, job.last_error) == (JobStatus.RUNNING, second.claim_token, None)
+
+    async with AsyncSessionLocal() as db:
+        assert await queue.complete(db, second)
+    assert (await job_for(mail)).status == JobStatus.DONE
+
+
+async def test_stale_job_on_its_last_attempt_is_dead_lettered(test_user):
+    queue = JobQueueService(max_attempts=3, lock_timeout_seconds=60)
+    stale = datetime.utcnow() - timedelta(minutes=5)
+    [exhausted] = await add_mails(test_user.id, 1, queue, status=JobStatus.RUNNING, attempts=3, locked_at=stale)
+    [retryable] = await add_mails(test_user.id, 1, queue, status=JobStatus.RUNNING, attempts=1, locked_at=stale)
+
+    async with AsyncSessionLocal() as db:
+        await queue.recover(db, orphans=False)
+
+    job = await job_for(exhausted)
+    assert (job.status, job.locked_at) == (JobStatus.DEAD, None)
+    assert "last attempt" in job.last_error
+    assert await mail_status(exhausted) == ProcessingStatus.FAILED
+    assert (await job_for(retryable)).status == JobStatus.QUEUED
@@ -0,0 +1,45 @@
+import asyncio
+from uuid import uuid4
+
+import asyncpg
+from sqlalchemy import text
+
+from app.services.mail_events_service import MAIL_STATUS_CHANNEL, MailEventBroker
+
+
+async def test_listener_reconnects_when_its_connection_stops_answering(postgres, monkeypatch):
+    listening: list[asyncpg.Connection] = []
+    add_listener = asyncpg.Connection.add_listener
+    fetchval = asyncpg.Connection.fetchval
+
+    async def recording_add_listener(self, channel, callback):
+        listening.append(self)
+        await add_listener(self, channel, callback)
+
+    async def fetchval_hanging_on_first(self, query, *args, **kwargs):
+        # A half-open socket: the first LISTEN connection never answers again
+        if self is listening[0]:
+            await asyncio.Event().wait()
+        return await fetchval(self, query, *args, **kwargs)
+
+    monkeypatch.setattr(asyncpg.Connection, "add_listener", recording_add_listener)
+    monkeypatch.setattr(asyncpg.Connection, "fetchval", fetchval_hanging_on_first)
+
+    broker = MailEventBroker(reconnect_seconds=0.01, ping_seconds=0.05, ping_timeout_seconds=0.05)
+    user_id = uuid4()
+    queue = broker.subscribe(user_id)
+    try:
+        for _ in range(100):
+            if len(listening) >= 2:
+                break
+            await asyncio.sleep(0.02)
+        assert len(listening) >= 2
+        assert listening[0].is_closed()
+
+        payload = f'{{"id": "mail-1", "user_id": "{user_id}"}}'
+        async with postgres.begin() as connection:
+            await connection.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": MAIL_STATUS_CHANNEL, "payload": payload})
+        assert await asyncio.wait_for(queue.get(), 5) == ("mail-1", payload)
+    finally:
+        broker.unsubscribe(user_id, queue)
+        await broker.close()
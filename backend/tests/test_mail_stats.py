@@ -0,0 +1,44 @@
+from datetime import datetime
+
+from sqlalchemy import insert, update
+
+from app.controllers.mail import get_mail_stats, initialize_mails
+from app.core.config import settings
+from app.db.database import AsyncSessionLocal
+from app.models.enums.enums import ProcessingStatus
+from app.models.mail_model import Mail
+from app.models.mail_stats_model import MailStatsDaily
+
+
+async def test_summary_counts_match_counting_mails(test_user):
+    async with AsyncSessionLocal() as db:
+        queued = await initialize_mails(test_user.id, [f"user_uploads/{test_user.id}/{i}.jpg" for i in range(5)], db)
+        await db.execute(
+            update(Mail)
+            .where(Mail.id.in_([entry.id for entry in queued[:3]]))
+            .values(status=ProcessingStatus.COMPLETED, assigned_sorting_center="New Delhi", sorted_at=datetime.utcnow())
+        )
+        await db.commit()
+
+        from_summary = await get_mail_stats(test_user.id, db, from_summary=True)
+        from_mails = await get_mail_stats(test_user.id, db, from_summary=False)
+
+    assert from_summary == from_mails
+    assert from_summary.total == 5
+    assert from_summary.by_status == {ProcessingStatus.COMPLETED: 3, ProcessingStatus.PENDING: 2}
+
+
+async def test_setting_is_read_on_each_call(test_user, monkeypatch):
+    async with AsyncSessionLocal() as db:
+        monkeypatch.setattr(settings, "MAIL_STATS_FROM_SUMMARY", False)
+        # Rows only the summary path would count
+        await db.execute(
+            insert(MailStatsDaily).values(
+                user_id=test_user.id, day=datetime.utcnow().date(), status=ProcessingStatus.FAILED, count=7,
+            )
+        )
+        await db.commit()
+        assert (await get_mail_stats(test_user.id, db)).total == 0
+
+        monkeypatch.setattr(settings, "MAIL_STATS_FROM_SUMMARY", True)
+        assert (await get_mail_stats(test_user.id, db)).total == 7
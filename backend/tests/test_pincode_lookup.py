@@ -0,0 +1,197 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from datetime import datetime, timedelta
+import asyncio
+import json
+import threading
+import time
+
+from app.services import pincode_lookup_service
+from app.services.pincode_lookup_service import PincodeApiClient, PincodeLookupService, PincodeMemoryCache
+from app.utils.cache import MISSING
+
+PINCODES = ["110001", "400001", "560001", "600001", "700001"]
+
+
+class StubApiClient:
+    """Answers like the India Post API after a short delay and counts the calls."""
+
+    def __init__(self, delay: float = 0.05, invalid: set[str] = frozenset()):
+        self.delay = delay
+        self.invalid = invalid
+        self.calls: list[str] = []
+
+    async def get_pincode(self, pincode: str) -> list:
+        self.calls.append(pincode)
+        await asyncio.sleep(self.delay)
+        if pincode in self.invalid:
+            return [{"Status": "Error", "PostOffice": None}]
+        return [{
+            "Status": "Success",
+            "PostOffice": [{"Division": f"Division {pincode}", "District": "District", "State": "State"}],
+        }]
+
+
+class SlowPincodeHandler(BaseHTTPRequestHandler):
+    """A slow India Post API on a real socket, in its own thread, off the test's event loop."""
+
+    protocol_version = "HTTP/1.1"
+    delay = 0.3
+
+    def do_GET(self):
+        time.sleep(self.delay)
+        pincode = self.path.rsplit("/", 1)[-1]
+        body = json.dumps([{
+            "Status": "Success",
+            "PostOffice": [{"Division": f"Division {pincode}", "District": "District", "State": "State"}],
+        }]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class EmptyIndex:
+    def get(self, pincode: str):
+        return None
+
+
+class EmptySession:
+    """Stands in for AsyncSessionLocal(): no cached rows, writes are dropped."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def exec(self, statement):
+        await asyncio.sleep(0)
+        return self
+
+    def first(self):
+        return None
+
+    async def execute(self, statement):
+        await asyncio.sleep(0)
+
+    async def commit(self):
+        pass
+
+
+class ChangedRowsSession(EmptySession):
+    """Answers the memory cache's sync query with fixed (pincode, updated_at) rows."""
+
+    rows: list[tuple[str, datetime]] = []
+
+    def all(self):
+        return self.rows
+
+
+def make_service(monkeypatch, api_client: StubApiClient, **cache_options) -> PincodeLookupService:
+    monkeypatch.setattr(pincode_lookup_service, "AsyncSessionLocal", EmptySession)
+    return PincodeLookupService(
+        api_client=api_client,
+        memory_cache=PincodeMemoryCache(**{"sync_interval_seconds": 3600, **cache_options}),
+        index=EmptyIndex(),
+    )
+
+
+async def test_concurrent_lookups_share_one_upstream_call_per_pincode(monkeypatch):
+    api_client = StubApiClient()
+    service = make_service(monkeypatch, api_client)
+
+    pincodes = [PINCODES[i % len(PINCODES)] for i in range(500)]
+    results = await asyncio.gather(*(service.resolve_sorting_center(p) for p in pincodes))
+
+    assert sorted(api_client.calls) == sorted(PINCODES)
+    assert results == [f"Division {p}" for p in pincodes]
+    assert len(pincode_lookup_service.pincode_lookups_in_flight) == 0
+
+
+async def test_later_lookups_are_served_from_memory(monkeypatch):
+    api_client = StubApiClient(delay=0)
+    service = make_service(monkeypatch, api_client)
+
+    for _ in range(3):
+        assert await service.resolve_sorting_center("110001") == "Division 110001"
+
+    assert api_client.calls == ["110001"]
+
+
+async def test_invalid_pincodes_are_asked_again_once_their_shorter_ttl_expires(monkeypatch):
+    api_client = StubApiClient(delay=0, invalid={"999999"})
+    service = make_service(monkeypatch, api_client, negative_ttl_seconds=0.05)
+
+    assert await service.resolve_sorting_center("999999") is None
+    assert await service.resolve_sorting_center("999999") is None
+    assert await service.resolve_sorting_center("110001") == "Division 110001"
+    assert api_client.calls == ["999999", "110001"]
+
+    await asyncio.sleep(0.1)
+    assert await service.resolve_sorting_center("999999") is None
+    assert await service.resolve_sorting_center("110001") == "Division 110001"
+    assert api_client.calls == ["999999", "110001", "999999"]
+
+
+async def test_sync_evicts_entries_whose_row_was_updated(monkeypatch):
+    loaded_at = datetime.utcnow()
+    updated_at = loaded_at + timedelta(minutes=1)
+    cache = PincodeMemoryCache(sync_interval_seconds=0)
+    cache.set("110001", ("Division 110001", loaded_at))
+    cache.set("400001", ("Division 400001", loaded_at))
+    cache.set_invalid("560001")
+
+    monkeypatch.setattr(ChangedRowsSession, "rows", [
+        ("110001", updated_at),  # changed since it was cached
+        ("400001", loaded_at),   # the row this entry was loaded from
+        ("560001", updated_at),  # was invalid, now has a row
+        ("600001", updated_at),  # not cached here
+    ])
+    monkeypatch.setattr(pincode_lookup_service, "AsyncSessionLocal", ChangedRowsSession)
+
+    assert await cache.sync() == 2
+    assert cache.peek("110001") is MISSING
+    assert cache.peek("400001") == ("Division 400001", loaded_at)
+    assert cache.peek("560001") is MISSING
+    assert cache.peek("600001") is MISSING
+
+
+async def test_slow_pincode_api_does_not_stall_the_event_loop():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), SlowPincodeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = PincodeApiClient(base_url=f"http://127.0.0.1:{server.server_port}", max_concurrency=10)
+
+    tick_interval = 0.01
+    gaps: list[float] = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        last = time.perf_counter()
+        while not stop.is_set():
+            await asyncio.sleep(tick_interval)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    ticking = asyncio.create_task(ticker())
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(client.get_pincode(p) for p in PINCODES * 4))
+        elapsed = time.perf_counter() - started
+    finally:
+        stop.set()
+        await ticking
+        await client.aclose()
+        server.shutdown()
+        server.server_close()
+
+    assert [r[0]["PostOffice"][0]["Division"] for r in results] == [f"Division {p}" for p in PINCODES * 4]
+    # 20 lookups through 10 connections take two rounds, not twenty
+    assert elapsed < 6 * SlowPincodeHandler.delay
+    # The ticker kept its cadence while the lookups waited on the network
+    assert len(gaps) >= elapsed / tick_interval / 2
+    assert max(gaps) < 5 * tick_interval
@@ -0,0 +1,20 @@
+from app.core.config import settings
+
+
+def sized(**overrides):
+    return settings.model_copy(update=overrides)
+
+
+def test_api_pools_leave_the_reserve_free():
+    config = sized(DB_MAX_CONNECTIONS=100, DB_RESERVED_CONNECTIONS=20, WEB_CONCURRENCY=4, DB_MAX_OVERFLOW=5, DB_POOL_SIZE=None)
+
+    assert config.db_pool_size == 15
+    assert config.WEB_CONCURRENCY * (config.db_pool_size + config.DB_MAX_OVERFLOW) <= 100 - 20
+
+
+def test_explicit_pool_size_wins():
+    assert sized(DB_POOL_SIZE=5).db_pool_size == 5
+
+
+def test_pool_size_never_drops_below_one():
+    assert sized(DB_MAX_CONNECTIONS=20, DB_RESERVED_CONNECTIONS=20, WEB_CONCURRENCY=4, DB_POOL_SIZE=None).db_pool_size == 1
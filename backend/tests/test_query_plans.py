@@ -0,0 +1,172 @@
+"""
+Checks that the hot queries use the indexes they were designed around.
+
+Seeds users, mails and jobs inside a transaction, runs ANALYZE and then
+EXPLAIN (ANALYZE, FORMAT JSON) on each query, and rolls everything back, so
+a shared database keeps nothing. Needs DATABASE_URL (a migrated database)
+and is skipped otherwise; EXPLAIN_SEED_MAILS sets how many mails to seed.
+
+Each query fails if its plan misses its index or falls back to a
+sequential scan of a large table.
+"""
+from datetime import datetime, timedelta
+import json
+import os
+import uuid
+
+from sqlalchemy import func, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncConnection
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import ClauseElement, Executable
+from sqlmodel import select
+
+from app.models.enums.enums import JobStatus, ProcessingStatus
+from app.models.mail_job_model import MailJob
+from app.models.mail_model import Mail
+from app.models.mail_stats_model import MailStatsDaily
+from app.models.mail_payload_model import MailPayload
+from app.models.user_model import User
+from app.controllers.mail import MAIL_SUMMARY_COLUMNS, MAIL_DETAIL_COLUMNS
+
+# Enough users that looking one up by email is worth an index
+SEED_USERS = 2000
+SEED_MAILS = int(os.environ.get("EXPLAIN_SEED_MAILS", "50000"))
+# Run once per worker start, where hashing all of mail_jobs is an acceptable price
+SEQ_SCAN_ALLOWED = {"recover orphaned mails"}
+
+
+class Explain(Executable, ClauseElement):
+    """EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) around a statement, keeping its bound parameters."""
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain, "postgresql")
+def _compile_explain(element: Explain, compiler, **kw) -> str:
+    return "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + compiler.process(element.statement, **kw)
+
+
+async def _seed(connection: AsyncConnection, mails: int) -> dict:
+    """Mostly completed mails spread over 90 days and SEED_USERS users, a few still unfinished."""
+    users = [uuid.uuid4() for _ in range(SEED_USERS)]
+    await connection.execute(
+        text("INSERT INTO users (id, username, email, hashed_password, created_at) "
+             "SELECT u, 'explain', 'explain-' || u || '@example.com', 'x', now() FROM unnest(CAST(:users AS uuid[])) AS u"),
+        {"users": users},
+    )
+    await connection.execute(
+        text("""
+            INSERT INTO mails (id, user_id, image_s3_key, image_url, status, assigned_sorting_center, created_at)
+            SELECT gen_random_uuid(),
+                   (CAST(:users AS uuid[]))[1 + i % cardinality(CAST(:users AS uuid[]))],
+                   'explain/' || i || '.jpg', '',
+                   CAST(CASE WHEN i % 200 = 0 THEN 'PENDING' WHEN i % 200 = 1 THEN 'PROCESSING'
+                             WHEN i % 50 = 2 THEN 'FAILED' ELSE 'COMPLETED' END AS processingstatus),
+                   'Division ' || (i % 40),
+                   now() - (i % 90) * interval '1 day' - (i % 1440) * interval '1 minute'
+            FROM generate_series(1, :mails) AS i
+        """),
+        {"users": users, "mails": mails},
+    )
+    await connection.execute(text("""
+        INSERT INTO mail_jobs (id, mail_id, file_key, status, priority, attempts, max_attempts, run_after, created_at)
+        SELECT gen_random_uuid(), id, image_s3_key,
+               CAST(CASE status WHEN 'PENDING' THEN 'QUEUED' WHEN 'PROCESSING' THEN 'RUNNING'
+                                WHEN 'FAILED' THEN 'DEAD' ELSE 'DONE' END AS jobstatus),
+               1, 1, 5, created_at, created_at
+        FROM mails WHERE image_s3_key LIKE 'explain/%'
+    """))
+    for table in ("users", "mails", "mail_jobs", "mail_stats_daily"):
+        await connection.execute(text(f"ANALYZE {table}"))
+
+    sample = (await connection.execute(
+        text("SELECT id, user_id, created_at FROM mails WHERE image_s3_key = 'explain/1000.jpg'")
+    )).one()
+    return {"user_id": users[0], "mail": sample}
+
+
+def _queries(seed: dict) -> list[tuple[str, object, str]]:
+    """(name, statement, index the plan must use), mirroring the app's queries."""
+    user_id, mail = seed["user_id"], seed["mail"]
+    now = datetime.utcnow()
+    return [
+        ("history first page",
+         select(*MAIL_SUMMARY_COLUMNS).where(Mail.user_id == user_id)
+         .order_by(Mail.created_at.desc(), Mail.id.desc()).limit(20),
+         "ix_mails_user_id_created_at_id"),
+        ("history cursor page",
+         select(*MAIL_SUMMARY_COLUMNS).where(Mail.user_id == user_id)
+         .where(tuple_(Mail.created_at, Mail.id) < tuple_(mail.created_at, mail.id))
+         .order_by(Mail.created_at.desc(), Mail.id.desc()).limit(20),
+         "ix_mails_user_id_created_at_id"),
+        ("mail detail",
+         select(*MAIL_DETAIL_COLUMNS).outerjoin(MailPayload, MailPayload.mail_id == Mail.id)
+         .where(Mail.id == mail.id).where(Mail.user_id == mail.user_id),
+         "mails_pkey"),
+        ("duplicate upload check",
+         select(Mail.id).where(Mail.image_s3_key == "explain/1000.jpg"),
+         "ix_mails_image_s3_key"),
+        ("recover orphaned mails",
+         select(Mail.id, Mail.image_s3_key).outerjoin(MailJob, MailJob.mail_id == Mail.id)
+         .where(Mail.status.in_([ProcessingStatus.PENDING, ProcessingStatus.PROCESSING]))
+         .where(MailJob.id.is_(None)),
+         "ix_mails_unfinished"),
+        ("claim jobs",
+         select(MailJob).where(MailJob.status == JobStatus.QUEUED).where(MailJob.run_after <= now)
+         .order_by(MailJob.priority, MailJob.run_after).limit(8).with_for_update(skip_locked=True),
+         "ix_mail_jobs_queued"),
+        ("recover stale jobs",
+         select(MailJob.id).where(MailJob.status == JobStatus.RUNNING)
+         .where(MailJob.locked_at < now - timedelta(minutes=15)),
+         "ix_mail_jobs_running"),
+        ("login by email",
+         select(User).where(User.email == f"explain-{user_id}@example.com"),
+         "ix_users_email"),
+        ("stats summary",
+         select(MailStatsDaily.status, func.sum(MailStatsDaily.count))
+         .where(MailStatsDaily.user_id == user_id).group_by(MailStatsDaily.status),
+         "mail_stats_daily_pkey"),
+    ]
+
+
+def _walk(plan: dict):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+async def _explain(connection: AsyncConnection, statement) -> dict:
+    result = await connection.execute(Explain(statement))
+    document = result.scalar()
+    if isinstance(document, str):
+        document = json.loads(document)
+    return document[0]
+
+
+async def test_hot_queries_use_their_indexes(postgres):
+    failures = []
+    async with postgres.connect() as connection:
+        transaction = await connection.begin()
+        try:
+            seed = await _seed(connection, SEED_MAILS)
+            for name, statement, index in _queries(seed):
+                explained = await _explain(connection, statement)
+                nodes = list(_walk(explained["Plan"]))
+                indexes = {node["Index Name"] for node in nodes if "Index Name" in node}
+                seq_scans = {
+                    node["Relation Name"] for node in nodes
+                    if node["Node Type"] == "Seq Scan" and node["Relation Name"] in ("mails", "mail_jobs")
+                }
+                if name in SEQ_SCAN_ALLOWED:
+                    seq_scans = set()
+                if index not in indexes or seq_scans:
+                    failures.append(
+                        f"{name}: expected {index}, used {sorted(indexes) or '-'}"
+                        + (f", seq_scan={sorted(seq_scans)}" if seq_scans else "")
+                    )
+        finally:
+            await transaction.rollback()
+
+    assert not failures, "\n".join(failures)